@@ -3,8 +3,10 @@ from sqlalchemy.orm import Session
 from typing import List
 
 from ..db import models, schemas, database
-from ..core.security import get_current_active_user
+from ..core.security import UserSnapshot, get_current_active_user
+from ..core.serialization import RowSerializer
 from ..services.contact_service import contact_service
+from ..services.presence_service import presence_service
 
 router = APIRouter(
     prefix="/contacts",
@@ -12,27 +14,42 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# Same shape as schemas.UserSearchResult.
+contact_rows = RowSerializer(("id", "username"))
+
 
 @router.get("/search", response_model=List[schemas.UserSearchResult])
 def search_users_api(
     query: str,
     for_group: bool = False,
+    limit: int = 20,
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    current_user: UserSnapshot = Depends(get_current_active_user)
 ):
     """
     Search for users by username.
     """
     if not query.strip():
         raise HTTPException(status_code=400, detail="Search query cannot be empty")
-    users = contact_service.search_users(db=db, current_user_id=current_user.id, username_query=query, for_group=for_group)
+    users = contact_service.search_users(db=db, current_user_id=current_user.id, username_query=query, for_group=for_group, limit=max(1, min(limit, 100)))
     return users
 
+@router.get("/presence", response_model=schemas.PresenceSnapshot)
+def contacts_presence_api(
+    db: Session = Depends(database.get_db),
+    current_user: UserSnapshot = Depends(get_current_active_user)
+):
+    """
+    Which of the current user's contacts are online right now.
+    """
+    contact_ids = contact_service.get_contact_ids(db, current_user.id)
+    return {"online": presence_service.get_online_ids(contact_ids)}
+
 @router.post("/add", response_model=schemas.Contact)
 def add_contact_api(
     contact_in: schemas.ContactCreate, 
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    current_user: UserSnapshot = Depends(get_current_active_user)
 ):
     """
     Add a user to the contact list.
@@ -46,19 +63,18 @@ def add_contact_api(
 @router.get("/", response_model=List[schemas.UserSearchResult])
 def list_contacts_api(
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    current_user: UserSnapshot = Depends(get_current_active_user)
 ):
     """
     List all contacts for the current user.
     """
-    contacts = contact_service.get_contacts(db=db, user_id=current_user.id)
-    return contacts
+    return contact_rows.response(contact_service.get_contacts(db=db, user_id=current_user.id))
 
 @router.delete("/{friend_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_contact_api(
     friend_id: int,
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    current_user: UserSnapshot = Depends(get_current_active_user)
 ):
     """
     Delete a contact from the current user's contact list.
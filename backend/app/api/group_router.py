@@ -1,10 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 
 from ..db import database, models, schemas
 from ..core import security
+from ..core.config import settings
+from ..core.pagination import id_page, keyset_page
+from ..core.serialization import RowSerializer
 from ..services.signaling_service import manager
+from ..services.membership_index import membership_index
+from ..services.conversation_service import conversation_service
+from ..services.message_store import message_store
+from ..services.rate_limiter import REST_MESSAGES, limit_requests
 import datetime
 import json
 
@@ -13,6 +22,10 @@ router = APIRouter(
     tags=["groups"],
 )
 
+# Same shapes as schemas.GroupMember and schemas.GroupMessage.
+member_rows = RowSerializer(("user_id", "role", "id", "group_id", "joined_at", ("user", ("username", "email", "id", "is_active"))))
+group_message_rows = RowSerializer(("content", "id", "group_id", "sender_id", "timestamp", "sender_username"))
+
 
 def get_group_or_404(db: Session, group_id: int):
     group = db.query(models.Group).filter(models.Group.id == group_id).first()
@@ -20,6 +33,10 @@ def get_group_or_404(db: Session, group_id: int):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
     return group
 
+def group_members_query(db: Session, group_id: int):
+    # Members are always shown with their user, so load both in one select.
+    return db.query(models.GroupMember).options(joinedload(models.GroupMember.user)).filter(models.GroupMember.group_id == group_id)
+
 def is_user_group_admin(db: Session, group_id: int, user_id: int) -> bool:
     member_admin_check = db.query(models.GroupMember).filter(
         models.GroupMember.group_id == group_id,
@@ -34,7 +51,7 @@ def require_group_admin(db: Session, group_id: int, current_user_id: int):
 
 
 @router.post("/", response_model=schemas.Group)
-def create_group(group_create: schemas.GroupCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(security.get_current_active_user)):
+def create_group(group_create: schemas.GroupCreate, db: Session = Depends(database.get_db), current_user: security.UserSnapshot = Depends(security.get_current_active_user)):
     db_group = models.Group(name=group_create.name, creator_id=current_user.id)
     db.add(db_group)
     db.commit()
@@ -42,34 +59,64 @@ def create_group(group_create: schemas.GroupCreate, db: Session = Depends(databa
     db_group_member = models.GroupMember(group_id=db_group.id, user_id=current_user.id, role="admin")
     db.add(db_group_member)
     db.commit()
+    membership_index.add_member(db_group.id, current_user.id, "admin")
     return db_group
 
 @router.get("/", response_model=List[schemas.Group])
-def list_user_groups(db: Session = Depends(database.get_db), current_user: models.User = Depends(security.get_current_active_user)):
-    user_groups = db.query(models.Group).join(models.GroupMember).filter(models.GroupMember.user_id == current_user.id).all()
+def list_user_groups(db: Session = Depends(database.get_db), current_user: security.UserSnapshot = Depends(security.get_current_active_user)):
+    user_groups = (
+        db.query(models.Group)
+        .options(joinedload(models.Group.creator))
+        .join(models.GroupMember)
+        .filter(models.GroupMember.user_id == current_user.id)
+        .all()
+    )
     return user_groups
 
 @router.get("/{group_id}", response_model=schemas.GroupDetails)
-def get_group_details(group_id: int, db: Session = Depends(database.get_db), current_user: models.User = Depends(security.get_current_active_user)):
-    group = get_group_or_404(db, group_id)
+def get_group_details(group_id: int, members_limit: int = settings.GROUP_DETAILS_MEMBERS, messages_limit: int = settings.GROUP_DETAILS_MESSAGES, db: Session = Depends(database.get_db), current_user: security.UserSnapshot = Depends(security.get_current_active_user)):
+    group = db.query(models.Group).options(joinedload(models.Group.creator)).filter(models.Group.id == group_id).first()
+    if not group:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
     member_check = db.query(models.GroupMember).filter(models.GroupMember.group_id == group_id, models.GroupMember.user_id == current_user.id).first()
     if not member_check:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is not a member of this group")
-    
-    return group
+
+    member_count, admin_count = db.query(
+        func.count(models.GroupMember.id),
+        func.count(case((models.GroupMember.role == "admin", 1))),
+    ).filter(models.GroupMember.group_id == group_id).one()
+    members, members_next_cursor = id_page(group_members_query(db, group_id), models.GroupMember.id, None, members_limit)
+    messages_query = db.query(models.GroupMessage).filter(models.GroupMessage.group_id == group_id)
+    messages, messages_next_cursor, _ = keyset_page(messages_query, models.GroupMessage.timestamp, models.GroupMessage.id, None, messages_limit)
+    return {
+        "id": group.id,
+        "name": group.name,
+        "creator_id": group.creator_id,
+        "created_at": group.created_at,
+        "creator": group.creator,
+        "member_count": member_count,
+        "admin_count": admin_count,
+        "current_user_role": member_check.role,
+        "members": members,
+        "members_next_cursor": members_next_cursor,
+        "messages": messages,
+        "messages_next_cursor": messages_next_cursor,
+    }
 
 @router.put("/{group_id}", response_model=schemas.Group)
-def update_group(group_id: int, group_update: schemas.GroupBase, db: Session = Depends(database.get_db), current_user: models.User = Depends(security.get_current_active_user)):
+def update_group(group_id: int, group_update: schemas.GroupBase, db: Session = Depends(database.get_db), current_user: security.UserSnapshot = Depends(security.get_current_active_user)):
     group = get_group_or_404(db, group_id)
     require_group_admin(db, group_id, current_user.id)
     
     group.name = group_update.name
     db.commit()
     db.refresh(group)
+    membership_index.rename_group(group_id, group.name)
     return group
 
 @router.delete("/{group_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_group(group_id: int, db: Session = Depends(database.get_db), current_user: models.User = Depends(security.get_current_active_user)):
+def delete_group(group_id: int, db: Session = Depends(database.get_db), current_user: security.UserSnapshot = Depends(security.get_current_active_user)):
     group = get_group_or_404(db, group_id)
     require_group_admin(db, group_id, current_user.id)
     member_count = db.query(models.GroupMember).filter(models.GroupMember.group_id == group_id).count()
@@ -83,13 +130,15 @@ def delete_group(group_id: int, db: Session = Depends(database.get_db), current_
             )
         
     db.query(models.GroupMessage).filter(models.GroupMessage.group_id == group_id).delete(synchronize_session=False)
+    conversation_service.delete_group_conversation(db, group_id)
     db.delete(group)
     db.commit()
+    membership_index.drop_group(group_id)
     return
 
 
 @router.post("/{group_id}/members", response_model=schemas.GroupMember)
-def add_group_member(group_id: int, member_create: schemas.GroupMemberBase, db: Session = Depends(database.get_db), current_user: models.User = Depends(security.get_current_active_user)):
+def add_group_member(group_id: int, member_create: schemas.GroupMemberBase, db: Session = Depends(database.get_db), current_user: security.UserSnapshot = Depends(security.get_current_active_user)):
     group = get_group_or_404(db, group_id)
     require_group_admin(db, group_id, current_user.id)
     user_to_add = db.query(models.User).filter(models.User.id == member_create.user_id).first()
@@ -104,20 +153,46 @@ def add_group_member(group_id: int, member_create: schemas.GroupMemberBase, db:
     db.add(db_member)
     db.commit()
     db.refresh(db_member)
+    membership_index.add_member(group_id, db_member.user_id, db_member.role)
     return db_member
 
 @router.get("/{group_id}/members", response_model=List[schemas.GroupMember])
-def list_group_members(group_id: int, db: Session = Depends(database.get_db), current_user: models.User = Depends(security.get_current_active_user)):
+def list_group_members(group_id: int, db: Session = Depends(database.get_db), current_user: security.UserSnapshot = Depends(security.get_current_active_user)):
+    group = get_group_or_404(db, group_id)
+    member_check = db.query(models.GroupMember).filter(models.GroupMember.group_id == group_id, models.GroupMember.user_id == current_user.id).first()
+    if not member_check:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is not a member of this group")
+
+    members = db.execute(
+        select(
+            models.GroupMember.user_id,
+            models.GroupMember.role,
+            models.GroupMember.id,
+            models.GroupMember.group_id,
+            models.GroupMember.joined_at,
+            models.User.username,
+            models.User.email,
+            models.User.id,
+            models.User.is_active,
+        )
+        .join(models.User, models.User.id == models.GroupMember.user_id)
+        .where(models.GroupMember.group_id == group_id)
+        .order_by(models.GroupMember.id)
+    ).all()
+    return member_rows.response(members)
+
+@router.get("/{group_id}/members/page", response_model=schemas.GroupMemberPage)
+def get_group_members_page(group_id: int, cursor: Optional[str] = None, limit: int = 100, db: Session = Depends(database.get_db), current_user: security.UserSnapshot = Depends(security.get_current_active_user)):
     group = get_group_or_404(db, group_id)
     member_check = db.query(models.GroupMember).filter(models.GroupMember.group_id == group_id, models.GroupMember.user_id == current_user.id).first()
     if not member_check:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is not a member of this group")
 
-    members = db.query(models.GroupMember).filter(models.GroupMember.group_id == group_id).all()
-    return members
+    members, next_cursor = id_page(group_members_query(db, group_id), models.GroupMember.id, cursor, limit)
+    return {"items": members, "next_cursor": next_cursor}
 
 @router.delete("/{group_id}/members/{user_id_to_remove}", status_code=status.HTTP_204_NO_CONTENT)
-def remove_group_member(group_id: int, user_id_to_remove: int, db: Session = Depends(database.get_db), current_user: models.User = Depends(security.get_current_active_user)):
+def remove_group_member(group_id: int, user_id_to_remove: int, db: Session = Depends(database.get_db), current_user: security.UserSnapshot = Depends(security.get_current_active_user)):
     group = get_group_or_404(db, group_id)
     member_to_remove = db.query(models.GroupMember).filter(
         models.GroupMember.group_id == group_id, 
@@ -142,11 +217,13 @@ def remove_group_member(group_id: int, user_id_to_remove: int, db: Session = Dep
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to remove this member. Only admins or the user themselves can perform this action.")
 
     db.delete(member_to_remove)
+    conversation_service.remove_group_participant(db, group_id, user_id_to_remove)
     db.commit()
+    membership_index.remove_member(group_id, user_id_to_remove)
     return
 
 @router.put("/{group_id}/members/{user_id_to_update}", response_model=schemas.GroupMember)
-def update_group_member_role(group_id: int, user_id_to_update: int, role_update: schemas.GroupMemberUpdate, db: Session = Depends(database.get_db), current_user: models.User = Depends(security.get_current_active_user)):
+def update_group_member_role(group_id: int, user_id_to_update: int, role_update: schemas.GroupMemberUpdate, db: Session = Depends(database.get_db), current_user: security.UserSnapshot = Depends(security.get_current_active_user)):
     group = get_group_or_404(db, group_id)
     require_group_admin(db, group_id, current_user.id)
     member_to_update = db.query(models.GroupMember).filter(models.GroupMember.group_id == group_id, models.GroupMember.user_id == user_id_to_update).first()
@@ -155,21 +232,21 @@ def update_group_member_role(group_id: int, user_id_to_update: int, role_update:
     member_to_update.role = role_update.role
     db.commit()
     db.refresh(member_to_update)
+    membership_index.set_role(group_id, user_id_to_update, member_to_update.role)
     return member_to_update
 
 
 
-@router.post("/{group_id}/messages", response_model=schemas.GroupMessage)
-async def send_group_message(group_id: int, message_create: schemas.GroupMessageBase, db: Session = Depends(database.get_db), current_user: models.User = Depends(security.get_current_active_user)):
-    group = get_group_or_404(db, group_id)
-    member_check = db.query(models.GroupMember).filter(models.GroupMember.group_id == group_id, models.GroupMember.user_id == current_user.id).first()
-    if not member_check:
+@router.post("/{group_id}/messages", response_model=schemas.GroupMessage, dependencies=[Depends(limit_requests(REST_MESSAGES))])
+async def send_group_message(group_id: int, message_create: schemas.GroupMessageBase, db: AsyncSession = Depends(database.get_async_db), current_user: security.UserSnapshot = Depends(security.get_current_active_user)):
+    group = await db.get(models.Group, group_id)
+    if not group:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
+    if not await membership_index.is_member(db, group_id, current_user.id):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is not a member of this group and cannot send messages")
 
     db_message = models.GroupMessage(**message_create.dict(), group_id=group_id, sender_id=current_user.id, sender_username=current_user.username)
-    db.add(db_message)
-    db.commit()
-    db.refresh(db_message)
+    db_message = await message_store.save_group(db, db_message)
 
     message_data = schemas.GroupMessage.from_orm(db_message).dict()
     message_data['type'] = 'group_message'
@@ -179,12 +256,36 @@ async def send_group_message(group_id: int, message_create: schemas.GroupMessage
     
     return db_message
 
+@router.get("/{group_id}/messages/page", response_model=schemas.GroupMessagePage)
+def get_group_messages_page(group_id: int, cursor: Optional[str] = None, limit: int = 50, db: Session = Depends(database.get_db), current_user: security.UserSnapshot = Depends(security.get_current_active_user)):
+    group = get_group_or_404(db, group_id)
+    member_check = db.query(models.GroupMember).filter(models.GroupMember.group_id == group_id, models.GroupMember.user_id == current_user.id).first()
+    if not member_check:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is not a member of this group and cannot view messages")
+
+    query = db.query(models.GroupMessage).filter(models.GroupMessage.group_id == group_id)
+    messages, next_cursor, prev_cursor = keyset_page(query, models.GroupMessage.timestamp, models.GroupMessage.id, cursor, limit)
+    return {"items": messages, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
+
 @router.get("/{group_id}/messages", response_model=List[schemas.GroupMessage])
-def get_group_messages(group_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db), current_user: models.User = Depends(security.get_current_active_user)):
+def get_group_messages(group_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db), current_user: security.UserSnapshot = Depends(security.get_current_active_user)):
     group = get_group_or_404(db, group_id)
     member_check = db.query(models.GroupMember).filter(models.GroupMember.group_id == group_id, models.GroupMember.user_id == current_user.id).first()
     if not member_check:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is not a member of this group and cannot view messages")
 
-    messages = db.query(models.GroupMessage).filter(models.GroupMessage.group_id == group_id).order_by(models.GroupMessage.timestamp.asc()).offset(skip).limit(limit).all()
-    return messages
+    messages = db.execute(
+        select(
+            models.GroupMessage.content,
+            models.GroupMessage.id,
+            models.GroupMessage.group_id,
+            models.GroupMessage.sender_id,
+            models.GroupMessage.timestamp,
+            models.GroupMessage.sender_username,
+        )
+        .where(models.GroupMessage.group_id == group_id)
+        .order_by(models.GroupMessage.timestamp.asc())
+        .offset(skip)
+        .limit(limit)
+    ).all()
+    return group_message_rows.response(messages)
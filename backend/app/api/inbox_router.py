@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from ..db import schemas, database
+from ..core.security import UserSnapshot, get_current_active_user
+from ..services.conversation_service import conversation_service
+
+router = APIRouter(
+    prefix="/inbox",
+    tags=["inbox"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.get("/", response_model=List[schemas.InboxEntry])
+def get_inbox_api(
+    limit: int = 50,
+    db: Session = Depends(database.get_db),
+    current_user: UserSnapshot = Depends(get_current_active_user)
+):
+    """
+    Direct and group conversations of the current user, most recent first,
+    with last-message preview and unread count.
+    """
+    return conversation_service.get_inbox(db=db, user_id=current_user.id, limit=limit)
+
+@router.post("/{conversation_id}/read", status_code=status.HTTP_204_NO_CONTENT)
+def mark_conversation_read_api(
+    conversation_id: int,
+    last_read_message_id: Optional[int] = None,
+    db: Session = Depends(database.get_db),
+    current_user: UserSnapshot = Depends(get_current_active_user)
+):
+    """
+    Move the read marker; without last_read_message_id everything is marked read.
+    """
+    participant = conversation_service.mark_read(
+        db=db, conversation_id=conversation_id, user_id=current_user.id, last_read_message_id=last_read_message_id
+    )
+    if not participant:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
+    return
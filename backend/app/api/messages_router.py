@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 
-from ..db import models, schemas, database
-from ..core.security import get_current_active_user
+from ..db import schemas, database
+from ..core.security import UserSnapshot, get_current_active_user
+from ..core.serialization import RowSerializer
 from ..services.message_service import message_service
+from ..services.rate_limiter import REST_MESSAGES, limit_requests
 from ..services.signaling_service import manager
 import datetime
 
@@ -14,17 +17,20 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-@router.post("/", response_model=schemas.Message)
+# Same shape as schemas.Message.
+message_rows = RowSerializer(("content", "id", "sender_id", "receiver_id", "timestamp"))
+
+@router.post("/", response_model=schemas.Message, dependencies=[Depends(limit_requests(REST_MESSAGES))])
 async def send_message_api(
     message_in: schemas.MessageCreate,
-    db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: UserSnapshot = Depends(get_current_active_user)
 ):
     
     if current_user.id == message_in.receiver_id:
         raise HTTPException(status_code=400, detail="Cannot send message to yourself")
 
-    db_message = message_service.create_message(db=db, sender_id=current_user.id, message_in=message_in)
+    db_message = await message_service.create_message(db=db, sender_id=current_user.id, message_in=message_in)
     
     websocket_message = {
         "type": "chat_message",
@@ -40,15 +46,31 @@ async def send_message_api(
         
     return db_message
 
+@router.get("/{friend_id}/page", response_model=schemas.MessagePage)
+def get_message_page_api(
+    friend_id: int,
+    db: Session = Depends(database.get_db),
+    current_user: UserSnapshot = Depends(get_current_active_user),
+    cursor: Optional[str] = None,
+    limit: int = 50
+):
+    """
+    Newest-first page of the conversation; follow next_cursor for older messages.
+    """
+    messages, next_cursor, prev_cursor = message_service.get_messages_page(
+        db=db, user1_id=current_user.id, user2_id=friend_id, cursor=cursor, limit=limit
+    )
+    return {"items": messages, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
+
 @router.get("/{friend_id}", response_model=List[schemas.Message])
 def get_message_history_api(
     friend_id: int,
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(get_current_active_user),
+    current_user: UserSnapshot = Depends(get_current_active_user),
     skip: int = 0,
     limit: int = 50
 ):
     messages = message_service.get_messages_between_users(
         db=db, user1_id=current_user.id, user2_id=friend_id, skip=skip, limit=limit
     )
-    return messages
\ No newline at end of file
+    return message_rows.response(messages)
@@ -0,0 +1,60 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from ..core.metrics import SIZE_BUCKETS, metrics
+from ..core.security import token_cache
+from ..services.admission import admission_gate
+from ..services.heartbeat import heartbeat_service
+from ..services.password_hasher import password_hasher
+from ..services.rate_limiter import rate_limiter
+from ..services.signaling_handlers import dispatcher
+from ..services.signaling_service import manager
+
+router = APIRouter(
+    tags=["metrics"],
+)
+
+# Read from the services when scraped, so none of these cost anything on the hot path.
+metrics.labeled_gauge(
+    "signaling_connections", "WebSocket connections held by this worker (local) or known on others (remote)", "scope",
+    lambda: {"local": len(manager.active_connections), "remote": len(manager.remote_connections)},
+)
+metrics.gauge("signaling_send_queue_frames", "Frames waiting in outbound send queues", lambda: manager.get_send_queue_stats()["queued_frames"])
+metrics.gauge("signaling_send_queue_max_depth", "Deepest outbound send queue", lambda: manager.get_send_queue_stats()["max_queue_depth"])
+metrics.gauge("signaling_dropped_frames_total", "Droppable frames discarded by full send queues",
+              lambda: manager.send_queue_stats.dropped_frames, kind="counter")
+metrics.gauge("signaling_slow_consumer_disconnects_total", "Connections closed because their send queue overflowed",
+              lambda: manager.send_queue_stats.slow_consumer_disconnects, kind="counter")
+metrics.gauge("signaling_send_failures_total", "WebSocket sends that raised",
+              lambda: manager.send_queue_stats.send_failures, kind="counter")
+metrics.labeled_gauge("signaling_frames_total", "Frames dispatched, by message type", "type",
+                      lambda: {msg_type: timing.count for msg_type, timing in dispatcher.timings.items()}, kind="counter")
+metrics.labeled_gauge("signaling_frame_errors_total", "Frames rejected or failed in their handler, by message type", "type",
+                      lambda: {msg_type: timing.errors for msg_type, timing in dispatcher.timings.items()}, kind="counter")
+metrics.gauge("group_calls_active", "Group calls in progress", lambda: len(manager.calls))
+metrics.scrape_histogram("group_call_participants", "Participants per active group call", SIZE_BUCKETS,
+                         lambda: [len(call.participants) for call in manager.calls])
+metrics.gauge("heartbeat_pings_sent_total", "Pings sent to idle connections", lambda: heartbeat_service.pings_sent, kind="counter")
+metrics.gauge("heartbeat_reaped_total", "Connections closed after the heartbeat timeout", lambda: heartbeat_service.reaped, kind="counter")
+metrics.gauge("token_cache_entries", "Verified access tokens cached", lambda: token_cache.stats()["entries"])
+metrics.gauge("token_cache_hits_total", "Token lookups served from the cache", lambda: token_cache.hits, kind="counter")
+metrics.gauge("token_cache_misses_total", "Token lookups that had to verify the JWT", lambda: token_cache.misses, kind="counter")
+metrics.gauge("password_hash_pending", "Password hashes queued or running", lambda: password_hasher.pending)
+metrics.gauge("password_hash_rejected_total", "Logins turned away because the hashing pool was full",
+              lambda: password_hasher.rejected, kind="counter")
+
+metrics.labeled_gauge("rate_limited_total", "Frames and requests refused by the rate limiter, by budget", "category",
+                      lambda: rate_limiter.throttled, kind="counter")
+metrics.gauge("rate_limit_disconnects_total", "Connections closed for ignoring rate limits",
+              lambda: rate_limiter.disconnects, kind="counter")
+
+metrics.gauge("ws_admission_in_progress", "WebSocket handshakes running", lambda: admission_gate.in_progress)
+metrics.gauge("ws_admission_queued", "WebSocket handshakes waiting for a slot", lambda: admission_gate.queued)
+metrics.gauge("ws_admission_rejected_total", "WebSocket connects told to retry later",
+              lambda: admission_gate.rejected, kind="counter")
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def read_metrics():
+    """Prometheus text exposition of this worker's metrics"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from ..db import schemas, database
+from ..core.security import UserSnapshot, get_current_active_user
+from ..services.search_service import search_service
+
+router = APIRouter(
+    prefix="/search",
+    tags=["search"],
+)
+
+@router.get("/messages", response_model=schemas.MessageSearchPage)
+def search_messages_api(
+    q: str,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    db: Session = Depends(database.get_db),
+    current_user: UserSnapshot = Depends(get_current_active_user)
+):
+    """
+    Full-text search over the direct and group conversations of the current
+    user, best matches first. `snippet` is plain text; `highlights` gives the
+    offsets of the matched terms in it. Ranks can shift as messages arrive,
+    so a hit may repeat or go missing across pages.
+    """
+    hits, next_cursor = search_service.search_messages(
+        db=db, user_id=current_user.id, query=q, cursor=cursor, limit=limit
+    )
+    return {"items": hits, "next_cursor": next_cursor}
@@ -7,5 +7,106 @@ class Settings:
     SECRET_KEY: str = os.getenv("SECRET_KEY")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440
+    # Verified tokens kept in memory per worker; 0 disables the cache. A
+    # cached user is reused for at most TOKEN_CACHE_TTL_S seconds, which
+    # bounds how long a change to the user row can go unnoticed.
+    TOKEN_CACHE_MAX_ENTRIES: int = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+    TOKEN_CACHE_TTL_S: float = float(os.getenv("TOKEN_CACHE_TTL_S", "60"))
 
-settings = Settings()
\ No newline at end of file
+    # bcrypt runs in PASSWORD_HASH_WORKERS processes (0 = the event loop's
+    # thread pool). Logins beyond PASSWORD_HASH_MAX_PENDING in flight get a
+    # 503 with Retry-After. Changing BCRYPT_ROUNDS rehashes users as they log in.
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+    PASSWORD_HASH_RETRY_AFTER: int = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+    # "async" runs the async endpoints and the WebSocket loop on aiosqlite,
+    # "sync" keeps them on the blocking SQLAlchemy Session.
+    DB_MODE: str = os.getenv("DB_MODE", "async")
+
+    # "inprocess" for a single worker, "socket" to share signaling state
+    # between workers through `python -m app.services.backplane`.
+    BACKPLANE: str = os.getenv("BACKPLANE", "inprocess")
+    BACKPLANE_HOST: str = os.getenv("BACKPLANE_HOST", "127.0.0.1")
+    BACKPLANE_PORT: int = int(os.getenv("BACKPLANE_PORT", "8765"))
+
+    # Per-connection outbound queue. When full, "drop_oldest" discards the
+    # oldest droppable frame (presence/broadcast noise) and "disconnect"
+    # closes the slow consumer.
+    SEND_QUEUE_MAX_SIZE: int = int(os.getenv("SEND_QUEUE_MAX_SIZE", "256"))
+    SEND_QUEUE_OVERFLOW_POLICY: str = os.getenv("SEND_QUEUE_OVERFLOW_POLICY", "drop_oldest")
+
+    # A connection silent for HEARTBEAT_INTERVAL_S is sent a ping; one silent
+    # for HEARTBEAT_TIMEOUT_S is closed and taken out of its calls.
+    HEARTBEAT_INTERVAL_S: float = float(os.getenv("HEARTBEAT_INTERVAL_S", "25"))
+    HEARTBEAT_TIMEOUT_S: float = float(os.getenv("HEARTBEAT_TIMEOUT_S", "60"))
+
+    # Token buckets per user: frames (or requests) per second and burst size,
+    # separately for ICE candidates, SDP offers/answers, chat, every other
+    # signaling frame, and REST message sends. Refused frames get one error
+    # per streak; RATE_LIMIT_CLOSE_AFTER refusals in a row close the socket.
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_ICE_PER_SEC: float = float(os.getenv("RATE_LIMIT_ICE_PER_SEC", "50"))
+    RATE_LIMIT_ICE_BURST: float = float(os.getenv("RATE_LIMIT_ICE_BURST", "200"))
+    RATE_LIMIT_SDP_PER_SEC: float = float(os.getenv("RATE_LIMIT_SDP_PER_SEC", "5"))
+    RATE_LIMIT_SDP_BURST: float = float(os.getenv("RATE_LIMIT_SDP_BURST", "20"))
+    RATE_LIMIT_CHAT_PER_SEC: float = float(os.getenv("RATE_LIMIT_CHAT_PER_SEC", "10"))
+    RATE_LIMIT_CHAT_BURST: float = float(os.getenv("RATE_LIMIT_CHAT_BURST", "30"))
+    RATE_LIMIT_SIGNAL_PER_SEC: float = float(os.getenv("RATE_LIMIT_SIGNAL_PER_SEC", "20"))
+    RATE_LIMIT_SIGNAL_BURST: float = float(os.getenv("RATE_LIMIT_SIGNAL_BURST", "60"))
+    RATE_LIMIT_REST_MESSAGES_PER_SEC: float = float(os.getenv("RATE_LIMIT_REST_MESSAGES_PER_SEC", "5"))
+    RATE_LIMIT_REST_MESSAGES_BURST: float = float(os.getenv("RATE_LIMIT_REST_MESSAGES_BURST", "20"))
+    RATE_LIMIT_CLOSE_AFTER: int = int(os.getenv("RATE_LIMIT_CLOSE_AFTER", "100"))
+
+    # At most ADMISSION_MAX_IN_PROGRESS WebSocket handshakes run at once
+    # (0 = no limit); others queue for up to ADMISSION_MAX_WAIT_S, and those
+    # beyond ADMISSION_MAX_QUEUED or the deadline are closed with 1013 and a
+    # retry delay of at least ADMISSION_RETRY_AFTER_S.
+    ADMISSION_MAX_IN_PROGRESS: int = int(os.getenv("ADMISSION_MAX_IN_PROGRESS", "64"))
+    ADMISSION_MAX_QUEUED: int = int(os.getenv("ADMISSION_MAX_QUEUED", "2000"))
+    ADMISSION_MAX_WAIT_S: float = float(os.getenv("ADMISSION_MAX_WAIT_S", "5"))
+    ADMISSION_RETRY_AFTER_S: float = float(os.getenv("ADMISSION_RETRY_AFTER_S", "2"))
+
+    # "sync" commits every chat message on its own. "batched" assigns ids up
+    # front, pushes the message immediately and group-commits inserts every
+    # MESSAGE_BATCH_SIZE messages or MESSAGE_BATCH_INTERVAL_MS; history reads
+    # can lag by one interval, and unflushed messages are lost on a crash.
+    # Use the same mode on every worker sharing a database.
+    MESSAGE_DURABILITY: str = os.getenv("MESSAGE_DURABILITY", "sync")
+    MESSAGE_BATCH_SIZE: int = int(os.getenv("MESSAGE_BATCH_SIZE", "100"))
+    MESSAGE_BATCH_INTERVAL_MS: int = int(os.getenv("MESSAGE_BATCH_INTERVAL_MS", "50"))
+    MESSAGE_ID_BLOCK_SIZE: int = int(os.getenv("MESSAGE_ID_BLOCK_SIZE", "1000"))
+
+    # Messages missed while offline are pushed on reconnect in frames of
+    # MESSAGE_SYNC_BATCH_SIZE, at most MESSAGE_SYNC_MAX_MESSAGES per kind
+    # and sync. Not available with MESSAGE_DURABILITY=batched and
+    # BACKPLANE=socket, where ids are not in commit order across workers.
+    MESSAGE_SYNC_BATCH_SIZE: int = int(os.getenv("MESSAGE_SYNC_BATCH_SIZE", "100"))
+    MESSAGE_SYNC_MAX_MESSAGES: int = int(os.getenv("MESSAGE_SYNC_MAX_MESSAGES", "1000"))
+
+    # GET /groups/{id} embeds the newest GROUP_DETAILS_MESSAGES messages and
+    # the first GROUP_DETAILS_MEMBERS members; its cursors continue through
+    # /groups/{id}/messages/page and /groups/{id}/members/page.
+    GROUP_DETAILS_MESSAGES: int = int(os.getenv("GROUP_DETAILS_MESSAGES", "50"))
+    GROUP_DETAILS_MEMBERS: int = int(os.getenv("GROUP_DETAILS_MEMBERS", "100"))
+
+    # Signaling frames at least this large are compressed for clients that
+    # negotiated a "+deflate" wire codec.
+    WIRE_DEFLATE_MIN_BYTES: int = int(os.getenv("WIRE_DEFLATE_MIN_BYTES", "256"))
+    # Compressed frames from clients may not inflate past this size; matches
+    # uvicorn's default --ws-max-size for uncompressed frames.
+    WIRE_MAX_FRAME_BYTES: int = int(os.getenv("WIRE_MAX_FRAME_BYTES", str(16 * 1024 * 1024)))
+
+    # Presence changes are batched and sent to contacts and group peers at
+    # most once per interval.
+    PRESENCE_FLUSH_INTERVAL_MS: int = int(os.getenv("PRESENCE_FLUSH_INTERVAL_MS", "250"))
+
+    # Group call topology: "mesh" relays offers between participants, "sfu"
+    # terminates every participant's media in this worker (requires aiortc
+    # and BACKPLANE=inprocess), "auto" uses the SFU for groups of at least
+    # SFU_AUTO_THRESHOLD members or when the caller asks for it.
+    GROUP_CALL_MODE: str = os.getenv("GROUP_CALL_MODE", "mesh")
+    SFU_AUTO_THRESHOLD: int = int(os.getenv("SFU_AUTO_THRESHOLD", "5"))
+
+settings = Settings()
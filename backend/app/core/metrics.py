@@ -0,0 +1,241 @@
+import asyncio
+import math
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+# Outside any request or WebSocket, e.g. the message store's batch writer.
+BACKGROUND = "background"
+UNMATCHED = "unmatched"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+
+class Histogram:
+    """Fixed buckets allocated up front; observing is a bisect and two additions"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        running = 0
+        result = []
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            running += count
+            result.append((bound, running))
+        return result
+
+
+class Family:
+    """A metric with one label; each label value's child is created once, on first use"""
+
+    def __init__(self, factory: Callable[[], object]):
+        self.children: Dict[str, object] = {}
+        self._factory = factory
+
+    def labels(self, value: str):
+        child = self.children.get(value)
+        if child is None:
+            child = self.children[value] = self._factory()
+        return child
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms updated in place on the hot paths, plus gauges
+    read from the services only when /metrics is scraped. Rendered in the
+    Prometheus text format.
+    """
+
+    def __init__(self):
+        self._metrics: List[Tuple[str, str, str, Callable[[], List[Tuple[str, float]]]]] = []
+
+    def counter(self, name: str, help: str) -> Counter:
+        counter = Counter()
+        self._metrics.append((name, help, "counter", lambda: [("", counter.value)]))
+        return counter
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float]) -> Histogram:
+        histogram = Histogram(buckets)
+        self._metrics.append((name, help, "histogram", lambda: self._histogram_samples(name, "", histogram)))
+        return histogram
+
+    def labeled_counter(self, name: str, help: str, label: str) -> Family:
+        family = Family(Counter)
+        self._metrics.append((name, help, "counter", lambda: [
+            (self._labels(label, value), child.value) for value, child in sorted(family.children.items())
+        ]))
+        return family
+
+    def labeled_histogram(self, name: str, help: str, label: str, buckets: Sequence[float]) -> Family:
+        family = Family(lambda: Histogram(buckets))
+        self._metrics.append((name, help, "histogram", lambda: [
+            sample
+            for value, child in sorted(family.children.items())
+            for sample in self._histogram_samples(name, f'{label}="{_escape(value)}"', child)
+        ]))
+        return family
+
+    def gauge(self, name: str, help: str, read: Callable[[], float], kind: str = "gauge"):
+        """A value read at scrape time; use kind="counter" for totals kept elsewhere"""
+        self._metrics.append((name, help, kind, lambda: [("", read())]))
+
+    def labeled_gauge(self, name: str, help: str, label: str, read: Callable[[], Dict[str, float]], kind: str = "gauge"):
+        self._metrics.append((name, help, kind, lambda: [
+            (self._labels(label, value), amount) for value, amount in sorted(read().items())
+        ]))
+
+    def scrape_histogram(self, name: str, help: str, buckets: Sequence[float], read: Callable[[], Sequence[float]]):
+        """A histogram rebuilt from current values at scrape time"""
+        def samples():
+            histogram = Histogram(buckets)
+            for value in read():
+                histogram.observe(value)
+            return self._histogram_samples(name, "", histogram)
+        self._metrics.append((name, help, "histogram", samples))
+
+    def _labels(self, label: str, value: str) -> str:
+        return f'{{{label}="{_escape(str(value))}"}}'
+
+    def _histogram_samples(self, name: str, labels: str, histogram: Histogram) -> List[Tuple[str, float]]:
+        prefix = f"{labels}," if labels else ""
+        samples = [
+            (f'_bucket{{{prefix}le="{_format_value(bound)}"}}', count)
+            for bound, count in histogram.cumulative()
+        ]
+        suffix = f"{{{labels}}}" if labels else ""
+        samples.append((f"_sum{suffix}", histogram.sum))
+        samples.append((f"_count{suffix}", histogram.count))
+        return samples
+
+    def render(self) -> str:
+        lines = []
+        for name, help, kind, collect in self._metrics:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, value in collect():
+                lines.append(f"{name}{suffix} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+signal_frame_latency = metrics.labeled_histogram(
+    "signaling_frame_latency_seconds",
+    "Time from receiving a WebSocket frame to its handler having queued the relay",
+    "type", LATENCY_BUCKETS,
+)
+signal_fanout = metrics.histogram(
+    "signaling_fanout_recipients", "Local recipients per frame sent to several users", SIZE_BUCKETS,
+)
+db_queries = metrics.labeled_counter("db_queries_total", "SQL statements executed, by endpoint", "endpoint")
+db_query_latency = metrics.labeled_histogram(
+    "db_query_duration_seconds", "SQL statement execution time, by endpoint", "endpoint", LATENCY_BUCKETS,
+)
+loop_lag = metrics.histogram("event_loop_lag_seconds", "How late the event loop woke a periodic sleeper", LATENCY_BUCKETS)
+
+
+# The ASGI scope of the request or WebSocket being served. The router stores
+# the matched route in it, which gives queries a low-cardinality label.
+_current_scope: ContextVar[Optional[dict]] = ContextVar("metrics_scope", default=None)
+
+
+class EndpointContextMiddleware:
+    """Makes the current request's scope available to the DB query listeners"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        token = _current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_scope.reset(token)
+
+
+def current_endpoint() -> str:
+    scope = _current_scope.get()
+    if scope is None:
+        return BACKGROUND
+    route = scope.get("route")
+    return route.path if route is not None else UNMATCHED
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    endpoint = current_endpoint()
+    db_queries.labels(endpoint).inc()
+    db_query_latency.labels(endpoint).observe(time.perf_counter() - context._metrics_started)
+
+
+def instrument_engine(engine):
+    """Count and time every statement run on a (sync) Engine"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class LoopLagMonitor:
+    """Sleeps `interval` seconds at a time and records how late it wakes up"""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.last = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.last = max(0.0, time.perf_counter() - started - self.interval)
+            loop_lag.observe(self.last)
+
+loop_lag_monitor = LoopLagMonitor()
+metrics.gauge("event_loop_lag_last_seconds", "Lag measured by the most recent loop lag sample", lambda: loop_lag_monitor.last)
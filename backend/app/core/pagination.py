@@ -0,0 +1,101 @@
+import base64
+import datetime
+import json
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+MAX_PAGE_SIZE = 200
+
+OLDER = "older"
+NEWER = "newer"
+
+
+def pack_cursor(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def unpack_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return values
+
+
+def encode_cursor(timestamp: datetime.datetime, row_id: int, direction: str) -> str:
+    return pack_cursor([timestamp.isoformat(), row_id, direction])
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, int, str]:
+    try:
+        timestamp, row_id, direction = unpack_cursor(cursor)
+        if direction not in (OLDER, NEWER):
+            raise ValueError(direction)
+        return datetime.datetime.fromisoformat(timestamp), int(row_id), direction
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def id_page(query: Query, id_column, cursor: Optional[str], limit: int) -> Tuple[List, Optional[str]]:
+    """Return one page of `query` in ascending `id_column` order, with the cursor for the next one"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if cursor:
+        try:
+            (after_id,) = unpack_cursor(cursor)
+            after_id = int(after_id)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        query = query.filter(id_column > after_id)
+    rows = query.order_by(id_column.asc()).limit(limit + 1).all()
+    next_cursor = pack_cursor([rows[limit - 1].id]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def keyset_page(query: Query, timestamp_column, id_column, cursor: Optional[str], limit: int) -> Tuple[List, Optional[str], Optional[str]]:
+    """
+    Return one newest-first page of `query` anchored on (timestamp, id).
+
+    `next_cursor` continues towards older rows and `prev_cursor` back towards
+    newer ones; either is None when there is nothing further in that direction.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    direction = OLDER
+    if cursor:
+        anchor_timestamp, anchor_id, direction = decode_cursor(cursor)
+        if direction == OLDER:
+            query = query.filter(or_(
+                timestamp_column < anchor_timestamp,
+                and_(timestamp_column == anchor_timestamp, id_column < anchor_id),
+            ))
+        else:
+            query = query.filter(or_(
+                timestamp_column > anchor_timestamp,
+                and_(timestamp_column == anchor_timestamp, id_column > anchor_id),
+            ))
+
+    if direction == OLDER:
+        query = query.order_by(timestamp_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(timestamp_column.asc(), id_column.asc())
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == NEWER:
+        rows.reverse()
+
+    if not rows:
+        return rows, None, None
+
+    more_older = has_more if direction == OLDER else True
+    more_newer = cursor is not None if direction == OLDER else has_more
+    next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id, OLDER) if more_older else None
+    prev_cursor = encode_cursor(rows[0].timestamp, rows[0].id, NEWER) if more_newer else None
+    return rows, next_cursor, prev_cursor
@@ -1,14 +1,18 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Callable, List, Optional, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..db import models, database, schemas
 from .config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token") 
 
@@ -32,28 +36,115 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_user(db: Session, username: str) -> Optional[models.User]:
-    return db.query(models.User).filter(models.User.username == username).first()
+async def get_user(db: AsyncSession, username: str) -> Optional[models.User]:
+    result = await db.execute(select(models.User).where(models.User.username == username))
+    return result.scalars().first()
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)) -> models.User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+@dataclass(frozen=True)
+class UserSnapshot:
+    """Immutable copy of the columns request handlers read from the caller's User row"""
+    id: int
+    username: str
+    email: Optional[str]
+    is_active: bool
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "UserSnapshot":
+        return cls(id=user.id, username=user.username, email=user.email, is_active=bool(user.is_active))
+
+
+class TokenCache:
+    """
+    Bounded LRU of verified access tokens to the user they identify.
+
+    An entry lives for at most `ttl` seconds (never past its token's `exp`)
+    or until it is pushed out by `max_entries` newer tokens. Hits skip both
+    the signature check and the users query, so a cached UserSnapshot can be
+    up to `ttl` stale. Code that changes a user's username, email or
+    is_active calls `invalidate_user`, which drops that user's entries here
+    and, through the listeners, on the other workers.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[UserSnapshot, float]]" = OrderedDict()
+        self._listeners: List[Callable[[int], None]] = []
+
+    def subscribe(self, listener: Callable[[int], None]):
+        """Call `listener(user_id)` after every local `invalidate_user`"""
+        self._listeners.append(listener)
+
+    def get(self, token: str) -> Optional[UserSnapshot]:
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        user, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[token]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return user
+
+    def put(self, token: str, user: UserSnapshot, expires_at: float):
+        now = time.time()
+        expires_at = min(expires_at, now + self.ttl)
+        if self.max_entries <= 0 or expires_at <= now:
+            return
+        self._entries[token] = (user, expires_at)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int, notify: bool = True):
+        """Drop every cached token of `user_id`, after a change to their row"""
+        for token in [token for token, (user, _) in self._entries.items() if user.id == user_id]:
+            del self._entries[token]
+        if notify:
+            for listener in self._listeners:
+                listener(user_id)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+token_cache = TokenCache(max_entries=settings.TOKEN_CACHE_MAX_ENTRIES, ttl=settings.TOKEN_CACHE_TTL_S)
+
+
+async def resolve_token(token: str, db: AsyncSession) -> Optional[UserSnapshot]:
+    """Return the user an access token belongs to, or None when it is invalid or expired"""
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
-            raise credentials_exception
+            return None
         token_data = schemas.TokenData(username=username)
     except JWTError:
-        raise credentials_exception
-    
+        return None
+
     user = await get_user(db, username=token_data.username)
     if user is None:
-        raise credentials_exception
+        return None
+    snapshot = UserSnapshot.from_user(user)
+    token_cache.put(token, snapshot, float(payload.get("exp", 0)))
+    return snapshot
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(database.get_async_db)) -> UserSnapshot:
+    user = await resolve_token(token, db)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
-async def get_current_active_user(current_user: models.User = Depends(get_current_user)) -> models.User:
+async def get_current_active_user(current_user: UserSnapshot = Depends(get_current_user)) -> UserSnapshot:
     return current_user
\ No newline at end of file
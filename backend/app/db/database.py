@@ -1,14 +1,29 @@
+from contextlib import asynccontextmanager
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db" 
+from ..core.config import settings
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db"
+ASYNC_SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./sql_app.db"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# DB_MODE=async serves the async endpoints and the WebSocket loop from an
+# aiosqlite-backed AsyncSession; DB_MODE=sync runs the same code paths on the
+# blocking Session through SyncSessionAdapter so the two can be compared.
+if settings.DB_MODE == "async":
+    async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+else:
+    async_engine = None
+    AsyncSessionLocal = None
+
 Base = declarative_base()
 
 def get_db():
@@ -16,4 +31,65 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+class SyncSessionAdapter:
+    """The subset of the AsyncSession API used by the async code paths, run inline on a blocking Session."""
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    async def execute(self, statement, params=None):
+        return self.sync_session.execute(statement, params)
+
+    async def scalar(self, statement, params=None):
+        return self.sync_session.scalar(statement, params)
+
+    async def scalars(self, statement, params=None):
+        return self.sync_session.scalars(statement, params)
+
+    async def get(self, entity, ident):
+        return self.sync_session.get(entity, ident)
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def delete(self, instance):
+        self.sync_session.delete(instance)
+
+    async def flush(self):
+        self.sync_session.flush()
+
+    async def commit(self):
+        self.sync_session.commit()
+
+    async def rollback(self):
+        self.sync_session.rollback()
+
+    async def refresh(self, instance):
+        self.sync_session.refresh(instance)
+
+    async def close(self):
+        self.sync_session.close()
+
+
+@asynccontextmanager
+async def async_session():
+    """Short-lived session for async code, honouring DB_MODE"""
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            yield session
+    else:
+        session = SyncSessionAdapter(SessionLocal())
+        try:
+            yield session
+        finally:
+            await session.close()
+
+async def get_async_db():
+    async with async_session() as db:
+        yield db
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from .database import Base
 import datetime
@@ -22,6 +22,11 @@ class Contact(Base):
     user = relationship("User", foreign_keys=[user_id])
     friend = relationship("User", foreign_keys=[friend_id])
 
+    __table_args__ = (
+        Index("ix_contacts_user_friend", "user_id", "friend_id"),
+        Index("ix_contacts_friend_user", "friend_id", "user_id"),
+    )
+
 class Message(Base):
     __tablename__ = "messages"
 
@@ -34,6 +39,11 @@ class Message(Base):
     sender = relationship("User", foreign_keys=[sender_id])
     receiver = relationship("User", foreign_keys=[receiver_id])
 
+    __table_args__ = (
+        Index("ix_messages_sender_receiver_timestamp", "sender_id", "receiver_id", "timestamp"),
+        Index("ix_messages_receiver_id_id", "receiver_id", "id"),
+    )
+
 class Group(Base):
     __tablename__ = "groups"
 
@@ -58,6 +68,10 @@ class GroupMember(Base):
     group = relationship("Group", back_populates="members")
     user = relationship("User")
 
+    __table_args__ = (
+        Index("ix_group_members_user_group", "user_id", "group_id"),
+    )
+
 class GroupMessage(Base):
     __tablename__ = "group_messages"
 
@@ -69,4 +83,54 @@ class GroupMessage(Base):
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
 
     group = relationship("Group", back_populates="messages")
-    sender = relationship("User", foreign_keys=[sender_id])
\ No newline at end of file
+    sender = relationship("User", foreign_keys=[sender_id])
+
+    __table_args__ = (
+        Index("ix_group_messages_group_timestamp", "group_id", "timestamp"),
+        Index("ix_group_messages_group_id_id", "group_id", "id"),
+    )
+
+class Conversation(Base):
+    __tablename__ = "conversations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)  # "direct" or "group"
+    # Direct conversations store the pair ordered so (a, b) and (b, a) match.
+    user_low_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    user_high_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    group_id = Column(Integer, ForeignKey("groups.id"), nullable=True, unique=True)
+    last_message_id = Column(Integer, nullable=True)
+    last_message_snippet = Column(String, nullable=True)
+    last_message_at = Column(DateTime, nullable=True)
+    last_sender_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+
+    participants = relationship("ConversationParticipant", back_populates="conversation")
+
+    __table_args__ = (
+        UniqueConstraint("user_low_id", "user_high_id", name="uq_conversations_direct_pair"),
+    )
+
+class ConversationParticipant(Base):
+    __tablename__ = "conversation_participants"
+
+    id = Column(Integer, primary_key=True, index=True)
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    unread_count = Column(Integer, default=0, nullable=False)
+    last_read_message_id = Column(Integer, nullable=True)
+    # Copy of conversations.last_message_at so the inbox is one index range scan.
+    last_message_at = Column(DateTime, nullable=True)
+
+    conversation = relationship("Conversation", back_populates="participants")
+
+    __table_args__ = (
+        UniqueConstraint("conversation_id", "user_id", name="uq_conversation_participants_member"),
+        Index("ix_conversation_participants_user_last_message", "user_id", "last_message_at"),
+    )
+
+# Next free id per table, for ids assigned before the row is written.
+class IdSequence(Base):
+    __tablename__ = "id_sequences"
+
+    name = Column(String, primary_key=True)
+    next_id = Column(Integer, nullable=False)
@@ -43,6 +43,9 @@ class UserSearchResult(BaseModel):
 
     model_config = {"from_attributes": True}
 
+class PresenceSnapshot(BaseModel):
+    online: list[int]
+
 class MessageBase(BaseModel):
     content: str
 
@@ -58,6 +61,12 @@ class Message(MessageBase):
     model_config = {"from_attributes": True}
 
 
+class MessagePage(BaseModel):
+    items: list[Message]
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+
 class GroupBase(BaseModel):
     name: str
 
@@ -90,6 +99,10 @@ class GroupMember(GroupMemberBase):
 
     model_config = {"from_attributes": True}
 
+class GroupMemberPage(BaseModel):
+    items: list[GroupMember]
+    next_cursor: Optional[str] = None
+
 class GroupMessageBase(BaseModel):
     content: str
 
@@ -105,9 +118,53 @@ class GroupMessage(GroupMessageBase):
 
     model_config = {"from_attributes": True}
 
+class GroupMessagePage(BaseModel):
+    items: list[GroupMessage]
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+class InboxEntry(BaseModel):
+    conversation_id: int
+    kind: str
+    group_id: Optional[int] = None
+    peer_id: Optional[int] = None
+    title: Optional[str] = None
+    last_message_id: Optional[int] = None
+    last_message_snippet: Optional[str] = None
+    last_message_at: Optional[datetime.datetime] = None
+    last_sender_id: Optional[int] = None
+    unread_count: int = 0
+    last_read_message_id: Optional[int] = None
+
+class MessageSearchHit(BaseModel):
+    kind: str
+    message_id: int
+    sender_id: int
+    receiver_id: Optional[int] = None
+    group_id: Optional[int] = None
+    timestamp: Optional[datetime.datetime] = None
+    snippet: str
+    # [start, end) offsets of the matched terms in snippet.
+    highlights: list[tuple[int, int]] = []
+    rank: float
+
+
+class MessageSearchPage(BaseModel):
+    items: list[MessageSearchHit]
+    next_cursor: Optional[str] = None
+
 
 class GroupDetails(Group):
+    member_count: int
+    admin_count: int
+    current_user_role: str
+    # The first page of members by join order; members_next_cursor continues
+    # through /groups/{id}/members/page.
     members: list[GroupMember] = []
+    members_next_cursor: Optional[str] = None
+    # The newest messages, newest first; messages_next_cursor continues
+    # through /groups/{id}/messages/page.
     messages: list[GroupMessage] = []
+    messages_next_cursor: Optional[str] = None
 
     model_config = {"from_attributes": True}
\ No newline at end of file
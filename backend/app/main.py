@@ -1,16 +1,68 @@
+from contextlib import asynccontextmanager
+from typing import Optional
 from fastapi import FastAPI, Depends, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .db import models, database, schemas
-from .api import auth, contacts_router, messages_router, group_router
+from .api import auth, contacts_router, messages_router, group_router, inbox_router, search_router, metrics_router
+from .core import metrics, security
 from .core.security import get_current_active_user
 from .services.signaling_service import manager
+from .services.conversation_service import conversation_service
+from .services.message_store import message_store
+from .services.search_service import search_service
+from .services.password_hasher import password_hasher
+from .services import wire_codec
+from .services.signaling_dispatcher import SignalContext
+from .services.signaling_handlers import admit_frame, close_session, dispatcher, reap_connection
+from .services.heartbeat import heartbeat_service
+from .services.presence_service import presence_service
+from .services.membership_index import membership_index
+from .services.message_sync import message_sync
+from .services.admission import TRY_AGAIN_LATER_CLOSE_CODE, AdmissionRejected, admission_gate
+from .services.sfu import sfu_service
 import json
+import time
 
 models.Base.metadata.create_all(bind=database.engine)
-
-app = FastAPI()
+# create_all skips tables that already exist, so indexes added to existing
+# tables later on are created here.
+for table in models.Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=database.engine, checkfirst=True)
+
+search_service.ensure_schema(database.engine)
+
+metrics.instrument_engine(database.engine)
+if database.async_engine is not None:
+    metrics.instrument_engine(database.async_engine.sync_engine)
+
+with database.SessionLocal() as startup_db:
+    conversation_service.backfill(startup_db)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await manager.start()
+    await message_store.start()
+    password_hasher.start()
+    await presence_service.start()
+    await heartbeat_service.start(reap_connection)
+    await metrics.loop_lag_monitor.start()
+    yield
+    await metrics.loop_lag_monitor.stop()
+    await heartbeat_service.stop()
+    await presence_service.stop()
+    await sfu_service.stop()
+    password_hasher.stop()
+    await message_store.stop()
+    await manager.stop()
+    if database.async_engine is not None:
+        await database.async_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,43 +71,52 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.EndpointContextMiddleware)
 
 app.include_router(auth.router)
 app.include_router(contacts_router.router)
 app.include_router(messages_router.router)
 app.include_router(group_router.router)
+app.include_router(inbox_router.router)
+app.include_router(search_router.router)
+app.include_router(metrics_router.router)
 
 
-async def notify_user_of_ongoing_calls(db: Session, user_id: int):
+async def notify_user_of_ongoing_calls(db: AsyncSession, user_id: int):
     """Notify user of ongoing group calls in their groups when they connect"""
     try:
-        user_groups = db.query(models.GroupMember).filter(
-            models.GroupMember.user_id == user_id
-        ).all()
-        
+        # Both sides of the intersection are in memory; only group names not
+        # cached yet cost a query, and then a single one.
+        active_group_ids = manager.calls.active_group_ids()
+        if not active_group_ids:
+            return
+        group_ids = active_group_ids & await membership_index.get_user_group_ids(db, user_id)
+        if not group_ids:
+            return
+        group_names = await membership_index.get_group_names(db, group_ids)
+
         ongoing_calls = []
-        for group_membership in user_groups:
-            group_id = group_membership.group_id
-            if manager.is_group_call_active(group_id):
-                group = db.query(models.Group).filter(models.Group.id == group_id).first()
-                if group:
-                    participants = manager.get_group_call_participants(group_id)
-                    call_info = {
-                        'groupId': group_id,
-                        'groupName': group.name,
-                        'participants': participants,
-                        'participantCount': len(participants),
-                        'isVideo': manager.get_group_call_type(group_id)
-                    }
-                    ongoing_calls.append(call_info)
-        
+        for group_id in sorted(group_names):
+            participants = manager.get_group_call_participants(group_id)
+            if not participants:
+                continue
+            call_info = {
+                'groupId': group_id,
+                'groupName': group_names[group_id],
+                'participants': participants,
+                'participantCount': len(participants),
+                'isVideo': manager.get_group_call_type(group_id),
+                'mode': manager.get_group_call_mode(group_id),
+            }
+            ongoing_calls.append(call_info)
+
         if ongoing_calls:
             notification = {
                 'type': 'ongoing-group-calls',
                 'calls': ongoing_calls
             }
             await manager.send_personal_message(notification, user_id)
-            
+
     except Exception as e:
         print(f"Error notifying user {user_id} of ongoing calls: {e}")
         
@@ -66,223 +127,83 @@ def read_root():
 
 
 @app.websocket("/ws/{user_id_str}")
-async def websocket_endpoint(websocket: WebSocket, user_id_str: str, db: Session = Depends(database.get_db)):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    user_id_str: str,
+    token: Optional[str] = None,
+    codec: Optional[str] = None,
+    lastMessageId: Optional[int] = None,
+    lastGroupMessageId: Optional[int] = None,
+    db: AsyncSession = Depends(database.get_async_db),
+):
     try:
         user_id = int(user_id_str)
     except ValueError:
         await websocket.close(code=4001)
         return
 
-    await manager.connect(websocket, user_id)
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
-    username_for_log = db_user.username if db_user else f"user_{user_id}"
-    
-    await notify_user_of_ongoing_calls(db, user_id)
+    # Handshakes are the expensive part of a reconnect storm; only a few run
+    # at a time and the rest queue, or are told when to come back.
+    try:
+        admitted_at = await admission_gate.acquire()
+    except AdmissionRejected as rejected:
+        await db.close()
+        await websocket.accept()
+        await websocket.close(code=TRY_AGAIN_LATER_CLOSE_CODE, reason=json.dumps({"retryAfter": rejected.retry_after}))
+        return
+
+    try:
+        # The token must belong to the user id in the path: the socket gets
+        # that user's live traffic and, through message sync, their stored
+        # history. It is usually already in the token cache from the
+        # client's REST calls.
+        db_user = await security.resolve_token(token, db) if token else None
+        if db_user is None or db_user.id != user_id or not db_user.is_active:
+            await db.close()
+            await websocket.close(code=4003)
+            return
+
+        wire, subprotocol = wire_codec.negotiate(codec, websocket.scope.get("subprotocols", ()))
+        await manager.connect(websocket, user_id, wire, subprotocol)
+        liveness = heartbeat_service.watch(user_id, websocket)
+        presence_service.mark_changed(user_id)
+
+        await notify_user_of_ongoing_calls(db, user_id)
+        # Clients that pass the last ids they saw get only what they missed.
+        if lastMessageId is not None or lastGroupMessageId is not None:
+            await message_sync.push_missed(db, user_id, lastMessageId, lastGroupMessageId)
+        context = SignalContext(user_id=user_id, username=db_user.username, db=db)
+        # The session lives as long as the socket; closing it hands the pooled
+        # connection back between frames instead of pinning one per user.
+        await db.close()
+    finally:
+        admission_gate.release(admitted_at)
 
     try:
         while True:
-            data = await websocket.receive_text()
+            frame = await websocket.receive()
+            received_ns = time.perf_counter_ns()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            liveness.touch()
+            data = frame.get("text")
             try:
-                message_data = json.loads(data)
-                msg_type = message_data.get("type")
-                
-                if db_user and 'sender_username' not in message_data:
-                    message_data["sender_username"] = db_user.username
-
-                target_user_id_str = message_data.get("to") or message_data.get("targetUserId")
-                target_user_id = None
-                if target_user_id_str:
-                    try:
-                        target_user_id = int(target_user_id_str)
-                    except ValueError:
-                        await manager.send_personal_message({"type":"error", "detail": f"Invalid target user_id: {target_user_id_str}"}, user_id)
-                        continue
-                
-                group_id_str = message_data.get("groupId")
-                group_id = None
-                if group_id_str:
-                    try:
-                        group_id = int(group_id_str)
-                    except ValueError:
-                        await manager.send_personal_message({"type":"error", "detail": f"Invalid groupId: {group_id_str}"}, user_id)
-                        continue
-
-                call_signaling_types = [
-                    "call_offer", "call_answer", "candidate", 
-                    "call_rejected", "call_busy", "call_ended"
-                ]
-                group_call_signaling_types = [
-                    "group-call-start", "group-call-offer", "group-call-answer",
-                    "group-call-join", "group-call-leave", "group-call-user-joined", "group-call-ended", "group-call-busy"
-                ]
-
-                if msg_type in call_signaling_types:
-                    message_data["from"] = user_id
-                    if target_user_id is not None:
-                        await manager.send_personal_message(message_data, target_user_id)
-                    else:
-                        await manager.send_personal_message({
-                            "type": "error", 
-                            "detail": f"{msg_type} requires a 'to' or 'targetUserId' field specifying the target user ID."
-                        }, user_id)
-                
-                elif msg_type in group_call_signaling_types:
-                    if not group_id:
-                        await manager.send_personal_message({"type":"error", "detail": f"{msg_type} requires a 'groupId' field."}, user_id)
-                        continue
-
-                    member_check = db.query(models.GroupMember).filter(models.GroupMember.group_id == group_id, models.GroupMember.user_id == user_id).first()
-                    if not member_check:
-                        await manager.send_personal_message({"type":"error", "detail": f"You are not a member of group {group_id}."}, user_id)
-                        continue
-                    
-                    message_data['groupId'] = group_id               
-                    message_data['userId'] = user_id                     
-                    message_data['sender_username'] = username_for_log 
-                    is_video = message_data.get('isVideo', False)
-                    if msg_type == "group-call-start":
-                        await manager.start_group_call(group_id, user_id, is_video)
-    
-                        group_members = db.query(models.GroupMember).filter(
-                            models.GroupMember.group_id == group_id,
-                            models.GroupMember.user_id != user_id
-                        ).all()
-                        
-                        start_notification = {
-                            'type': 'group-call-start',
-                            'userId': user_id,
-                            'sender_username': username_for_log,
-                            'groupId': group_id,
-                            'groupName': message_data.get('groupName'),
-                            'isVideo': message_data.get('isVideo', False),
-                            'recipients': message_data.get('recipients', [])
-                        }
-                        
-                        for member in group_members:
-                            if manager.is_user_connected(member.user_id):
-                                await manager.send_personal_message(start_notification, member.user_id)
-
-                    elif msg_type == "group-call-join":
-                        active_participants = await manager.join_group_call(group_id, user_id)
-                        
-                        join_notification = {
-                            'type': 'group-call-join',
-                            'userId': user_id,
-                            'sender_username': username_for_log,
-                            'groupId': group_id,
-                            'groupName': message_data.get('groupName'),
-                            'isVideo': message_data.get('isVideo', False),
-                            'activeParticipants': active_participants,
-                        }
-                        await manager.send_to_group_call_participants(group_id, join_notification, sender_user_id=user_id)
-
-                    elif msg_type == "group-call-leave":
-                        status = await manager.leave_group_call(group_id, user_id)
-                        if status == "ended":
-                            end_notification = {
-                                'type': 'group-call-ended',
-                                'userId': user_id,
-                                'sender_username': username_for_log,
-                                'groupId': group_id,
-                                'reason': 'Last participant left the call'
-                            }
-                            await manager.broadcast_to_group(db, group_id, end_notification)
-                        elif status == "left":
-                            leave_notification = {
-                                'type': 'group-call-leave',
-                                'userId': user_id,
-                                'sender_username': username_for_log,
-                                'groupId': group_id
-                            }
-                            await manager.send_to_group_call_participants(group_id, leave_notification, sender_user_id=user_id)
-                            
-                    elif msg_type == "group-call-busy":
-                        if target_user_id:
-                            busy_notification = {
-                                'type': 'group-call-busy',
-                                'userId': user_id,
-                                'sender_username': username_for_log,
-                                'groupId': group_id,
-                                'to': target_user_id,
-                                'reason': message_data.get('reason', 'User is busy')
-                            }
-                            await manager.send_personal_message(busy_notification, target_user_id)
-                        else:
-                            busy_notification = {
-                                'type': 'group-call-busy',
-                                'userId': user_id,
-                                'sender_username': username_for_log,
-                                'groupId': group_id,
-                                'reason': message_data.get('reason', 'User is busy')
-                            }
-                            await manager.send_to_group_call_participants(group_id, busy_notification, sender_user_id=user_id)
-                    
-                    elif msg_type == "group-call-offer":
-                        if not manager.is_user_in_group_call(group_id, user_id):
-                            await manager.join_group_call(group_id, user_id)
-                        
-                        if target_user_id:
-                            await manager.send_personal_message(message_data, target_user_id)
-                        else:
-                            await manager.send_to_group_call_participants(group_id, message_data, sender_user_id=user_id)
-                    
-                    elif msg_type == "group-call-answer":
-                        if target_user_id:
-                            await manager.send_personal_message(message_data, target_user_id)
-                        else:
-                            await manager.send_to_group_call_participants(group_id, message_data, sender_user_id=user_id)
-                        
-                    elif msg_type == "candidate":
-                        if group_id:
-                                await manager.send_to_group_call_participants(group_id, message_data, sender_user_id=user_id)
-                        elif target_user_id:
-                            await manager.send_personal_message(message_data, target_user_id)
-                        else:
-                            await manager.send_personal_message({
-                                "type": "error", 
-                                "detail": "ICE candidate requires either 'to' field or 'groupId' field."
-                            }, user_id)
-                    
-                    else:
-                        await manager.send_to_group_call_participants(group_id, message_data, sender_user_id=user_id)
-
-                elif msg_type == "chat_message":
-                    if target_user_id:
-                        await manager.send_personal_message(message_data, target_user_id)
-                    else: 
-                        await manager.broadcast(message_data, sender_user_id=user_id)
-
-                elif msg_type == "join": 
-                    join_username = message_data.get("username", username_for_log) 
-                    await manager.broadcast({"type": "user_joined", "user_id": user_id, "username": join_username}, sender_user_id=user_id)
-                else:
-                    await manager.broadcast(message_data, sender_user_id=user_id)
+                # Text frames are always JSON; binary frames use the negotiated codec.
+                message_data = wire_codec.JSON.decode(data) if data is not None else wire.decode(frame["bytes"])
+                if await admit_frame(context, websocket, message_data.get("type")):
+                    await dispatcher.dispatch(context, message_data, received_ns)
             except json.JSONDecodeError:
-                await manager.broadcast({"type": "text", "from_user_id": user_id, "content": data}, sender_user_id=user_id)
+                # Plain text is relayed to everyone, so it spends the chat budget.
+                if await admit_frame(context, websocket, "chat_message"):
+                    await manager.broadcast({"type": "text", "from_user_id": user_id, "content": data}, sender_user_id=user_id)
             except Exception as e:
                 await manager.send_personal_message({"type":"error", "detail": f"Error processing your message: {str(e)}"}, user_id)
+            finally:
+                await db.close()
 
     except WebSocketDisconnect:
-        manager.disconnect(user_id)
-        for group_id_active, members in list(manager.active_group_calls.items()):
-            if user_id in members:
-                status = await manager.leave_group_call(group_id_active, user_id)                 
-                if status == "ended":
-                    disconnect_notification = {
-                        'type': 'group-call-ended',
-                        'groupId': group_id_active,
-                        'reason': f'{username_for_log} disconnected, ending the call.'
-                    }
-                    await manager.broadcast_to_group(db, group_id_active, disconnect_notification)
-                elif status == "left":
-                    disconnect_notification = {
-                        'type': 'group-call-leave',
-                        'userId': user_id,
-                        'sender_username': username_for_log, 
-                        'groupId': group_id_active
-                    }
-                    await manager.send_to_group_call_participants(group_id_active, disconnect_notification, sender_user_id=user_id)
-        await manager.broadcast({"type": "user_left", "user_id": user_id, "username": username_for_log})
+        pass
     except Exception as e:
-        manager.disconnect(user_id)
-        await manager.broadcast({"type": "user_left", "user_id": user_id, "username": username_for_log, "error": str(e)})
\ No newline at end of file
+        print(f"WebSocket error for user {user_id}: {e}")
+    finally:
+        await close_session(user_id, websocket, context.username)
@@ -0,0 +1,125 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque
+
+from ..core.config import settings
+from ..core.metrics import LATENCY_BUCKETS, metrics
+
+# RFC 6455 "Try Again Later"; the close reason carries {"retryAfter": seconds}.
+TRY_AGAIN_LATER_CLOSE_CODE = 1013
+
+admission_wait = metrics.histogram(
+    "ws_admission_wait_seconds", "Time WebSocket handshakes waited for an admission slot", LATENCY_BUCKETS,
+)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionGate:
+    """
+    Caps how many WebSocket handshakes run at once.
+
+    Up to `max_in_progress` connects do their handshake work (token check,
+    user lookup, ongoing-call notice, message sync) concurrently; the rest
+    queue in arrival order. A connect that cannot get a slot within
+    `max_wait_s`, or arrives to a full queue, is turned away with a
+    suggested retry delay: the time the current queue should take to drain
+    at the recent handshake duration, and at least `retry_after_s`. A fleet
+    reconnecting after a restart spreads itself out instead of all waiting
+    on the same slots. max_in_progress=0 admits everything.
+    """
+
+    def __init__(self, max_in_progress: int, max_queued: int, max_wait_s: float, retry_after_s: float):
+        self.max_in_progress = max_in_progress
+        self.max_queued = max_queued
+        self.max_wait = max_wait_s
+        self.retry_after = retry_after_s
+        self.in_progress = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.rejected = 0
+        # Moving average of how long a handshake holds its slot.
+        self.average_hold = 0.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def suggest_retry_after(self) -> float:
+        drain = self.queued * self.average_hold / max(self.max_in_progress, 1)
+        return round(min(max(self.retry_after, drain), 30.0), 1)
+
+    def _reject(self):
+        self.rejected += 1
+        raise AdmissionRejected(self.suggest_retry_after())
+
+    async def acquire(self) -> float:
+        """Wait for a slot; returns the time it was granted, to pass back to release()"""
+        if self.max_in_progress <= 0 or (self.in_progress < self.max_in_progress and not self._waiters):
+            self.in_progress += 1
+            self.admitted += 1
+            admission_wait.observe(0.0)
+            return time.perf_counter()
+        if len(self._waiters) >= self.max_queued:
+            self._reject()
+
+        started = time.perf_counter()
+        slot = asyncio.get_running_loop().create_future()
+        self._waiters.append(slot)
+        try:
+            await asyncio.wait_for(asyncio.shield(slot), self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if slot.done():
+                # The slot was handed over just as the wait ended.
+                if isinstance(exc, asyncio.CancelledError):
+                    self.release(time.perf_counter())
+                    raise
+            else:
+                slot.cancel()
+                self._waiters.remove(slot)
+                if isinstance(exc, asyncio.CancelledError):
+                    raise
+                self._reject()
+        self.admitted += 1
+        granted = time.perf_counter()
+        admission_wait.observe(granted - started)
+        return granted
+
+    def release(self, granted: float):
+        self.average_hold += 0.05 * (time.perf_counter() - granted - self.average_hold)
+        # Hand the slot straight to the longest waiter, if any.
+        while self._waiters:
+            slot = self._waiters.popleft()
+            if not slot.done():
+                slot.set_result(None)
+                return
+        self.in_progress -= 1
+
+    @asynccontextmanager
+    async def admit(self):
+        granted = await self.acquire()
+        try:
+            yield
+        finally:
+            self.release(granted)
+
+    def stats(self) -> dict:
+        return {
+            "in_progress": self.in_progress,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+admission_gate = AdmissionGate(
+    max_in_progress=settings.ADMISSION_MAX_IN_PROGRESS,
+    max_queued=settings.ADMISSION_MAX_QUEUED,
+    max_wait_s=settings.ADMISSION_MAX_WAIT_S,
+    retry_after_s=settings.ADMISSION_RETRY_AFTER_S,
+)
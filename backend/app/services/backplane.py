@@ -0,0 +1,238 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+EventHandler = Callable[[dict], Awaitable[None]]
+
+# Relayed frames carry full SDP bodies, so allow lines well past the 64 KiB default.
+STREAM_LIMIT = 4 * 1024 * 1024
+
+
+class Backplane:
+    """Carries ConnectionManager events between worker processes.
+
+    Every event is a JSON-serialisable dict with an ``op`` key and the ``node``
+    id of the publisher. Implementations deliver each event to every other
+    node exactly once and never echo it back to the publisher.
+
+    ``publish`` may be called from any thread, e.g. sync endpoints running in
+    the threadpool; events published off the event loop are handed to it
+    with ``call_soon_threadsafe``. Implementations override ``_publish``,
+    which always runs on the loop.
+    """
+
+    def __init__(self):
+        self.node_id = uuid.uuid4().hex
+        self._handler: Optional[EventHandler] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self, handler: EventHandler):
+        self._handler = handler
+        self._loop = asyncio.get_running_loop()
+
+    async def stop(self):
+        self._handler = None
+
+    def publish(self, event: dict):
+        event.setdefault("node", self.node_id)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if self._loop is not None and running is not self._loop:
+            self._loop.call_soon_threadsafe(self._publish, event)
+        else:
+            self._publish(event)
+
+    def _publish(self, event: dict):
+        raise NotImplementedError
+
+    async def _dispatch(self, event: dict):
+        if self._handler is None or event.get("node") == self.node_id:
+            return
+        try:
+            await self._handler(event)
+        except Exception:
+            logger.exception("Backplane handler failed for op %s", event.get("op"))
+
+
+class InProcessHub:
+    """Shared bus for several InProcessBackplane instances living in one process."""
+
+    def __init__(self):
+        self.members: List["InProcessBackplane"] = []
+
+
+class InProcessBackplane(Backplane):
+    """Backplane for a single worker.
+
+    Without a hub the node has no peers and ``publish`` is a no-op. Passing the
+    same hub to several managers lets them exchange events inside one event
+    loop, which is how multi-node behaviour is exercised without a broker.
+    """
+
+    def __init__(self, hub: Optional[InProcessHub] = None):
+        super().__init__()
+        self.hub = hub or InProcessHub()
+
+    async def start(self, handler: EventHandler):
+        await super().start(handler)
+        if self not in self.hub.members:
+            self.hub.members.append(self)
+
+    async def stop(self):
+        if self in self.hub.members:
+            self.hub.members.remove(self)
+        await super().stop()
+
+    def _publish(self, event: dict):
+        for member in self.hub.members:
+            if member is not self:
+                asyncio.get_running_loop().create_task(member._dispatch(dict(event)))
+
+
+class SocketBackplane(Backplane):
+    """Backplane that talks to a BackplaneBroker over a local TCP socket.
+
+    Events are newline-delimited JSON. Outgoing events are queued so that
+    ``publish`` never blocks the caller; if the broker is unreachable the
+    client keeps reconnecting and events that overflow the outbox are dropped.
+    """
+
+    def __init__(self, host: str, port: int, outbox_size: int = 10000):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self._outbox: asyncio.Queue = asyncio.Queue(maxsize=outbox_size)
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, handler: EventHandler):
+        await super().start(handler)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await super().stop()
+
+    def _publish(self, event: dict):
+        try:
+            self._outbox.put_nowait(json.dumps(event).encode() + b"\n")
+        except asyncio.QueueFull:
+            logger.warning("Backplane outbox full, dropping %s event", event.get("op"))
+
+    async def _run(self):
+        backoff = 0.5
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port, limit=STREAM_LIMIT)
+            except OSError as e:
+                logger.warning("Backplane broker %s:%s unreachable: %s", self.host, self.port, e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 10)
+                continue
+
+            backoff = 0.5
+            writer.write(json.dumps({"op": "hello", "node": self.node_id}).encode() + b"\n")
+            await self._dispatch_local({"op": "connected", "node": ""})
+            sender = asyncio.get_running_loop().create_task(self._pump(writer))
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    await self._dispatch(event)
+            finally:
+                sender.cancel()
+                writer.close()
+            logger.warning("Lost connection to backplane broker, reconnecting")
+
+    async def _pump(self, writer: asyncio.StreamWriter):
+        while True:
+            line = await self._outbox.get()
+            writer.write(line)
+            await writer.drain()
+
+    async def _dispatch_local(self, event: dict):
+        # Lets the manager re-announce its state after every (re)connect.
+        if self._handler is not None:
+            await self._handler(event)
+
+
+class BackplaneBroker:
+    """Fan-out hub for SocketBackplane clients.
+
+    Relays every line to all other connected nodes and emits ``node_down``
+    when a node's connection drops so peers can forget its users.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._clients: Dict[asyncio.StreamWriter, Optional[str]] = {}
+
+    async def serve_forever(self):
+        server = await asyncio.start_server(self._handle_client, self.host, self.port, limit=STREAM_LIMIT)
+        logger.info("Backplane broker listening on %s:%s", self.host, self.port)
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._clients[writer] = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if self._clients[writer] is None:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if event.get("op") == "hello":
+                        self._clients[writer] = event.get("node")
+                        continue
+                await self._relay(line, exclude=writer)
+        except ConnectionError:
+            pass
+        finally:
+            node_id = self._clients.pop(writer, None)
+            writer.close()
+            if node_id:
+                await self._relay(json.dumps({"op": "node_down", "node": "broker", "down_node": node_id}).encode() + b"\n")
+
+    async def _relay(self, line: bytes, exclude: Optional[asyncio.StreamWriter] = None):
+        for client in list(self._clients):
+            if client is exclude:
+                continue
+            try:
+                client.write(line)
+                await client.drain()
+            except ConnectionError:
+                self._clients.pop(client, None)
+
+
+def create_backplane() -> Backplane:
+    if settings.BACKPLANE == "socket":
+        return SocketBackplane(settings.BACKPLANE_HOST, settings.BACKPLANE_PORT)
+    return InProcessBackplane()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(BackplaneBroker(settings.BACKPLANE_HOST, settings.BACKPLANE_PORT).serve_forever())
@@ -0,0 +1,119 @@
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+ENDED = "ended"
+LEFT = "left"
+NOT_IN_CALL = "not_in_call"
+
+
+@dataclass
+class GroupCall:
+    group_id: int
+    initiator_id: int
+    is_video: bool = False
+    mode: str = "mesh"
+    started_at: float = field(default_factory=time.time)
+    # Used as an ordered set: join order is kept for activeParticipants.
+    participants: Dict[int, None] = field(default_factory=dict)
+
+    def participant_ids(self) -> List[int]:
+        return list(self.participants)
+
+    def to_dict(self) -> dict:
+        return {
+            "participants": self.participant_ids(),
+            "is_video": self.is_video,
+            "mode": self.mode,
+            "initiator_id": self.initiator_id,
+            "started_at": self.started_at,
+        }
+
+
+class CallRegistry:
+    """
+    Active group calls keyed by group, with a user -> groups reverse index.
+
+    Joining, leaving and checking membership are O(1); ending a call or
+    removing a user from all their calls touches only the calls involved.
+    A call is removed, metadata included, when its last participant leaves.
+    """
+
+    def __init__(self):
+        self._calls: Dict[int, GroupCall] = {}
+        self._by_user: Dict[int, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def __iter__(self) -> Iterator[GroupCall]:
+        return iter(list(self._calls.values()))
+
+    def get(self, group_id: int) -> Optional[GroupCall]:
+        return self._calls.get(group_id)
+
+    def start(self, group_id: int, user_id: int, is_video: bool = False, mode: str = "mesh") -> GroupCall:
+        call = self._calls.get(group_id)
+        if call is None:
+            call = self._calls[group_id] = GroupCall(group_id, initiator_id=user_id, mode=mode)
+        call.is_video = is_video
+        self._add(call, user_id)
+        return call
+
+    def join(self, group_id: int, user_id: int) -> GroupCall:
+        call = self._calls.get(group_id)
+        if call is None:
+            call = self._calls[group_id] = GroupCall(group_id, initiator_id=user_id)
+        self._add(call, user_id)
+        return call
+
+    def _add(self, call: GroupCall, user_id: int):
+        call.participants[user_id] = None
+        self._by_user.setdefault(user_id, set()).add(call.group_id)
+
+    def leave(self, group_id: int, user_id: int) -> str:
+        """Returns ENDED when the user was the last participant, LEFT otherwise, or NOT_IN_CALL"""
+        call = self._calls.get(group_id)
+        if call is None or user_id not in call.participants:
+            return NOT_IN_CALL
+        del call.participants[user_id]
+        self._forget(user_id, group_id)
+        if not call.participants:
+            del self._calls[group_id]
+            return ENDED
+        return LEFT
+
+    def leave_all(self, user_id: int) -> List[Tuple[int, str]]:
+        """Remove the user from every call they are in; returns (group_id, status) per call"""
+        return [(group_id, self.leave(group_id, user_id)) for group_id in list(self._by_user.get(user_id, ()))]
+
+    def end(self, group_id: int) -> Optional[GroupCall]:
+        call = self._calls.pop(group_id, None)
+        if call is not None:
+            for user_id in call.participants:
+                self._forget(user_id, group_id)
+        return call
+
+    def _forget(self, user_id: int, group_id: int):
+        group_ids = self._by_user.get(user_id)
+        if group_ids is not None:
+            group_ids.discard(group_id)
+            if not group_ids:
+                del self._by_user[user_id]
+
+    def is_active(self, group_id: int) -> bool:
+        return group_id in self._calls
+
+    def is_participant(self, group_id: int, user_id: int) -> bool:
+        call = self._calls.get(group_id)
+        return call is not None and user_id in call.participants
+
+    def participants(self, group_id: int) -> List[int]:
+        call = self._calls.get(group_id)
+        return call.participant_ids() if call is not None else []
+
+    def calls_for_user(self, user_id: int) -> Set[int]:
+        return set(self._by_user.get(user_id, ()))
+
+    def active_group_ids(self) -> Set[int]:
+        return set(self._calls)
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Optional, Tuple, Union
+
+from fastapi import WebSocket
+
+from .wire_codec import JSON, WireCodec
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+
+SLOW_CONSUMER_CLOSE_CODE = 4008
+
+
+@dataclass
+class SendQueueStats:
+    dropped_frames: int = 0
+    slow_consumer_disconnects: int = 0
+    send_failures: int = 0
+
+
+class ConnectionWriter:
+    """Owns all writes to one WebSocket.
+
+    Senders enqueue frames already encoded with ``codec`` (text for JSON,
+    bytes for the binary codecs) and return immediately; a single
+    task per connection drains the queue in order. When the queue is full the
+    overflow policy decides what happens: ``drop_oldest`` discards the oldest
+    frame that was enqueued as droppable (or the new frame, if it is droppable
+    itself) and falls back to disconnecting when nothing can be dropped;
+    ``disconnect`` closes the slow consumer straight away.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_size: int,
+        overflow_policy: str,
+        stats: SendQueueStats,
+        on_closed: Callable[["ConnectionWriter"], None],
+        codec: WireCodec = JSON,
+    ):
+        self.websocket = websocket
+        self.codec = codec
+        self.max_size = max_size
+        self.overflow_policy = overflow_policy
+        self.stats = stats
+        self.dropped = 0
+        self.closed = False
+        self._on_closed = on_closed
+        self._queue: Deque[Tuple[Union[str, bytes], bool]] = deque()
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def enqueue(self, payload: Union[str, bytes], droppable: bool = False) -> bool:
+        """Queue an encoded frame. Returns False if the frame was not queued."""
+        if self.closed:
+            return False
+        if len(self._queue) >= self.max_size and not self._make_room():
+            if droppable and self.overflow_policy == DROP_OLDEST:
+                self._count_drop()
+                return False
+            self._close_slow_consumer()
+            return False
+        self._queue.append((payload, droppable))
+        self._ready.set()
+        return True
+
+    def _make_room(self) -> bool:
+        if self.overflow_policy != DROP_OLDEST:
+            return False
+        for index, (_, droppable) in enumerate(self._queue):
+            if droppable:
+                del self._queue[index]
+                self._count_drop()
+                return True
+        return False
+
+    def _count_drop(self):
+        self.dropped += 1
+        self.stats.dropped_frames += 1
+
+    def _close_slow_consumer(self):
+        self.stats.slow_consumer_disconnects += 1
+        logger.warning("Closing slow consumer with %d queued frames", len(self._queue))
+        self.close()
+        asyncio.get_running_loop().create_task(self._close_socket(SLOW_CONSUMER_CLOSE_CODE))
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def _run(self):
+        while True:
+            while not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+            payload, _ = self._queue.popleft()
+            try:
+                if isinstance(payload, bytes):
+                    await self.websocket.send_bytes(payload)
+                else:
+                    await self.websocket.send_text(payload)
+            except Exception:
+                self.stats.send_failures += 1
+                self.close()
+                return
+
+    def close(self):
+        """Stop writing and discard queued frames. Safe to call more than once."""
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        self._on_closed(self)
@@ -1,31 +1,56 @@
+from sqlalchemy import Row, case, or_, select, union
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
-from typing import List
+from typing import Dict, Iterable, List, Sequence, Set
 
 from ..db import models, schemas
+from .user_search_index import user_search_index
 
 class ContactService:
-    def search_users(self, db: Session, current_user_id: int, username_query: str, for_group:bool = False) -> List[models.User]:
+    def search_users(self, db: Session, current_user_id: int, username_query: str, for_group:bool = False, limit: int = 20) -> List[dict]:
         """
         Search for users by username, excluding the current user and users already in contacts.
+        Served from the in-memory user search index, best matches first.
         """
         if not username_query:
             return []
         
         exclude_ids = {current_user_id}
         if not for_group:
-            existing_contact_friend_ids = db.query(models.Contact.friend_id).filter(models.Contact.user_id == current_user_id).all()
-            existing_contact_user_ids = db.query(models.Contact.user_id).filter(models.Contact.friend_id == current_user_id).all()
-            
-            for fid in existing_contact_friend_ids:
-                exclude_ids.add(fid[0])
-            for uid in existing_contact_user_ids:
-                exclude_ids.add(uid[0])
+            exclude_ids |= self.get_contact_ids(db, current_user_id)
 
-        return db.query(models.User).filter(
-            models.User.username.contains(username_query),
-            ~models.User.id.in_(exclude_ids) 
+        user_search_index.ensure_loaded(db)
+        matches = user_search_index.search(username_query, exclude_ids, limit)
+        return [{"id": user_id, "username": username} for user_id, username in matches]
+
+    def get_contact_ids(self, db: Session, user_id: int) -> Set[int]:
+        """
+        Ids of everyone on either side of a contact relationship with the user, in one query.
+        """
+        other_id = case((models.Contact.user_id == user_id, models.Contact.friend_id), else_=models.Contact.user_id)
+        rows = db.query(other_id).filter(
+            (models.Contact.user_id == user_id) | (models.Contact.friend_id == user_id)
         ).all()
+        return {row[0] for row in rows}
+
+    async def get_contact_ids_for_users(self, db: AsyncSession, user_ids: Iterable[int]) -> Dict[int, Set[int]]:
+        """
+        Contact ids for each of several users, in one query.
+        """
+        user_ids = list(user_ids)
+        contact_ids: Dict[int, Set[int]] = {user_id: set() for user_id in user_ids}
+        if not user_ids:
+            return contact_ids
+        result = await db.execute(select(models.Contact.user_id, models.Contact.friend_id).where(or_(
+            models.Contact.user_id.in_(user_ids), models.Contact.friend_id.in_(user_ids)
+        )))
+        for user_id, friend_id in result.all():
+            if user_id in contact_ids:
+                contact_ids[user_id].add(friend_id)
+            if friend_id in contact_ids:
+                contact_ids[friend_id].add(user_id)
+        return contact_ids
 
     def add_contact(self, db: Session, user_id: int, friend_id: int) -> models.Contact:
         """
@@ -52,26 +77,18 @@ class ContactService:
         db.refresh(db_contact)
         return db_contact
 
-    def get_contacts(self, db: Session, user_id: int) -> List[models.User]:
+    def get_contacts(self, db: Session, user_id: int) -> Sequence[Row]:
         """
         Retrieve all contacts (friends) for a given user.
-        Returns a list of User objects.
+        Returns (id, username) rows, in one query over both contact indexes.
         """
-        contacts = db.query(models.Contact).filter(
-            (models.Contact.user_id == user_id) | (models.Contact.friend_id == user_id)
+        friend_ids = union(
+            select(models.Contact.friend_id).where(models.Contact.user_id == user_id),
+            select(models.Contact.user_id).where(models.Contact.friend_id == user_id),
+        )
+        return db.execute(
+            select(models.User.id, models.User.username).where(models.User.id.in_(friend_ids))
         ).all()
-        
-        friend_ids = set()
-        for contact in contacts:
-            if contact.user_id == user_id:
-                friend_ids.add(contact.friend_id)
-            else:
-                friend_ids.add(contact.user_id)
-        
-        if not friend_ids:
-            return []
-            
-        return db.query(models.User).filter(models.User.id.in_(list(friend_ids))).all()
     
     def delete_contact(self, db: Session, user_id: int, friend_id: int) -> bool:
         contact_to_delete = db.query(models.Contact).filter(
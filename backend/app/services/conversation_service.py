@@ -0,0 +1,215 @@
+import time
+from typing import List, Optional
+from sqlalchemy import DateTime, and_, case, func, literal, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
+
+from ..db import models
+
+SNIPPET_LENGTH = 120
+
+class ConversationService:
+    """
+    Maintains the conversations projection: one row per direct pair or group
+    with the latest message, plus per-participant unread counters.
+    The record_* methods run inside the caller's transaction, after the
+    message has been flushed and before it is committed.
+    """
+
+    def _last_message_values(self, message) -> dict:
+        return {
+            "last_message_id": message.id,
+            "last_message_snippet": message.content[:SNIPPET_LENGTH],
+            "last_message_at": message.timestamp,
+            "last_sender_id": message.sender_id,
+        }
+
+    async def record_direct_message(self, db: AsyncSession, message: models.Message):
+        user_low_id, user_high_id = sorted((message.sender_id, message.receiver_id))
+        values = self._last_message_values(message)
+        stmt = sqlite_insert(models.Conversation).values(
+            kind="direct", user_low_id=user_low_id, user_high_id=user_high_id, **values
+        ).on_conflict_do_update(
+            index_elements=["user_low_id", "user_high_id"], set_=values
+        ).returning(models.Conversation.id)
+        conversation_id = (await db.execute(stmt)).scalar_one()
+
+        participants = sqlite_insert(models.ConversationParticipant).values([
+            {
+                "conversation_id": conversation_id,
+                "user_id": message.sender_id,
+                "unread_count": 0,
+                "last_read_message_id": message.id,
+                "last_message_at": message.timestamp,
+            },
+            {
+                "conversation_id": conversation_id,
+                "user_id": message.receiver_id,
+                "unread_count": 1,
+                "last_read_message_id": None,
+                "last_message_at": message.timestamp,
+            },
+        ])
+        await db.execute(self._bump_participants(participants, message.sender_id, message.id))
+
+    async def record_group_message(self, db: AsyncSession, message: models.GroupMessage):
+        values = self._last_message_values(message)
+        stmt = sqlite_insert(models.Conversation).values(
+            kind="group", group_id=message.group_id, **values
+        ).on_conflict_do_update(
+            index_elements=["group_id"], set_=values
+        ).returning(models.Conversation.id)
+        conversation_id = (await db.execute(stmt)).scalar_one()
+
+        # Seeding from group_members keeps participants in step with membership.
+        is_sender = models.GroupMember.user_id == message.sender_id
+        members = select(
+            models.GroupMember.user_id,
+            literal(conversation_id),
+            case((is_sender, 0), else_=1),
+            case((is_sender, message.id), else_=None),
+            literal(message.timestamp, DateTime),
+        ).where(models.GroupMember.group_id == message.group_id)
+        participants = sqlite_insert(models.ConversationParticipant).from_select(
+            ["user_id", "conversation_id", "unread_count", "last_read_message_id", "last_message_at"], members
+        )
+        await db.execute(self._bump_participants(participants, message.sender_id, message.id))
+
+    def _bump_participants(self, stmt, sender_id: int, message_id: int):
+        participant = models.ConversationParticipant
+        is_sender = participant.user_id == sender_id
+        return stmt.on_conflict_do_update(
+            index_elements=["conversation_id", "user_id"],
+            set_={
+                "unread_count": case((is_sender, 0), else_=participant.unread_count + 1),
+                "last_read_message_id": case((is_sender, message_id), else_=participant.last_read_message_id),
+                "last_message_at": stmt.excluded.last_message_at,
+            },
+        )
+
+    def get_inbox(self, db: Session, user_id: int, limit: int = 50) -> List[dict]:
+        """All conversations of a user, most recent first, in one query"""
+        conversation = models.Conversation
+        participant = models.ConversationParticipant
+        peer = aliased(models.User)
+        peer_id = case((conversation.user_low_id == user_id, conversation.user_high_id), else_=conversation.user_low_id)
+        rows = db.execute(
+            select(
+                conversation.id.label("conversation_id"),
+                conversation.kind,
+                conversation.group_id,
+                case((conversation.kind == "direct", peer_id), else_=None).label("peer_id"),
+                func.coalesce(models.Group.name, peer.username).label("title"),
+                conversation.last_message_id,
+                conversation.last_message_snippet,
+                conversation.last_message_at,
+                conversation.last_sender_id,
+                participant.unread_count,
+                participant.last_read_message_id,
+            )
+            .join(conversation, conversation.id == participant.conversation_id)
+            .outerjoin(models.Group, models.Group.id == conversation.group_id)
+            .outerjoin(peer, and_(conversation.kind == "direct", peer.id == peer_id))
+            .where(participant.user_id == user_id)
+            .order_by(participant.last_message_at.desc())
+            .limit(limit)
+        ).mappings().all()
+        return [dict(row) for row in rows]
+
+    def mark_read(self, db: Session, conversation_id: int, user_id: int, last_read_message_id: Optional[int] = None) -> Optional[models.ConversationParticipant]:
+        participant = db.query(models.ConversationParticipant).filter(
+            models.ConversationParticipant.conversation_id == conversation_id,
+            models.ConversationParticipant.user_id == user_id,
+        ).first()
+        if not participant:
+            return None
+
+        conversation = participant.conversation
+        if last_read_message_id is None or last_read_message_id >= (conversation.last_message_id or 0):
+            participant.last_read_message_id = conversation.last_message_id
+            participant.unread_count = 0
+        else:
+            participant.last_read_message_id = last_read_message_id
+            if conversation.kind == "group":
+                unread = db.query(func.count(models.GroupMessage.id)).filter(
+                    models.GroupMessage.group_id == conversation.group_id,
+                    models.GroupMessage.id > last_read_message_id,
+                    models.GroupMessage.sender_id != user_id,
+                )
+            else:
+                unread = db.query(func.count(models.Message.id)).filter(
+                    models.Message.sender_id.in_([conversation.user_low_id, conversation.user_high_id]),
+                    models.Message.receiver_id == user_id,
+                    models.Message.id > last_read_message_id,
+                )
+            participant.unread_count = unread.scalar()
+        db.commit()
+        db.refresh(participant)
+        return participant
+
+    def remove_group_participant(self, db: Session, group_id: int, user_id: int):
+        """Drop a former member's inbox entry; the caller commits"""
+        conversation_ids = select(models.Conversation.id).where(models.Conversation.group_id == group_id)
+        db.query(models.ConversationParticipant).filter(
+            models.ConversationParticipant.conversation_id.in_(conversation_ids),
+            models.ConversationParticipant.user_id == user_id,
+        ).delete(synchronize_session=False)
+
+    def delete_group_conversation(self, db: Session, group_id: int):
+        """Remove a deleted group's conversation; the caller commits"""
+        conversation_ids = select(models.Conversation.id).where(models.Conversation.group_id == group_id)
+        db.query(models.ConversationParticipant).filter(
+            models.ConversationParticipant.conversation_id.in_(conversation_ids)
+        ).delete(synchronize_session=False)
+        db.query(models.Conversation).filter(models.Conversation.group_id == group_id).delete(synchronize_session=False)
+
+    def backfill(self, db: Session):
+        """
+        Build the projection from existing history when the table is first created.
+
+        Every worker runs this at startup. The check and the build happen under
+        SQLite's write lock, so the first worker builds the projection and the
+        others wait for it and then find it built.
+        """
+        while True:
+            try:
+                db.execute(text("BEGIN IMMEDIATE"))
+                break
+            except OperationalError:
+                # Another worker holds the write lock, most likely backfilling.
+                db.rollback()
+                time.sleep(0.5)
+        if db.query(models.Conversation.id).first() is not None:
+            db.rollback()
+            return
+
+        pair_low = func.min(models.Message.sender_id, models.Message.receiver_id)
+        pair_high = func.max(models.Message.sender_id, models.Message.receiver_id)
+        latest_direct = select(func.max(models.Message.id)).group_by(pair_low, pair_high)
+        for message in db.query(models.Message).filter(models.Message.id.in_(latest_direct)):
+            user_low_id, user_high_id = sorted((message.sender_id, message.receiver_id))
+            conversation = models.Conversation(kind="direct", user_low_id=user_low_id, user_high_id=user_high_id, **self._last_message_values(message))
+            db.add(conversation)
+            db.flush()
+            for user_id in (user_low_id, user_high_id):
+                db.add(models.ConversationParticipant(
+                    conversation_id=conversation.id, user_id=user_id,
+                    last_read_message_id=message.id, last_message_at=message.timestamp,
+                ))
+
+        latest_group = select(func.max(models.GroupMessage.id)).group_by(models.GroupMessage.group_id)
+        for message in db.query(models.GroupMessage).filter(models.GroupMessage.id.in_(latest_group)):
+            conversation = models.Conversation(kind="group", group_id=message.group_id, **self._last_message_values(message))
+            db.add(conversation)
+            db.flush()
+            member_ids = db.query(models.GroupMember.user_id).filter(models.GroupMember.group_id == message.group_id)
+            for (user_id,) in member_ids:
+                db.add(models.ConversationParticipant(
+                    conversation_id=conversation.id, user_id=user_id,
+                    last_read_message_id=message.id, last_message_at=message.timestamp,
+                ))
+        db.commit()
+
+conversation_service = ConversationService()
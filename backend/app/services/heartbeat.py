@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from fastapi import WebSocket
+
+from ..core.config import settings
+from .signaling_service import manager
+from .timer_wheel import TimerWheel
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_CLOSE_CODE = 4009
+
+Reaper = Callable[[int, WebSocket], Awaitable[None]]
+
+
+@dataclass(eq=False)
+class Liveness:
+    """When a connection was last heard from"""
+
+    websocket: WebSocket
+    last_seen: float = field(default_factory=time.monotonic)
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+
+class HeartbeatService:
+    """
+    Finds connections that went quiet and reaps them.
+
+    Every frame a client sends counts as a sign of life. A connection idle
+    for HEARTBEAT_INTERVAL_S gets a `ping` frame (clients answer `pong`), and
+    one idle for HEARTBEAT_TIMEOUT_S is handed to the reaper, which runs the
+    same cleanup as a clean disconnect. All connections share one timer
+    wheel driven by a single task; a frame only updates a timestamp, and the
+    connection's timer is pushed back lazily when it fires.
+    """
+
+    def __init__(self, interval_s: float, timeout_s: float, tick_s: float = 1.0):
+        self.interval = interval_s
+        self.timeout = timeout_s
+        self.tick = tick_s
+        self._wheel = TimerWheel(tick_s, slots=math.ceil(max(interval_s, timeout_s) / tick_s) + 1)
+        self._watched: Dict[int, Liveness] = {}
+        self._reaper: Optional[Reaper] = None
+        self._reaping: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.pings_sent = 0
+        self.reaped = 0
+
+    async def start(self, reaper: Reaper):
+        self._reaper = reaper
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def watch(self, user_id: int, websocket: WebSocket) -> Liveness:
+        """Start tracking a new connection; the caller touches the result on every frame"""
+        liveness = self._watched[user_id] = Liveness(websocket)
+        self._wheel.schedule((user_id, liveness), self.interval)
+        return liveness
+
+    def unwatch(self, user_id: int, websocket: WebSocket):
+        liveness = self._watched.get(user_id)
+        if liveness is not None and liveness.websocket is websocket:
+            del self._watched[user_id]
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self.check(self._wheel.advance())
+            except Exception:
+                logger.exception("Heartbeat check failed")
+
+    async def check(self, due):
+        now = time.monotonic()
+        for user_id, liveness in due:
+            if self._watched.get(user_id) is not liveness:
+                continue  # unwatched or replaced by a newer connection
+            idle = now - liveness.last_seen
+            if idle >= self.timeout:
+                del self._watched[user_id]
+                self.reaped += 1
+                logger.info("Reaping user %s after %.0fs without a frame", user_id, idle)
+                task = asyncio.get_running_loop().create_task(self._reaper(user_id, liveness.websocket))
+                self._reaping.add(task)
+                task.add_done_callback(self._reaping.discard)
+            elif idle >= self.interval:
+                self.pings_sent += 1
+                await manager.send_personal_message({"type": "ping"}, user_id)
+                self._wheel.schedule((user_id, liveness), min(self.interval, self.timeout - idle))
+            else:
+                self._wheel.schedule((user_id, liveness), self.interval - idle)
+
+    def stats(self) -> dict:
+        return {
+            "watched": len(self._watched),
+            "timers": len(self._wheel),
+            "pings_sent": self.pings_sent,
+            "reaped": self.reaped,
+        }
+
+heartbeat_service = HeartbeatService(
+    interval_s=settings.HEARTBEAT_INTERVAL_S,
+    timeout_s=settings.HEARTBEAT_TIMEOUT_S,
+)
+manager.on_detached(heartbeat_service.unwatch)
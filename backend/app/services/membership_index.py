@@ -0,0 +1,156 @@
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..db import models
+
+class GroupMembershipIndex:
+    """In-memory view of group_members keyed by group and by user, plus group names.
+
+    Groups, users and names are loaded from the database the first time they are
+    looked up. The mutation endpoints in group_router keep loaded entries
+    current, and listeners are told about every change so other workers can
+    invalidate their copies.
+
+    Mutations arrive from threadpool endpoints while lookups run on the event
+    loop, so both sides take `_lock` (never across an await). Every mutation
+    bumps the generation of the group and user it touches (dropping a group
+    bumps every user's); a load that saw a generation change while it read
+    the database returns its rows without caching them, since they may
+    predate the change.
+    """
+
+    def __init__(self):
+        self._by_group: Dict[int, Dict[int, str]] = {}
+        self._by_user: Dict[int, Set[int]] = {}
+        self._names: Dict[int, str] = {}
+        self._group_generations: Dict[int, int] = {}
+        self._user_generations: Dict[int, int] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[int, Optional[int]], None]] = []
+
+    def subscribe(self, listener: Callable[[int, Optional[int]], None]):
+        """Call `listener(group_id, user_id)` after every local mutation; user_id is None when a group is dropped"""
+        self._listeners.append(listener)
+
+    async def _members(self, db: AsyncSession, group_id: int) -> Dict[int, str]:
+        with self._lock:
+            members = self._by_group.get(group_id)
+            generation = self._group_generations.get(group_id, 0)
+        if members is None:
+            result = await db.execute(
+                select(models.GroupMember.user_id, models.GroupMember.role).where(models.GroupMember.group_id == group_id)
+            )
+            members = {user_id: role for user_id, role in result.all()}
+            with self._lock:
+                if self._group_generations.get(group_id, 0) == generation:
+                    members = self._by_group.setdefault(group_id, members)
+        return members
+
+    async def get_member_ids(self, db: AsyncSession, group_id: int) -> List[int]:
+        members = await self._members(db, group_id)
+        with self._lock:
+            return list(members)
+
+    async def is_member(self, db: AsyncSession, group_id: int, user_id: int) -> bool:
+        return user_id in await self._members(db, group_id)
+
+    async def get_role(self, db: AsyncSession, group_id: int, user_id: int) -> Optional[str]:
+        return (await self._members(db, group_id)).get(user_id)
+
+    async def get_user_group_ids(self, db: AsyncSession, user_id: int) -> Set[int]:
+        with self._lock:
+            group_ids = self._by_user.get(user_id)
+            if group_ids is not None:
+                return set(group_ids)
+            generation = (self._epoch, self._user_generations.get(user_id, 0))
+        result = await db.execute(select(models.GroupMember.group_id).where(models.GroupMember.user_id == user_id))
+        group_ids = set(result.scalars().all())
+        with self._lock:
+            if (self._epoch, self._user_generations.get(user_id, 0)) == generation:
+                self._by_user.setdefault(user_id, set(group_ids))
+        return group_ids
+
+    async def get_group_names(self, db: AsyncSession, group_ids: Iterable[int]) -> Dict[int, str]:
+        """Names of existing groups among `group_ids`, loading any not cached yet in one query"""
+        group_ids = set(group_ids)
+        with self._lock:
+            missing = group_ids.difference(self._names)
+            generations = {group_id: self._group_generations.get(group_id, 0) for group_id in missing}
+        if missing:
+            result = await db.execute(select(models.Group.id, models.Group.name).where(models.Group.id.in_(missing)))
+            loaded = dict(result.all())
+            with self._lock:
+                for group_id, name in loaded.items():
+                    if self._group_generations.get(group_id, 0) == generations[group_id]:
+                        self._names.setdefault(group_id, name)
+        else:
+            loaded = {}
+        with self._lock:
+            names = {group_id: self._names[group_id] for group_id in group_ids if group_id in self._names}
+        for group_id, name in loaded.items():
+            names.setdefault(group_id, name)
+        return names
+
+    def rename_group(self, group_id: int, name: str):
+        with self._lock:
+            self._bump(group_id, None)
+            self._names[group_id] = name
+        self._notify(group_id, None)
+
+    def add_member(self, group_id: int, user_id: int, role: str = "member"):
+        with self._lock:
+            self._bump(group_id, user_id)
+            if group_id in self._by_group:
+                self._by_group[group_id][user_id] = role
+            if user_id in self._by_user:
+                self._by_user[user_id].add(group_id)
+        self._notify(group_id, user_id)
+
+    def set_role(self, group_id: int, user_id: int, role: str):
+        with self._lock:
+            self._bump(group_id, user_id)
+            members = self._by_group.get(group_id)
+            if members is not None and user_id in members:
+                members[user_id] = role
+        self._notify(group_id, user_id)
+
+    def remove_member(self, group_id: int, user_id: int):
+        with self._lock:
+            self._bump(group_id, user_id)
+            if group_id in self._by_group:
+                self._by_group[group_id].pop(user_id, None)
+            if user_id in self._by_user:
+                self._by_user[user_id].discard(group_id)
+        self._notify(group_id, user_id)
+
+    def drop_group(self, group_id: int):
+        self.invalidate(group_id)
+        self._notify(group_id, None)
+
+    def invalidate(self, group_id: int, user_id: Optional[int] = None):
+        """Forget cached state for a group (and one user), to be reloaded on next lookup"""
+        with self._lock:
+            self._bump(group_id, user_id)
+            self._by_group.pop(group_id, None)
+            if user_id is None:
+                self._names.pop(group_id, None)
+                for group_ids in self._by_user.values():
+                    group_ids.discard(group_id)
+                # Any user's groups being loaded may include the dropped group.
+                self._epoch += 1
+            else:
+                self._by_user.pop(user_id, None)
+
+    def _bump(self, group_id: int, user_id: Optional[int]):
+        self._group_generations[group_id] = self._group_generations.get(group_id, 0) + 1
+        if user_id is not None:
+            self._user_generations[user_id] = self._user_generations.get(user_id, 0) + 1
+
+    def _notify(self, group_id: int, user_id: Optional[int]):
+        for listener in self._listeners:
+            listener(group_id, user_id)
+
+membership_index = GroupMembershipIndex()
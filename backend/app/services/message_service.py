@@ -1,26 +1,33 @@
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Sequence, Tuple
 from ..db import models, schemas
-from sqlalchemy import or_, and_
+from ..core.pagination import keyset_page
+from .message_store import message_store
+from sqlalchemy import Row, or_, and_, select
 
 class MessageService:
-    def create_message(self, db: Session, *, sender_id: int, message_in: schemas.MessageCreate) -> models.Message:
+    async def create_message(self, db: AsyncSession, *, sender_id: int, message_in: schemas.MessageCreate) -> models.Message:
         db_message = models.Message(
             sender_id=sender_id,
             receiver_id=message_in.receiver_id,
             content=message_in.content
         )
-        db.add(db_message)
-        db.commit()
-        db.refresh(db_message)
-        return db_message
+        return await message_store.save_direct(db, db_message)
 
     def get_messages_between_users(
         self, db: Session, *, user1_id: int, user2_id: int, skip: int = 0, limit: int = 100
-    ) -> List[models.Message]:
-        return (
-            db.query(models.Message)
-            .filter(
+    ) -> Sequence[Row]:
+        """(content, id, sender_id, receiver_id, timestamp) rows, oldest first"""
+        return db.execute(
+            select(
+                models.Message.content,
+                models.Message.id,
+                models.Message.sender_id,
+                models.Message.receiver_id,
+                models.Message.timestamp,
+            )
+            .where(
                 or_(
                     and_(models.Message.sender_id == user1_id, models.Message.receiver_id == user2_id),
                     and_(models.Message.sender_id == user2_id, models.Message.receiver_id == user1_id),
@@ -29,7 +36,17 @@ class MessageService:
             .order_by(models.Message.timestamp.asc())
             .offset(skip)
             .limit(limit)
-            .all()
+        ).all()
+
+    def get_messages_page(
+        self, db: Session, *, user1_id: int, user2_id: int, cursor: Optional[str] = None, limit: int = 50
+    ) -> Tuple[List[models.Message], Optional[str], Optional[str]]:
+        query = db.query(models.Message).filter(
+            or_(
+                and_(models.Message.sender_id == user1_id, models.Message.receiver_id == user2_id),
+                and_(models.Message.sender_id == user2_id, models.Message.receiver_id == user1_id),
+            )
         )
+        return keyset_page(query, models.Message.timestamp, models.Message.id, cursor, limit)
 
 message_service = MessageService()
\ No newline at end of file
@@ -0,0 +1,197 @@
+import asyncio
+import datetime
+import logging
+from typing import Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..db import database, models
+from .conversation_service import conversation_service
+
+logger = logging.getLogger(__name__)
+
+SYNC = "sync"
+BATCHED = "batched"
+
+StoredMessage = Union[models.Message, models.GroupMessage]
+
+
+class IdAllocator:
+    """
+    Hands out primary keys ahead of the insert from blocks reserved in the
+    id_sequences table. A reservation is a single UPSERT, so workers sharing
+    the database never receive overlapping blocks.
+    """
+
+    def __init__(self, model, block_size: int):
+        self.model = model
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    async def allocate(self) -> int:
+        if self._next >= self._end:
+            async with self._lock:
+                if self._next >= self._end:
+                    await self._reserve_block()
+        allocated = self._next
+        self._next += 1
+        return allocated
+
+    async def _reserve_block(self):
+        name = self.model.__tablename__
+        async with database.async_session() as db:
+            # Never hand out ids below rows written without the allocator.
+            floor = (await db.scalar(select(func.max(self.model.id))) or 0) + 1
+            sequence = models.IdSequence
+            stmt = sqlite_insert(sequence).values(name=name, next_id=floor + self.block_size).on_conflict_do_update(
+                index_elements=["name"],
+                set_={"next_id": func.max(sequence.next_id, floor) + self.block_size},
+            ).returning(sequence.next_id)
+            end = (await db.execute(stmt)).scalar_one()
+            await db.commit()
+        self._next, self._end = end - self.block_size, end
+
+
+class MessageStore:
+    """
+    Persists direct and group messages.
+
+    With MESSAGE_DURABILITY=sync every message is its own transaction, as
+    before. With "batched" the message gets its id and timestamp up front and
+    is returned straight away so it can be pushed to recipients; a background
+    task then writes pending messages, and their conversation projection
+    updates, in one transaction once MESSAGE_BATCH_SIZE messages are waiting
+    or MESSAGE_BATCH_INTERVAL_MS has passed. Pending messages are flushed on
+    shutdown; anything still queued when the process dies is lost.
+    """
+
+    def __init__(self, durability: str, batch_size: int, batch_interval_ms: int, id_block_size: int):
+        self.durability = durability
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval_ms / 1000
+        self._allocators: Dict[type, IdAllocator] = {
+            models.Message: IdAllocator(models.Message, id_block_size),
+            models.GroupMessage: IdAllocator(models.GroupMessage, id_block_size),
+        }
+        self._pending: List[StoredMessage] = []
+        self._wakeup = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.durability == BATCHED:
+            self._stopping.clear()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            # Let the loop finish the write it is in rather than cancelling
+            # it, so the batch already taken off the queue is not lost.
+            self._stopping.set()
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def save_direct(self, db: AsyncSession, message: models.Message) -> models.Message:
+        if self.durability != BATCHED:
+            db.add(message)
+            await db.flush()
+            await conversation_service.record_direct_message(db, message)
+            await db.commit()
+            await db.refresh(message)
+            return message
+        return await self._enqueue(message)
+
+    async def save_group(self, db: AsyncSession, message: models.GroupMessage) -> models.GroupMessage:
+        if self.durability != BATCHED:
+            db.add(message)
+            await db.flush()
+            await conversation_service.record_group_message(db, message)
+            await db.commit()
+            await db.refresh(message)
+            return message
+        return await self._enqueue(message)
+
+    async def _enqueue(self, message: StoredMessage) -> StoredMessage:
+        message.id = await self._allocators[type(message)].allocate()
+        message.timestamp = datetime.datetime.utcnow()
+        self._pending.append(message)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return message
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.batch_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write everything queued so far in one transaction"""
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                del self._pending[:len(batch)]
+                try:
+                    await self._write(batch)
+                except Exception:
+                    logger.exception("Batched write of %d messages failed, retrying one by one", len(batch))
+                    for message in batch:
+                        try:
+                            await self._write([message])
+                        except Exception:
+                            logger.exception("Dropping message %s that could not be persisted", message.id)
+
+    async def _write(self, batch: List[StoredMessage]):
+        direct_rows, group_rows = self._rows(batch)
+        async with database.async_session() as db:
+            if direct_rows:
+                await db.execute(insert(models.Message), direct_rows)
+            if group_rows:
+                await db.execute(insert(models.GroupMessage), group_rows)
+            for message in batch:
+                if isinstance(message, models.Message):
+                    await conversation_service.record_direct_message(db, message)
+                else:
+                    await conversation_service.record_group_message(db, message)
+            await db.commit()
+
+    def _rows(self, batch: List[StoredMessage]) -> Tuple[List[dict], List[dict]]:
+        direct_rows = []
+        group_rows = []
+        for message in batch:
+            if isinstance(message, models.Message):
+                direct_rows.append({
+                    "id": message.id,
+                    "sender_id": message.sender_id,
+                    "receiver_id": message.receiver_id,
+                    "content": message.content,
+                    "timestamp": message.timestamp,
+                })
+            else:
+                group_rows.append({
+                    "id": message.id,
+                    "group_id": message.group_id,
+                    "sender_id": message.sender_id,
+                    "sender_username": message.sender_username,
+                    "content": message.content,
+                    "timestamp": message.timestamp,
+                })
+        return direct_rows, group_rows
+
+message_store = MessageStore(
+    durability=settings.MESSAGE_DURABILITY,
+    batch_size=settings.MESSAGE_BATCH_SIZE,
+    batch_interval_ms=settings.MESSAGE_BATCH_INTERVAL_MS,
+    id_block_size=settings.MESSAGE_ID_BLOCK_SIZE,
+)
@@ -0,0 +1,164 @@
+import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..db import models
+from .membership_index import membership_index
+from .message_store import BATCHED, message_store
+from .signaling_service import manager
+
+
+def _isoformat(timestamp) -> str:
+    return timestamp.isoformat() if isinstance(timestamp, datetime.datetime) else str(timestamp)
+
+
+class MessageSync:
+    """
+    Catches a reconnecting client up on the messages it missed.
+
+    The client says which direct and group message ids it saw last (or a
+    very large id to get only a starting point on a new device); only
+    messages after them are read, by (receiver_id, id) and (group_id, id)
+    index ranges, and pushed in `message_batch` frames of MESSAGE_SYNC_BATCH_SIZE
+    shaped like the live `chat_message`/`group_message` pushes. At most
+    MESSAGE_SYNC_MAX_MESSAGES of each kind go out per sync; the closing
+    `sync_complete` frame carries the ids to resume from and `more` when the
+    client should sync again for the rest.
+
+    Ids only follow commit order within one worker: with batched writes each
+    worker hands out ids from its own reserved block and holds rows in its
+    own queue, so across workers a message can commit after a higher id was
+    already synced. Sync is therefore disabled (`enabled=False`) for batched
+    writes behind the socket backplane; clients are sent a `sync_complete`
+    marked `unavailable` and load history over REST instead.
+    """
+
+    def __init__(self, batch_size: int, max_messages: int, enabled: bool = True):
+        self.batch_size = batch_size
+        self.max_messages = max_messages
+        self.enabled = enabled
+
+    async def missed_direct(self, db: AsyncSession, user_id: int, after_id: int, limit: int) -> List[dict]:
+        result = await db.execute(
+            select(
+                models.Message.id,
+                models.Message.sender_id,
+                models.Message.receiver_id,
+                models.Message.content,
+                models.Message.timestamp,
+                models.User.username,
+            )
+            .join(models.User, models.User.id == models.Message.sender_id)
+            .where(models.Message.receiver_id == user_id, models.Message.id > after_id)
+            .order_by(models.Message.id)
+            .limit(limit)
+        )
+        return [
+            {
+                "type": "chat_message",
+                "id": row.id,
+                "sender_id": row.sender_id,
+                "receiver_id": row.receiver_id,
+                "content": row.content,
+                "timestamp": _isoformat(row.timestamp),
+                "sender_username": row.username,
+            }
+            for row in result
+        ]
+
+    async def latest_direct_id(self, db: AsyncSession, user_id: int) -> int:
+        latest = await db.scalar(select(func.max(models.Message.id)).where(models.Message.receiver_id == user_id))
+        return latest or 0
+
+    async def missed_group(self, db: AsyncSession, user_id: int, after_id: int, limit: int) -> List[dict]:
+        group_ids = await membership_index.get_user_group_ids(db, user_id)
+        if not group_ids:
+            return []
+        result = await db.execute(
+            select(
+                models.GroupMessage.id,
+                models.GroupMessage.group_id,
+                models.GroupMessage.sender_id,
+                models.GroupMessage.sender_username,
+                models.GroupMessage.content,
+                models.GroupMessage.timestamp,
+            )
+            .where(
+                models.GroupMessage.group_id.in_(group_ids),
+                models.GroupMessage.id > after_id,
+                models.GroupMessage.sender_id != user_id,
+            )
+            .order_by(models.GroupMessage.id)
+            .limit(limit)
+        )
+        return [
+            {
+                "type": "group_message",
+                "id": row.id,
+                "group_id": row.group_id,
+                "sender_id": row.sender_id,
+                "sender_username": row.sender_username,
+                "content": row.content,
+                "timestamp": _isoformat(row.timestamp),
+            }
+            for row in result
+        ]
+
+    async def latest_group_id(self, db: AsyncSession, user_id: int) -> int:
+        group_ids = await membership_index.get_user_group_ids(db, user_id)
+        if not group_ids:
+            return 0
+        latest = await db.scalar(select(func.max(models.GroupMessage.id)).where(models.GroupMessage.group_id.in_(group_ids)))
+        return latest or 0
+
+    async def push_missed(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        last_message_id: Optional[int],
+        last_group_message_id: Optional[int],
+    ) -> dict:
+        """Send the user everything after the given ids; returns the sync_complete frame"""
+        if not self.enabled:
+            complete = {"type": "sync_complete", "more": False, "unavailable": True}
+            await manager.send_personal_message(complete, user_id)
+            return complete
+        # Batched writes still waiting in this worker would otherwise be skipped.
+        await message_store.flush()
+        complete = {"type": "sync_complete", "more": False}
+        for kind, key, after_id, fetch, latest in (
+            ("direct", "lastMessageId", last_message_id, self.missed_direct, self.latest_direct_id),
+            ("group", "lastGroupMessageId", last_group_message_id, self.missed_group, self.latest_group_id),
+        ):
+            if after_id is None:
+                continue
+            messages, more = await self._fetch(fetch, db, user_id, after_id)
+            for start in range(0, len(messages), self.batch_size):
+                await manager.send_personal_message({
+                    "type": "message_batch",
+                    "kind": kind,
+                    "messages": messages[start:start + self.batch_size],
+                }, user_id)
+            if messages:
+                complete[key] = messages[-1]["id"]
+            else:
+                # Nothing missed; an id past the newest message (a client
+                # that has not seen any yet) is pulled back to that message.
+                complete[key] = min(after_id, await latest(db, user_id))
+            complete["more"] = complete["more"] or more
+        await manager.send_personal_message(complete, user_id)
+        return complete
+
+    async def _fetch(self, fetch, db: AsyncSession, user_id: int, after_id: int) -> Tuple[List[dict], bool]:
+        # One extra row tells whether anything is left beyond the cap.
+        messages = await fetch(db, user_id, after_id, self.max_messages + 1)
+        return messages[:self.max_messages], len(messages) > self.max_messages
+
+message_sync = MessageSync(
+    batch_size=settings.MESSAGE_SYNC_BATCH_SIZE,
+    max_messages=settings.MESSAGE_SYNC_MAX_MESSAGES,
+    enabled=not (settings.MESSAGE_DURABILITY == BATCHED and settings.BACKPLANE == "socket"),
+)
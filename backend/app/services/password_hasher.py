@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_contexts = {}
+
+
+def _context(rounds: int) -> CryptContext:
+    # Built once per worker process and work factor.
+    context = _contexts.get(rounds)
+    if context is None:
+        context = _contexts[rounds] = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+    return context
+
+
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    return _context(rounds).verify_and_update(password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt off the event loop.
+
+    Hashes are computed in a pool of `workers` processes (or the loop's default
+    thread pool when `workers` is 0). At most `max_pending` calls may be queued
+    or running; beyond that callers get a 503 with Retry-After instead of
+    piling up behind the pool while signaling waits.
+    """
+
+    def __init__(self, workers: int, max_pending: int, rounds: int, retry_after: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.retry_after = retry_after
+        self.pending = 0
+        self.rejected = 0
+        self._executor: Optional[Executor] = None
+
+    def start(self):
+        if self._executor is None and self.workers > 0:
+            # spawn: forking a process that already runs an event loop and
+            # database threads is not safe.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(_hash, password, self.rounds)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Check a password; the second value is a replacement hash when the stored one uses another work factor"""
+        return await self._submit(_verify_and_update, password, hashed_password, self.rounds)
+
+    async def _submit(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication is busy, try again shortly",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        self.start()
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    def stats(self) -> dict:
+        return {"pending": self.pending, "rejected": self.rejected, "workers": self.workers}
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    rounds=settings.BCRYPT_ROUNDS,
+    retry_after=settings.PASSWORD_HASH_RETRY_AFTER,
+)
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set
+
+from ..core.config import settings
+from ..db import database
+from .contact_service import contact_service
+from .membership_index import membership_index
+from .signaling_service import manager
+
+logger = logging.getLogger(__name__)
+
+
+class PresenceService:
+    """
+    Tells a user's contacts and group peers when they come online or go away.
+
+    Connects and disconnects only mark the user as changed. Every
+    PRESENCE_FLUSH_INTERVAL_MS the changed users' current state is read back
+    from the connection manager, so a quick reconnect nets out to nothing,
+    and each connected peer gets one `presence` frame listing everyone in
+    its audience who came online or went offline since the last flush.
+    """
+
+    def __init__(self, flush_interval_ms: int):
+        self.flush_interval = flush_interval_ms / 1000
+        self._changed: Set[int] = set()
+        # Last state announced per user, so unchanged users are skipped.
+        self._announced_online: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def mark_changed(self, user_id: int):
+        self._changed.add(user_id)
+
+    def get_online_ids(self, user_ids: Set[int]) -> List[int]:
+        return sorted(user_id for user_id in user_ids if manager.is_user_connected(user_id))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Presence flush failed")
+
+    async def flush(self):
+        """Send the presence diffs accumulated since the last flush"""
+        if not self._changed:
+            return
+        changed, self._changed = self._changed, set()
+        came_online = []
+        went_offline = []
+        for user_id in changed:
+            online = manager.is_user_connected(user_id)
+            if online == (user_id in self._announced_online):
+                continue
+            if online:
+                self._announced_online.add(user_id)
+                came_online.append(user_id)
+            else:
+                self._announced_online.discard(user_id)
+                went_offline.append(user_id)
+        if not came_online and not went_offline:
+            return
+
+        async with database.async_session() as db:
+            audiences = await contact_service.get_contact_ids_for_users(db, came_online + went_offline)
+            for user_id, audience in audiences.items():
+                for group_id in await membership_index.get_user_group_ids(db, user_id):
+                    audience.update(await membership_index.get_member_ids(db, group_id))
+                audience.discard(user_id)
+
+        diffs: Dict[int, Dict[str, List[int]]] = {}
+        for key, user_ids in (("online", came_online), ("offline", went_offline)):
+            for user_id in user_ids:
+                for peer_id in audiences[user_id]:
+                    if manager.is_user_connected(peer_id):
+                        diffs.setdefault(peer_id, {"online": [], "offline": []})[key].append(user_id)
+        for peer_id, diff in diffs.items():
+            await manager.send_personal_message({"type": "presence", **diff}, peer_id)
+
+presence_service = PresenceService(flush_interval_ms=settings.PRESENCE_FLUSH_INTERVAL_MS)
@@ -0,0 +1,135 @@
+import math
+import time
+from typing import Dict, Optional, Tuple
+
+from fastapi import Depends, HTTPException, status
+
+from ..core.config import settings
+from ..core.security import get_current_active_user
+
+ICE = "ice"
+SDP = "sdp"
+CHAT = "chat"
+SIGNAL = "signal"
+REST_MESSAGES = "rest_messages"
+
+RATE_LIMIT_CLOSE_CODE = 4029
+
+# Frame type -> budget; frame types not listed here share the SIGNAL budget.
+FRAME_CATEGORIES = {
+    "candidate": ICE,
+    "group-ice-candidate": ICE,
+    "call_offer": SDP,
+    "call_answer": SDP,
+    "group-call-offer": SDP,
+    "group-call-answer": SDP,
+    "chat_message": CHAT,
+}
+
+
+def frame_category(msg_type) -> str:
+    return FRAME_CATEGORIES.get(msg_type, SIGNAL) if isinstance(msg_type, str) else SIGNAL
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated", "rejected_in_a_row")
+
+    def __init__(self, burst: float):
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.rejected_in_a_row = 0
+
+
+class RateLimiter:
+    """
+    Token buckets per user and category: each category refills at `rate`
+    tokens per second up to `burst`, and every frame or request takes one.
+
+    A user's buckets are independent, so a client looping on ICE candidates
+    runs out of its ICE budget without touching its chat or SDP budgets.
+
+    WebSocket buckets are dropped when the connection closes. REST buckets
+    have no such moment, so at most every `sweep_interval` seconds buckets
+    idle long enough to have refilled are dropped; a fresh one is the same.
+    """
+
+    def __init__(self, budgets: Dict[str, Tuple[float, float]], close_after: int, enabled: bool = True, sweep_interval: float = 60):
+        self.budgets = budgets
+        self.close_after = close_after
+        self.enabled = enabled
+        self.sweep_interval = sweep_interval
+        self._buckets: Dict[Tuple[int, str], TokenBucket] = {}
+        self._swept_at = time.monotonic()
+        self.throttled: Dict[str, int] = {category: 0 for category in budgets}
+        self.disconnects = 0
+
+    def take(self, user_id: int, category: str) -> Optional[float]:
+        """Spend a token; returns None when allowed, else the seconds until one is available"""
+        if not self.enabled:
+            return None
+        rate, burst = self.budgets[category]
+        key = (user_id, category)
+        now = time.monotonic()
+        if now - self._swept_at >= self.sweep_interval:
+            self._sweep(now)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(burst)
+        bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated) * rate)
+        bucket.updated = now
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            bucket.rejected_in_a_row = 0
+            return None
+        bucket.rejected_in_a_row += 1
+        self.throttled[category] += 1
+        return (1 - bucket.tokens) / rate
+
+    def rejected_in_a_row(self, user_id: int, category: str) -> int:
+        """How many frames in a row were refused; a client that does not back off keeps raising it"""
+        bucket = self._buckets.get((user_id, category))
+        return bucket.rejected_in_a_row if bucket is not None else 0
+
+    def forget(self, user_id: int):
+        """Drop the user's WebSocket buckets when their connection closes"""
+        for category in self.budgets:
+            if category != REST_MESSAGES:
+                self._buckets.pop((user_id, category), None)
+
+    def _sweep(self, now: float):
+        self._swept_at = now
+        idle = []
+        for key, bucket in self._buckets.items():
+            rate, burst = self.budgets[key[1]]
+            if bucket.tokens + (now - bucket.updated) * rate >= burst:
+                idle.append(key)
+        for key in idle:
+            del self._buckets[key]
+
+    def stats(self) -> dict:
+        return {"buckets": len(self._buckets), "throttled": dict(self.throttled), "disconnects": self.disconnects}
+
+rate_limiter = RateLimiter(
+    budgets={
+        ICE: (settings.RATE_LIMIT_ICE_PER_SEC, settings.RATE_LIMIT_ICE_BURST),
+        SDP: (settings.RATE_LIMIT_SDP_PER_SEC, settings.RATE_LIMIT_SDP_BURST),
+        CHAT: (settings.RATE_LIMIT_CHAT_PER_SEC, settings.RATE_LIMIT_CHAT_BURST),
+        SIGNAL: (settings.RATE_LIMIT_SIGNAL_PER_SEC, settings.RATE_LIMIT_SIGNAL_BURST),
+        REST_MESSAGES: (settings.RATE_LIMIT_REST_MESSAGES_PER_SEC, settings.RATE_LIMIT_REST_MESSAGES_BURST),
+    },
+    close_after=settings.RATE_LIMIT_CLOSE_AFTER,
+    enabled=settings.RATE_LIMIT_ENABLED,
+)
+
+
+def limit_requests(category: str):
+    """Dependency that answers 429 with Retry-After once the current user's budget is spent"""
+    async def check(current_user=Depends(get_current_active_user)):
+        retry_after = rate_limiter.take(current_user.id, category)
+        if retry_after is not None:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, slow down.",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+    return check
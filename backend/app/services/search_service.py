@@ -0,0 +1,177 @@
+import re
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from ..core.pagination import MAX_PAGE_SIZE, pack_cursor, unpack_cursor
+
+# message_search is an FTS5 shadow of messages and group_messages. Rows from
+# both tables share one rowid space: direct message N is rowid 2N, group
+# message N is rowid 2N + 1, so triggers can delete by rowid.
+SCHEMA_STATEMENTS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_search_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO message_search(rowid, content, sender_id, receiver_id, group_id)
+        VALUES (new.id * 2, new.content, new.sender_id, new.receiver_id, NULL);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_search_delete AFTER DELETE ON messages BEGIN
+        DELETE FROM message_search WHERE rowid = old.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_search_update AFTER UPDATE OF content ON messages BEGIN
+        UPDATE message_search SET content = new.content WHERE rowid = new.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS group_messages_search_insert AFTER INSERT ON group_messages BEGIN
+        INSERT INTO message_search(rowid, content, sender_id, receiver_id, group_id)
+        VALUES (new.id * 2 + 1, new.content, new.sender_id, NULL, new.group_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS group_messages_search_delete AFTER DELETE ON group_messages BEGIN
+        DELETE FROM message_search WHERE rowid = old.id * 2 + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS group_messages_search_update AFTER UPDATE OF content ON group_messages BEGIN
+        UPDATE message_search SET content = new.content WHERE rowid = new.id * 2 + 1;
+    END
+    """,
+]
+
+BACKFILL_STATEMENTS = [
+    """
+    INSERT INTO message_search(rowid, content, sender_id, receiver_id, group_id)
+    SELECT id * 2, content, sender_id, receiver_id, NULL FROM messages WHERE content IS NOT NULL
+    """,
+    """
+    INSERT INTO message_search(rowid, content, sender_id, receiver_id, group_id)
+    SELECT id * 2 + 1, content, sender_id, NULL, group_id FROM group_messages
+    """,
+]
+
+SEARCH_QUERY = text("""
+    SELECT s.rowid AS search_rowid,
+           bm25(message_search) AS rank,
+           snippet(message_search, 0, :mark_open, :mark_close, '…', 12) AS snippet,
+           s.sender_id, s.receiver_id, s.group_id,
+           COALESCE(m.timestamp, gm.timestamp) AS timestamp
+    FROM message_search AS s
+    LEFT JOIN messages AS m ON s.rowid % 2 = 0 AND m.id = s.rowid / 2
+    LEFT JOIN group_messages AS gm ON s.rowid % 2 = 1 AND gm.id = s.rowid / 2
+    WHERE message_search MATCH :match
+      AND (
+        (s.group_id IS NULL AND (s.sender_id = :user_id OR s.receiver_id = :user_id))
+        OR s.group_id IN (SELECT group_id FROM group_members WHERE user_id = :user_id)
+      )
+      AND (bm25(message_search) > :after_rank OR (bm25(message_search) = :after_rank AND s.rowid > :after_rowid))
+    ORDER BY rank, s.rowid
+    LIMIT :limit
+""")
+
+# Control characters around matched terms in the raw FTS5 snippet. They are
+# taken out again before the snippet is returned as plain text, so message
+# content never reaches clients wrapped in markup.
+MARK_OPEN = "\x02"
+MARK_CLOSE = "\x03"
+
+
+def split_snippet(snippet: str) -> Tuple[str, List[Tuple[int, int]]]:
+    """Plain snippet text and the [start, end) offsets of the matched terms in it"""
+    text_parts = []
+    highlights = []
+    length = 0
+    start = None
+    for part in re.split(f"({MARK_OPEN}|{MARK_CLOSE})", snippet or ""):
+        if part == MARK_OPEN:
+            start = length
+        elif part == MARK_CLOSE:
+            if start is not None:
+                highlights.append((start, length))
+            start = None
+        else:
+            text_parts.append(part)
+            length += len(part)
+    return "".join(text_parts), highlights
+
+
+class SearchService:
+    def ensure_schema(self, engine: Engine):
+        """Create the FTS5 table and its triggers, indexing existing history the first time"""
+        with engine.begin() as connection:
+            exists = connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'message_search'"
+            ).first()
+            if not exists:
+                connection.exec_driver_sql(
+                    "CREATE VIRTUAL TABLE message_search USING fts5("
+                    "content, sender_id UNINDEXED, receiver_id UNINDEXED, group_id UNINDEXED, "
+                    "tokenize = 'unicode61 remove_diacritics 2')"
+                )
+                for statement in BACKFILL_STATEMENTS:
+                    connection.exec_driver_sql(statement)
+            for statement in SCHEMA_STATEMENTS:
+                connection.exec_driver_sql(statement)
+
+    def build_match(self, query: str) -> str:
+        """Turn free text into an FTS5 query: every word must match, the last one as a prefix"""
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Search query cannot be empty")
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += "*"
+        return " ".join(quoted)
+
+    def search_messages(
+        self, db: Session, *, user_id: int, query: str, cursor: Optional[str] = None, limit: int = 20
+    ) -> Tuple[List[dict], Optional[str]]:
+        # The cursor holds the bm25 rank of the last hit. Ranks depend on
+        # corpus statistics, so messages written between pages can shift
+        # them: a hit near a page boundary may then repeat or be skipped.
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        after_rank, after_rowid = float("-inf"), -1
+        if cursor:
+            values = unpack_cursor(cursor)
+            try:
+                after_rank, after_rowid = float(values[0]), int(values[1])
+            except (IndexError, TypeError, ValueError):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+        rows = db.execute(SEARCH_QUERY, {
+            "match": self.build_match(query),
+            "user_id": user_id,
+            "after_rank": after_rank,
+            "after_rowid": after_rowid,
+            "limit": limit + 1,
+            "mark_open": MARK_OPEN,
+            "mark_close": MARK_CLOSE,
+        }).mappings().all()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        hits = []
+        for row in rows:
+            is_group = row["search_rowid"] % 2 == 1
+            snippet, highlights = split_snippet(row["snippet"])
+            hits.append({
+                "kind": "group" if is_group else "direct",
+                "message_id": row["search_rowid"] // 2,
+                "sender_id": row["sender_id"],
+                "receiver_id": row["receiver_id"],
+                "group_id": row["group_id"],
+                "timestamp": row["timestamp"],
+                "snippet": snippet,
+                "highlights": highlights,
+                "rank": row["rank"],
+            })
+        next_cursor = pack_cursor([rows[-1]["rank"], rows[-1]["search_rowid"]]) if has_more else None
+        return hits, next_cursor
+
+search_service = SearchService()
@@ -0,0 +1,218 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from ..core.config import settings
+from .signaling_service import manager
+
+try:
+    from aiortc import RTCPeerConnection, RTCSessionDescription
+    from aiortc.contrib.media import MediaRelay
+    from aiortc.sdp import candidate_from_sdp
+except ImportError:  # aiortc is optional; without it every call stays mesh
+    RTCPeerConnection = None
+
+logger = logging.getLogger(__name__)
+
+MESH = "mesh"
+SFU = "sfu"
+AUTO = "auto"
+
+SendMessage = Callable[[dict, int], Awaitable[None]]
+
+
+class SfuPeer:
+    """One participant's server-side peer connection"""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.pc = RTCPeerConnection()
+        self.published: List = []
+        # (publisher id, track id) -> sender carrying that track to this peer.
+        self.forwarded: Dict[Tuple[int, str], object] = {}
+        self.negotiating = asyncio.Lock()
+        self.offer_pending = False
+
+
+class SfuRoom:
+    """
+    Forwards every participant's upstream tracks to all other participants
+    of one group call.
+
+    Each participant keeps a single peer connection to the server: their own
+    offer publishes their tracks, and the server sends its own offers
+    (renegotiation) whenever tracks from other participants are added.
+    aiortc's MediaRelay decodes each upstream once and fans it out.
+    """
+
+    def __init__(self, group_id: int, send: SendMessage):
+        self.group_id = group_id
+        self.send = send
+        self.relay = MediaRelay()
+        self.peers: Dict[int, SfuPeer] = {}
+        # Renegotiations started from aiortc's track callbacks.
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _peer(self, user_id: int) -> SfuPeer:
+        peer = self.peers.get(user_id)
+        if peer is None:
+            peer = self.peers[user_id] = SfuPeer(user_id)
+
+            @peer.pc.on("track")
+            def on_track(track):
+                logger.info("SFU group %s: user %s publishes %s", self.group_id, user_id, track.kind)
+                peer.published.append(track)
+                for subscriber in list(self.peers.values()):
+                    if subscriber is not peer:
+                        self._forward(user_id, track, subscriber)
+                        self._spawn(self._renegotiate(subscriber))
+
+        return peer
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("SFU group %s: renegotiation failed", self.group_id, exc_info=task.exception())
+
+    def _forward(self, publisher_id: int, track, subscriber: SfuPeer):
+        key = (publisher_id, track.id)
+        if key not in subscriber.forwarded:
+            subscriber.forwarded[key] = subscriber.pc.addTrack(self.relay.subscribe(track))
+
+    async def handle_offer(self, user_id: int, sdp: dict):
+        """Apply a participant's offer and send back the server's answer"""
+        peer = self._peer(user_id)
+        async with peer.negotiating:
+            await peer.pc.setRemoteDescription(RTCSessionDescription(sdp=sdp["sdp"], type=sdp["type"]))
+            await peer.pc.setLocalDescription(await peer.pc.createAnswer())
+            description = peer.pc.localDescription
+        await self.send({
+            "type": "group-call-answer",
+            "groupId": self.group_id,
+            "sfu": True,
+            "sdp": {"type": description.type, "sdp": description.sdp},
+        }, user_id)
+        # Tracks of participants who were already publishing arrive by
+        # renegotiation, offered only after the answer so the client sees
+        # them in order.
+        added = False
+        for publisher in self.peers.values():
+            if publisher is not peer:
+                for track in publisher.published:
+                    self._forward(publisher.user_id, track, peer)
+                    added = True
+        if added:
+            await self._renegotiate(peer)
+
+    async def handle_answer(self, user_id: int, sdp: dict):
+        peer = self.peers.get(user_id)
+        if peer is None:
+            return
+        async with peer.negotiating:
+            await peer.pc.setRemoteDescription(RTCSessionDescription(sdp=sdp["sdp"], type=sdp["type"]))
+        if peer.offer_pending:
+            await self._renegotiate(peer)
+
+    async def add_candidate(self, user_id: int, candidate: dict):
+        peer = self.peers.get(user_id)
+        if peer is None or not candidate or not candidate.get("candidate"):
+            return
+        ice = candidate_from_sdp(candidate["candidate"].split(":", 1)[-1])
+        ice.sdpMid = candidate.get("sdpMid")
+        ice.sdpMLineIndex = candidate.get("sdpMLineIndex")
+        await peer.pc.addIceCandidate(ice)
+
+    async def _renegotiate(self, peer: SfuPeer):
+        async with peer.negotiating:
+            if peer.pc.signalingState != "stable" or peer.user_id not in self.peers:
+                # Offered again once the answer to the outstanding offer arrives.
+                peer.offer_pending = peer.user_id in self.peers
+                return
+            peer.offer_pending = False
+            await peer.pc.setLocalDescription(await peer.pc.createOffer())
+            description = peer.pc.localDescription
+        await self.send({
+            "type": "group-call-offer",
+            "groupId": self.group_id,
+            "sfu": True,
+            "sdp": {"type": description.type, "sdp": description.sdp},
+        }, peer.user_id)
+
+    async def remove(self, user_id: int):
+        peer = self.peers.pop(user_id, None)
+        if peer is None:
+            return
+        for subscriber in self.peers.values():
+            for key in [key for key in subscriber.forwarded if key[0] == user_id]:
+                subscriber.forwarded.pop(key).replaceTrack(None)
+        await peer.pc.close()
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        for user_id in list(self.peers):
+            await self.remove(user_id)
+
+
+class SfuService:
+    """Chooses mesh or SFU for new group calls and owns the SFU rooms of this worker"""
+
+    def __init__(self, mode: str, auto_threshold: int):
+        self.mode = mode
+        self.auto_threshold = auto_threshold
+        self.rooms: Dict[int, SfuRoom] = {}
+
+    @property
+    def available(self) -> bool:
+        # Rooms live in one worker's memory, so SFU needs every participant on it.
+        return RTCPeerConnection is not None and settings.BACKPLANE == "inprocess"
+
+    def choose_mode(self, requested: Optional[str], member_count: int) -> str:
+        """GROUP_CALL_MODE=sfu always uses the SFU, auto uses it for larger groups or when the caller asks"""
+        if not self.available or self.mode == MESH:
+            return MESH
+        if self.mode == SFU:
+            return SFU
+        if requested in (MESH, SFU):
+            return requested
+        return SFU if member_count >= self.auto_threshold else MESH
+
+    def _room(self, group_id: int) -> SfuRoom:
+        room = self.rooms.get(group_id)
+        if room is None:
+            room = self.rooms[group_id] = SfuRoom(group_id, manager.send_personal_message)
+        return room
+
+    async def handle_offer(self, group_id: int, user_id: int, sdp: dict):
+        await self._room(group_id).handle_offer(user_id, sdp)
+
+    async def handle_answer(self, group_id: int, user_id: int, sdp: dict):
+        room = self.rooms.get(group_id)
+        if room is not None:
+            await room.handle_answer(user_id, sdp)
+
+    async def add_candidate(self, group_id: int, user_id: int, candidate: dict):
+        room = self.rooms.get(group_id)
+        if room is not None:
+            await room.add_candidate(user_id, candidate)
+
+    async def leave(self, group_id: int, user_id: int):
+        room = self.rooms.get(group_id)
+        if room is None:
+            return
+        await room.remove(user_id)
+        if not room.peers:
+            del self.rooms[group_id]
+            await room.close()
+
+    async def stop(self):
+        for room in list(self.rooms.values()):
+            await room.close()
+        self.rooms.clear()
+
+sfu_service = SfuService(mode=settings.GROUP_CALL_MODE, auto_threshold=settings.SFU_AUTO_THRESHOLD)
@@ -0,0 +1,151 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Type
+
+from pydantic import BaseModel, ValidationError, field_validator
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.metrics import Histogram, signal_frame_latency
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_TYPE = "<unknown>"
+
+
+class SignalFrame(BaseModel):
+    """Routing fields shared by every signaling frame; other keys are relayed untouched"""
+
+    type: Optional[str] = None
+    to: Optional[int] = None
+    targetUserId: Optional[int] = None
+    groupId: Optional[int] = None
+
+    @field_validator("to", "targetUserId", "groupId", mode="before")
+    @classmethod
+    def _blank_is_missing(cls, value):
+        return value or None
+
+    @property
+    def target_user_id(self) -> Optional[int]:
+        return self.to or self.targetUserId
+
+
+@dataclass
+class SignalContext:
+    """The connection a frame arrived on"""
+
+    user_id: int
+    username: Optional[str]
+    db: AsyncSession
+
+    @property
+    def display_name(self) -> str:
+        return self.username or f"user_{self.user_id}"
+
+
+Handler = Callable[[SignalContext, SignalFrame, dict], Awaitable[None]]
+
+
+@dataclass
+class Route:
+    handler: Handler
+    model: Type[SignalFrame]
+
+
+@dataclass
+class TypeTiming:
+    count: int = 0
+    errors: int = 0
+    total_ns: int = 0
+    max_ns: int = 0
+    # Receive-to-relay latency for /metrics, including decoding.
+    latency: Optional[Histogram] = None
+
+
+class SignalingDispatcher:
+    """
+    Maps a frame's `type` to the handler and pydantic model registered for it.
+
+    Each frame's routing fields are validated once against the route's model
+    before the handler runs with the validated frame and the raw message to
+    relay. Frames of unregistered types go to the fallback handler. Handler
+    time is recorded per type, and so is the time since the frame was
+    received when the caller passes it.
+    """
+
+    def __init__(self, send_error: Callable[[int, str], Awaitable[None]]):
+        self._routes: Dict[str, Route] = {}
+        self._fallback: Optional[Route] = None
+        self._send_error = send_error
+        self.timings: Dict[str, TypeTiming] = {}
+
+    def route(self, *msg_types: str, model: Type[SignalFrame] = SignalFrame):
+        def register(handler: Handler) -> Handler:
+            for msg_type in msg_types:
+                self._routes[msg_type] = Route(handler, model)
+            return handler
+        return register
+
+    def fallback(self, model: Type[SignalFrame] = SignalFrame):
+        def register(handler: Handler) -> Handler:
+            self._fallback = Route(handler, model)
+            return handler
+        return register
+
+    async def dispatch(self, ctx: SignalContext, message: dict, received_ns: Optional[int] = None):
+        msg_type = message.get("type")
+        route = self._routes.get(msg_type) if isinstance(msg_type, str) else None
+        timing_key = msg_type if route is not None else UNKNOWN_TYPE
+        route = route or self._fallback
+        if route is None:
+            return
+
+        if ctx.username and "sender_username" not in message:
+            message["sender_username"] = ctx.username
+
+        timing = self.timings.get(timing_key)
+        if timing is None:
+            timing = self.timings[timing_key] = TypeTiming(latency=signal_frame_latency.labels(timing_key))
+        started = time.perf_counter_ns()
+        try:
+            try:
+                frame = route.model.model_validate(message)
+            except ValidationError as exc:
+                timing.errors += 1
+                await self._send_error(ctx.user_id, self._describe(exc))
+                return
+            await route.handler(ctx, frame, message)
+        except Exception:
+            timing.errors += 1
+            raise
+        finally:
+            finished = time.perf_counter_ns()
+            elapsed = finished - started
+            timing.count += 1
+            timing.total_ns += elapsed
+            if elapsed > timing.max_ns:
+                timing.max_ns = elapsed
+            if received_ns is not None:
+                timing.latency.observe((finished - received_ns) / 1e9)
+
+    def _describe(self, exc: ValidationError) -> str:
+        error = exc.errors()[0]
+        field = error["loc"][0] if error["loc"] else None
+        if field in ("to", "targetUserId"):
+            return f"Invalid target user_id: {error['input']}"
+        if field == "groupId":
+            return f"Invalid groupId: {error['input']}"
+        return f"Invalid {field}: {error['msg']}"
+
+    def stats(self) -> dict:
+        """Frames, failures and handler time per message type"""
+        return {
+            msg_type: {
+                "count": timing.count,
+                "errors": timing.errors,
+                "avg_us": round(timing.total_ns / timing.count / 1000, 1) if timing.count else 0,
+                "max_us": round(timing.max_ns / 1000, 1),
+            }
+            for msg_type, timing in self.timings.items()
+        }
@@ -0,0 +1,314 @@
+from functools import wraps
+from typing import Optional
+
+from fastapi import WebSocket
+from pydantic import BaseModel
+
+from ..db import database, models
+from .heartbeat import HEARTBEAT_CLOSE_CODE, heartbeat_service
+from .membership_index import membership_index
+from .message_sync import message_sync
+from .presence_service import presence_service
+from .rate_limiter import RATE_LIMIT_CLOSE_CODE, frame_category, rate_limiter
+from .sfu import SFU, sfu_service
+from .signaling_dispatcher import SignalContext, SignalFrame, SignalingDispatcher
+from .signaling_service import manager
+
+
+async def send_error(user_id: int, detail: str):
+    await manager.send_personal_message({"type": "error", "detail": detail}, user_id)
+
+dispatcher = SignalingDispatcher(send_error)
+
+
+class SyncFrame(SignalFrame):
+    lastMessageId: Optional[int] = None
+    lastGroupMessageId: Optional[int] = None
+
+
+class SessionDescription(BaseModel):
+    type: str
+    sdp: str
+
+
+class IceCandidate(BaseModel):
+    candidate: Optional[str] = None
+    sdpMid: Optional[str] = None
+    sdpMLineIndex: Optional[int] = None
+
+
+class GroupCallFrame(SignalFrame):
+    isVideo: bool = False
+    groupName: Optional[str] = None
+    reason: Optional[str] = None
+    mode: Optional[str] = None
+    sdp: Optional[SessionDescription] = None
+    candidate: Optional[IceCandidate] = None
+
+
+def group_call(handler):
+    """Require a groupId the sender belongs to and stamp the sender onto the message"""
+    @wraps(handler)
+    async def checked(ctx: SignalContext, frame: GroupCallFrame, message: dict):
+        group_id = frame.groupId
+        if not group_id:
+            await send_error(ctx.user_id, f"{frame.type} requires a 'groupId' field.")
+            return
+        if not await membership_index.is_member(ctx.db, group_id, ctx.user_id):
+            await send_error(ctx.user_id, f"You are not a member of group {group_id}.")
+            return
+        message["groupId"] = group_id
+        message["userId"] = ctx.user_id
+        message["sender_username"] = ctx.display_name
+        await handler(ctx, frame, message)
+    return checked
+
+
+@dispatcher.route("call_offer", "call_answer", "candidate", "call_rejected", "call_busy", "call_ended")
+async def relay_call_signal(ctx: SignalContext, frame: SignalFrame, message: dict):
+    message["from"] = ctx.user_id
+    if frame.target_user_id is not None:
+        await manager.send_personal_message(message, frame.target_user_id)
+    else:
+        await send_error(ctx.user_id, f"{frame.type} requires a 'to' or 'targetUserId' field specifying the target user ID.")
+
+
+@dispatcher.route("group-call-start", model=GroupCallFrame)
+@group_call
+async def start_group_call(ctx: SignalContext, frame: GroupCallFrame, message: dict):
+    member_ids = await membership_index.get_member_ids(ctx.db, frame.groupId)
+    mode = manager.get_group_call_mode(frame.groupId) if manager.is_group_call_active(frame.groupId) \
+        else sfu_service.choose_mode(frame.mode, len(member_ids))
+    await manager.start_group_call(frame.groupId, ctx.user_id, frame.isVideo, mode)
+    start_notification = {
+        'type': 'group-call-start',
+        'userId': ctx.user_id,
+        'sender_username': ctx.display_name,
+        'groupId': frame.groupId,
+        'groupName': frame.groupName,
+        'isVideo': frame.isVideo,
+        'mode': mode,
+        'recipients': message.get('recipients', [])
+    }
+    for member_id in member_ids:
+        if member_id != ctx.user_id and manager.is_user_connected(member_id):
+            await manager.send_personal_message(start_notification, member_id)
+
+
+@dispatcher.route("group-call-join", model=GroupCallFrame)
+@group_call
+async def join_group_call(ctx: SignalContext, frame: GroupCallFrame, message: dict):
+    active_participants = await manager.join_group_call(frame.groupId, ctx.user_id)
+    join_notification = {
+        'type': 'group-call-join',
+        'userId': ctx.user_id,
+        'sender_username': ctx.display_name,
+        'groupId': frame.groupId,
+        'groupName': frame.groupName,
+        'isVideo': frame.isVideo,
+        'mode': manager.get_group_call_mode(frame.groupId),
+        'activeParticipants': active_participants,
+    }
+    await manager.send_to_group_call_participants(frame.groupId, join_notification, sender_user_id=ctx.user_id)
+
+
+@dispatcher.route("group-call-leave", model=GroupCallFrame)
+@group_call
+async def leave_group_call(ctx: SignalContext, frame: GroupCallFrame, message: dict):
+    status = await manager.leave_group_call(frame.groupId, ctx.user_id)
+    await sfu_service.leave(frame.groupId, ctx.user_id)
+    if status == "ended":
+        end_notification = {
+            'type': 'group-call-ended',
+            'userId': ctx.user_id,
+            'sender_username': ctx.display_name,
+            'groupId': frame.groupId,
+            'reason': 'Last participant left the call'
+        }
+        await manager.broadcast_to_group(ctx.db, frame.groupId, end_notification)
+    elif status == "left":
+        leave_notification = {
+            'type': 'group-call-leave',
+            'userId': ctx.user_id,
+            'sender_username': ctx.display_name,
+            'groupId': frame.groupId
+        }
+        await manager.send_to_group_call_participants(frame.groupId, leave_notification, sender_user_id=ctx.user_id)
+
+
+@dispatcher.route("group-call-busy", model=GroupCallFrame)
+@group_call
+async def group_call_busy(ctx: SignalContext, frame: GroupCallFrame, message: dict):
+    busy_notification = {
+        'type': 'group-call-busy',
+        'userId': ctx.user_id,
+        'sender_username': ctx.display_name,
+        'groupId': frame.groupId,
+        'reason': frame.reason or 'User is busy'
+    }
+    target_user_id = frame.target_user_id
+    if target_user_id:
+        busy_notification['to'] = target_user_id
+        await manager.send_personal_message(busy_notification, target_user_id)
+    else:
+        await manager.send_to_group_call_participants(frame.groupId, busy_notification, sender_user_id=ctx.user_id)
+
+
+@dispatcher.route("group-call-offer", model=GroupCallFrame)
+@group_call
+async def relay_group_call_offer(ctx: SignalContext, frame: GroupCallFrame, message: dict):
+    if not manager.is_user_in_group_call(frame.groupId, ctx.user_id):
+        await manager.join_group_call(frame.groupId, ctx.user_id)
+    if _for_sfu(frame):
+        if await _require_sdp(ctx, frame):
+            await sfu_service.handle_offer(frame.groupId, ctx.user_id, frame.sdp.model_dump())
+        return
+    await _relay_to_target_or_call(ctx, frame, message)
+
+
+@dispatcher.route("group-call-answer", model=GroupCallFrame)
+@group_call
+async def relay_group_call_answer(ctx: SignalContext, frame: GroupCallFrame, message: dict):
+    if _for_sfu(frame):
+        if await _require_sdp(ctx, frame):
+            await sfu_service.handle_answer(frame.groupId, ctx.user_id, frame.sdp.model_dump())
+        return
+    await _relay_to_target_or_call(ctx, frame, message)
+
+
+@dispatcher.route("group-ice-candidate", model=GroupCallFrame)
+@group_call
+async def relay_group_ice_candidate(ctx: SignalContext, frame: GroupCallFrame, message: dict):
+    if _for_sfu(frame):
+        if frame.candidate is not None:
+            await sfu_service.add_candidate(frame.groupId, ctx.user_id, frame.candidate.model_dump())
+        return
+    await _relay_to_target_or_call(ctx, frame, message)
+
+
+def _for_sfu(frame: GroupCallFrame) -> bool:
+    # In SFU calls, untargeted offers, answers and candidates are meant for the server.
+    return not frame.target_user_id and manager.get_group_call_mode(frame.groupId) == SFU
+
+
+async def _require_sdp(ctx: SignalContext, frame: GroupCallFrame) -> bool:
+    if frame.sdp is None:
+        await send_error(ctx.user_id, f"{frame.type} requires an 'sdp' field.")
+        return False
+    return True
+
+
+async def _relay_to_target_or_call(ctx: SignalContext, frame: GroupCallFrame, message: dict):
+    if frame.target_user_id:
+        await manager.send_personal_message(message, frame.target_user_id)
+    else:
+        await manager.send_to_group_call_participants(frame.groupId, message, sender_user_id=ctx.user_id)
+
+
+@dispatcher.route("group-call-user-joined", "group-call-ended", model=GroupCallFrame)
+@group_call
+async def relay_group_call_event(ctx: SignalContext, frame: GroupCallFrame, message: dict):
+    await manager.send_to_group_call_participants(frame.groupId, message, sender_user_id=ctx.user_id)
+
+
+@dispatcher.route("chat_message")
+async def relay_chat_message(ctx: SignalContext, frame: SignalFrame, message: dict):
+    if frame.target_user_id:
+        await manager.send_personal_message(message, frame.target_user_id)
+    else:
+        await manager.broadcast(message, sender_user_id=ctx.user_id)
+
+
+@dispatcher.route("join")
+async def announce_join(ctx: SignalContext, frame: SignalFrame, message: dict):
+    # Presence goes out to contacts and group peers with the next batch.
+    presence_service.mark_changed(ctx.user_id)
+
+
+@dispatcher.route("sync", model=SyncFrame)
+async def sync_messages(ctx: SignalContext, frame: SyncFrame, message: dict):
+    # Sent again by clients told `more` in the previous sync_complete.
+    await message_sync.push_missed(ctx.db, ctx.user_id, frame.lastMessageId, frame.lastGroupMessageId)
+
+
+@dispatcher.route("ping")
+async def answer_ping(ctx: SignalContext, frame: SignalFrame, message: dict):
+    await manager.send_personal_message({"type": "pong"}, ctx.user_id)
+
+
+@dispatcher.route("pong")
+async def accept_pong(ctx: SignalContext, frame: SignalFrame, message: dict):
+    # Receiving the frame already counted as a sign of life.
+    pass
+
+
+@dispatcher.fallback()
+async def broadcast_unknown(ctx: SignalContext, frame: SignalFrame, message: dict):
+    await manager.broadcast(message, sender_user_id=ctx.user_id)
+
+
+async def admit_frame(ctx: SignalContext, websocket: WebSocket, msg_type) -> bool:
+    """Spend a token from the frame type's budget; refused frames are dropped before dispatch"""
+    category = frame_category(msg_type)
+    retry_after = rate_limiter.take(ctx.user_id, category)
+    if retry_after is None:
+        return True
+    refused = rate_limiter.rejected_in_a_row(ctx.user_id, category)
+    if refused == rate_limiter.close_after:
+        rate_limiter.disconnects += 1
+        try:
+            await websocket.close(code=RATE_LIMIT_CLOSE_CODE)
+        except Exception:
+            pass
+    elif refused == 1:
+        await manager.send_personal_message({
+            "type": "error",
+            "code": "rate_limited",
+            "category": category,
+            "retryAfter": round(retry_after, 3),
+            "detail": f"Too many {category} frames, slow down.",
+        }, ctx.user_id)
+    return False
+
+
+async def close_session(user_id: int, websocket: WebSocket, username: Optional[str] = None):
+    """Clean up after a connection went away, however that was noticed: leave its calls and tell the other participants"""
+    heartbeat_service.unwatch(user_id, websocket)
+    left_calls = manager.disconnect(user_id, websocket)
+    if not manager.is_user_connected(user_id):
+        rate_limiter.forget(user_id)
+    presence_service.mark_changed(user_id)
+    if not left_calls:
+        return
+    async with database.async_session() as db:
+        if username is None:
+            db_user = await db.get(models.User, user_id)
+            username = db_user.username if db_user else None
+        display_name = username or f"user_{user_id}"
+        for group_id, status in left_calls:
+            await sfu_service.leave(group_id, user_id)
+            if status == "ended":
+                await manager.broadcast_to_group(db, group_id, {
+                    'type': 'group-call-ended',
+                    'groupId': group_id,
+                    'reason': f'{display_name} disconnected, ending the call.'
+                })
+            elif status == "left":
+                await manager.send_to_group_call_participants(group_id, {
+                    'type': 'group-call-leave',
+                    'userId': user_id,
+                    'sender_username': display_name,
+                    'groupId': group_id
+                }, sender_user_id=user_id)
+
+
+manager.set_session_closer(close_session)
+
+
+async def reap_connection(user_id: int, websocket: WebSocket):
+    """Heartbeat timeout: clean up first, then close the half-open socket"""
+    await close_session(user_id, websocket)
+    try:
+        await websocket.close(code=HEARTBEAT_CLOSE_CODE)
+    except Exception:
+        pass
@@ -1,153 +1,350 @@
+import asyncio
 from fastapi import WebSocket
-from typing import Dict, List, Optional
-import json
-from sqlalchemy.orm import Session
-from ..db import models
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.config import settings
+from ..core.metrics import signal_fanout
+from ..core.security import token_cache
+from .backplane import Backplane, create_backplane
+from .call_registry import NOT_IN_CALL, CallRegistry
+from .connection_writer import ConnectionWriter, SendQueueStats
+from .membership_index import membership_index
+from .wire_codec import JSON, WireCodec
+from .user_search_index import user_search_index
 
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, backplane: Optional[Backplane] = None):
         self.active_connections: Dict[int, WebSocket] = {}
-        self.active_group_calls: Dict[int, List[int]] = {} 
-        self.group_call_types: Dict[int, bool] = {}
-        
-    async def connect(self, websocket: WebSocket, user_id: int):
-        await websocket.accept()
+        self.writers: Dict[int, ConnectionWriter] = {}
+        self.send_queue_stats = SendQueueStats()
+        # Users whose socket is held by another worker, mapped to that worker's node id.
+        self.remote_connections: Dict[int, str] = {}
+        self.calls = CallRegistry()
+        self.backplane = backplane or create_backplane()
+        self._detached_hooks: List[Callable[[int, WebSocket], None]] = []
+        self._session_closer: Optional[Callable[[int, WebSocket], Awaitable[None]]] = None
+        self._closing: Set[asyncio.Task] = set()
+        self._op_handlers: Dict[str, Callable[[dict], Awaitable[None]]] = {
+            "connected": self._on_backplane_connected,
+            "sync_request": self._on_sync_request,
+            "sync_state": self._on_sync_state,
+            "node_down": self._on_node_down,
+            "online": self._on_remote_online,
+            "offline": self._on_remote_offline,
+            "deliver": self._on_deliver,
+            "broadcast": self._on_broadcast,
+            "call": self._on_call,
+        }
+
+    async def start(self):
+        await self.backplane.start(self._on_backplane_event)
+        self.publish("sync_request")
+
+    async def stop(self):
+        for user_id in list(self.writers):
+            self.disconnect(user_id)
+        await self.backplane.stop()
+
+    def publish(self, op: str, **payload):
+        """Send an event to the managers running in the other workers"""
+        self.backplane.publish({"op": op, "node": self.backplane.node_id, **payload})
+
+    def register_op_handler(self, op: str, handler: Callable[[dict], Awaitable[None]]):
+        """Handle backplane events of type `op` published by other workers"""
+        self._op_handlers[op] = handler
+
+    def set_session_closer(self, closer: Callable[[int, WebSocket], Awaitable[None]]):
+        """Run `closer(user_id, websocket)` when a writer fails, so the connection gets the same cleanup as a closed socket"""
+        self._session_closer = closer
+
+    def on_detached(self, hook: Callable[[int, WebSocket], None]):
+        """Call `hook(user_id, websocket)` when a local socket is let go because the user connected on another worker"""
+        self._detached_hooks.append(hook)
+
+    async def connect(self, websocket: WebSocket, user_id: int, codec: WireCodec = JSON, subprotocol: Optional[str] = None):
+        await websocket.accept(subprotocol=subprotocol)
+        previous_writer = self.writers.pop(user_id, None)
+        if previous_writer is not None:
+            previous_writer.close()
+        writer = ConnectionWriter(
+            websocket,
+            max_size=settings.SEND_QUEUE_MAX_SIZE,
+            overflow_policy=settings.SEND_QUEUE_OVERFLOW_POLICY,
+            stats=self.send_queue_stats,
+            on_closed=lambda closed_writer: self._on_writer_closed(user_id, closed_writer),
+            codec=codec,
+        )
+        writer.start()
+        self.writers[user_id] = writer
         self.active_connections[user_id] = websocket
+        self.remote_connections.pop(user_id, None)
+        self.publish("online", user_id=user_id)
+
+    def disconnect(self, user_id: int, websocket: Optional[WebSocket] = None) -> List[Tuple[int, str]]:
+        """
+        Drop the user's connection and take them out of their calls; returns
+        (group_id, status) per call left. With `websocket`, nothing happens
+        unless that socket is still the user's current connection, so a
+        stale socket closing late cannot tear down a reconnect.
+        """
+        if websocket is not None:
+            current = self.writers.get(user_id)
+            if current is None or current.websocket is not websocket:
+                return []
+        writer = self.writers.pop(user_id, None)
+        if writer is not None:
+            writer.close()
+        self.active_connections.pop(user_id, None)
+        if user_id in self.remote_connections:
+            # Live on another worker: presence and calls are that connection's.
+            return []
+        self.publish("offline", user_id=user_id)
+
+        left_calls = self.calls.leave_all(user_id)
+        for group_id, _ in left_calls:
+            self.publish("call", action="leave", group_id=group_id, user_id=user_id, disconnected=True)
+        return left_calls
+
+    def _on_writer_closed(self, user_id: int, writer: ConnectionWriter):
+        # A failed or overflowing writer takes its connection down with it,
+        # unless the user has already reconnected with a fresh writer. The
+        # session closer also tells the user's calls that they left.
+        if self.writers.get(user_id) is not writer:
+            return
+        if self._session_closer is None:
+            self.disconnect(user_id, writer.websocket)
+            return
+        task = asyncio.get_running_loop().create_task(self._session_closer(user_id, writer.websocket))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
 
-    def disconnect(self, user_id: int):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-        
-        for group_id, participants in list(self.active_group_calls.items()):
-            if user_id in participants:
-                participants.remove(user_id)
-                if not participants:                      
-                    del self.active_group_calls[group_id]
+    def get_send_queue_stats(self) -> dict:
+        """Queue depth and drop counters across all local connections"""
+        depths = [writer.depth for writer in self.writers.values()]
+        return {
+            "connections": len(depths),
+            "queued_frames": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "dropped_frames": self.send_queue_stats.dropped_frames,
+            "slow_consumer_disconnects": self.send_queue_stats.slow_consumer_disconnects,
+            "send_failures": self.send_queue_stats.send_failures,
+        }
 
     def is_user_connected(self, user_id: int) -> bool:
-        """Check if a user is currently connected via WebSocket"""
-        return user_id in self.active_connections
+        """Check if a user is currently connected via WebSocket on any worker"""
+        return user_id in self.active_connections or user_id in self.remote_connections
 
     async def send_personal_message(self, message: dict, user_id: int):
-        if user_id in self.active_connections:
-            websocket = self.active_connections[user_id]
-            try:
-                await websocket.send_text(json.dumps(message))
-            except Exception as e:
-                self.disconnect(user_id)
+        if user_id in self.writers:
+            writer = self.writers[user_id]
+            writer.enqueue(writer.codec.encode(message))
+        elif user_id in self.remote_connections:
+            self.publish("deliver", user_ids=[user_id], message=message)
 
     async def broadcast(self, message: dict, sender_user_id: Optional[int] = None):
         """Broadcast message to all connected users except the sender"""
-        for user_id, websocket in list(self.active_connections.items()):
-            if sender_user_id and user_id == sender_user_id:
-                continue              
-            try:
-                await websocket.send_text(json.dumps(message))
-            except Exception as e:
-                self.disconnect(user_id)
+        await self._send_local(self.active_connections.keys(), message, sender_user_id, droppable=True)
+        self.publish("broadcast", message=message, exclude=sender_user_id, droppable=True)
 
-    async def broadcast_to_group(self, db: Session, group_id: int, message: dict, sender_user_id: Optional[int] = None):
+    async def broadcast_to_group(self, db: AsyncSession, group_id: int, message: dict, sender_user_id: Optional[int] = None):
         """Broadcast message to all members of a specific group"""
-        group_members = db.query(models.GroupMember).filter(models.GroupMember.group_id == group_id).all()
-        
-        for member in group_members:
-            if sender_user_id and member.user_id == sender_user_id:
-                continue              
-            if member.user_id in self.active_connections:
-                try:
-                    await self.active_connections[member.user_id].send_text(json.dumps(message))
-                except Exception as e:
-                    self.disconnect(member.user_id)
-
-        
-    async def start_group_call(self, group_id: int, user_id: int, is_video: bool = False):
+        await self._send_routed(await membership_index.get_member_ids(db, group_id), message, sender_user_id)
+
+    async def _send_routed(self, user_ids: Iterable[int], message: dict, sender_user_id: Optional[int] = None):
+        """Send to local sockets directly and hand the rest to the backplane"""
+        remote_ids = []
+        local_ids = []
+        for user_id in user_ids:
+            if sender_user_id and user_id == sender_user_id:
+                continue
+            if user_id in self.active_connections:
+                local_ids.append(user_id)
+            elif user_id in self.remote_connections:
+                remote_ids.append(user_id)
+        await self._send_local(local_ids, message)
+        if remote_ids:
+            self.publish("deliver", user_ids=remote_ids, message=message)
+
+    async def _send_local(self, user_ids: Iterable[int], message: dict, sender_user_id: Optional[int] = None, droppable: bool = False):
+        """Encode once per wire codec and queue the frame on each recipient's writer"""
+        payloads = {}
+        recipients = 0
+        for user_id in list(user_ids):
+            if sender_user_id and user_id == sender_user_id:
+                continue
+            writer = self.writers.get(user_id)
+            if writer is None:
+                continue
+            payload = payloads.get(writer.codec.name)
+            if payload is None:
+                payload = payloads[writer.codec.name] = writer.codec.encode(message)
+            writer.enqueue(payload, droppable)
+            recipients += 1
+        signal_fanout.observe(recipients)
+
+
+    async def start_group_call(self, group_id: int, user_id: int, is_video: bool = False, mode: str = "mesh"):
         """Start a group call and track its type"""
-        if group_id not in self.active_group_calls:
-            self.active_group_calls[group_id] = []
-        if user_id not in self.active_group_calls[group_id]:
-            self.active_group_calls[group_id].append(user_id)
-        self.group_call_types[group_id] = is_video  # Store call type
-        return list(self.active_group_calls[group_id])
-            
+        call = self.calls.start(group_id, user_id, is_video, mode)
+        self.publish("call", action="start", group_id=group_id, user_id=user_id, is_video=is_video, mode=mode)
+        return call.participant_ids()
+
+    def get_group_call_mode(self, group_id: int) -> str:
+        call = self.calls.get(group_id)
+        return call.mode if call is not None else "mesh"
+
     def get_group_call_type(self, group_id: int) -> bool:
-        return self.group_call_types.get(group_id, False)
+        call = self.calls.get(group_id)
+        return call.is_video if call is not None else False
 
     async def join_group_call(self, group_id: int, user_id: int):
         """Add a user to an active group call"""
-        if group_id not in self.active_group_calls:
-            self.active_group_calls[group_id] = []
-        
-        if user_id not in self.active_group_calls[group_id]:
-            self.active_group_calls[group_id].append(user_id)
-        
-        return self.active_group_calls[group_id]  
+        call = self.calls.join(group_id, user_id)
+        self.publish("call", action="join", group_id=group_id, user_id=user_id)
+        return call.participant_ids()
+
     async def leave_group_call(self, group_id: int, user_id: int) -> str:
         """Remove a user from a group call. Returns 'ended' if call ended, 'left' if user just left"""
-        if group_id in self.active_group_calls and user_id in self.active_group_calls[group_id]:
-            self.active_group_calls[group_id].remove(user_id)
-            
-            if not self.active_group_calls[group_id]:
-                del self.active_group_calls[group_id]
-                if group_id in self.group_call_types:
-                    del self.group_call_types[group_id]
-                return "ended"
-            else:
-                return "left"
-        
-        return "not_in_call"
+        status = self.calls.leave(group_id, user_id)
+        if status != NOT_IN_CALL:
+            self.publish("call", action="leave", group_id=group_id, user_id=user_id)
+        return status
 
     def is_user_in_group_call(self, group_id: int, user_id: int) -> bool:
         """Check if a user is in a specific group call"""
-        return group_id in self.active_group_calls and user_id in self.active_group_calls[group_id]
-
-    def get_group_call_participants(self, group_id: int) -> List[int]:
-        """Get list of active participants in a group call"""
-        return self.active_group_calls.get(group_id, [])
+        return self.calls.is_participant(group_id, user_id)
 
     async def send_to_group_call_participants(self, group_id: int, message: dict, sender_user_id: Optional[int] = None):
         """Send message to all active participants in a group call"""
-        if group_id not in self.active_group_calls:
+        call = self.calls.get(group_id)
+        if call is None:
             return
 
-        participants = self.active_group_calls[group_id]
-        for participant_id in participants:
-            if sender_user_id and participant_id == sender_user_id:
-                continue              
-            if participant_id in self.active_connections:
-                try:
-                    await self.active_connections[participant_id].send_text(json.dumps(message))
-                except Exception as e:
-                    self.disconnect(participant_id)
-                    if participant_id in self.active_group_calls[group_id]:
-                        self.active_group_calls[group_id].remove(participant_id)
+        await self._send_routed(call.participant_ids(), message, sender_user_id)
 
     def get_active_group_calls(self) -> Dict[int, List[int]]:
         """Get all active group calls"""
-        return self.active_group_calls.copy()
+        return {call.group_id: call.participant_ids() for call in self.calls}
 
     def get_group_call_count(self, group_id: int) -> int:
         """Get number of participants in a group call"""
-        return len(self.active_group_calls.get(group_id, []))
-    
+        call = self.calls.get(group_id)
+        return len(call.participants) if call is not None else 0
+
     def is_group_call_active(self, group_id: int) -> bool:
         """Check if a group call is currently active"""
-        return group_id in self.active_group_calls and len(self.active_group_calls[group_id]) > 0
+        return self.calls.is_active(group_id)
 
-    def get_group_call_participants(self, group_id: int) -> list:
+    def get_group_call_participants(self, group_id: int) -> List[int]:
         """Get list of participants in a group call"""
-        return list(self.active_group_calls.get(group_id, []))
+        return self.calls.participants(group_id)
 
     async def join_ongoing_group_call(self, group_id: int, user_id: int):
         """Allow user to join an ongoing group call"""
         if not self.is_group_call_active(group_id):
             return False
-       
-        if group_id not in self.active_group_calls:
-            self.active_group_calls[group_id] = []
-        
-        if user_id not in self.active_group_calls[group_id]:
-            self.active_group_calls[group_id].append(user_id)
+
+        if not self.calls.is_participant(group_id, user_id):
+            await self.join_group_call(group_id, user_id)
             return True
         return False
 
-manager = ConnectionManager()
\ No newline at end of file
+    async def _on_backplane_event(self, event: dict):
+        handler = self._op_handlers.get(event.get("op"))
+        if handler is not None:
+            await handler(event)
+
+    async def _on_backplane_connected(self, event: dict):
+        self.publish("sync_request")
+
+    async def _on_sync_request(self, event: dict):
+        self.publish(
+            "sync_state",
+            user_ids=list(self.active_connections),
+            calls={str(call.group_id): call.to_dict() for call in self.calls},
+        )
+
+    async def _on_sync_state(self, event: dict):
+        for user_id in event.get("user_ids", []):
+            if user_id not in self.active_connections:
+                self.remote_connections[user_id] = event["node"]
+        for group_id, state in event.get("calls", {}).items():
+            known = self.calls.is_active(int(group_id))
+            for user_id in state["participants"]:
+                call = self.calls.join(int(group_id), user_id)
+            if not known and state["participants"]:
+                call.is_video = state["is_video"]
+                call.mode = state.get("mode", "mesh")
+                call.initiator_id = state["initiator_id"]
+                call.started_at = state["started_at"]
+
+    async def _on_node_down(self, event: dict):
+        down_node = event.get("down_node")
+        for user_id, node_id in list(self.remote_connections.items()):
+            if node_id == down_node:
+                del self.remote_connections[user_id]
+                self.calls.leave_all(user_id)
+
+    async def _on_remote_online(self, event: dict):
+        user_id = event["user_id"]
+        self.remote_connections[user_id] = event["node"]
+        # The user reconnected elsewhere; a socket still held here is stale.
+        # Let it go the way connect() lets go of a replaced one: its calls
+        # and presence now belong to the new connection.
+        writer = self.writers.pop(user_id, None)
+        if writer is not None:
+            writer.close()
+            for hook in self._detached_hooks:
+                hook(user_id, writer.websocket)
+        self.active_connections.pop(user_id, None)
+
+    async def _on_remote_offline(self, event: dict):
+        if self.remote_connections.get(event["user_id"]) == event["node"]:
+            del self.remote_connections[event["user_id"]]
+
+    async def _on_deliver(self, event: dict):
+        await self._send_local(event.get("user_ids", []), event["message"], droppable=event.get("droppable", False))
+
+    async def _on_broadcast(self, event: dict):
+        await self._send_local(self.active_connections.keys(), event["message"], event.get("exclude"), droppable=event.get("droppable", False))
+
+    async def _on_call(self, event: dict):
+        action = event.get("action")
+        group_id = event["group_id"]
+        user_id = event["user_id"]
+        if action == "start":
+            self.calls.start(group_id, user_id, event.get("is_video", False), event.get("mode", "mesh"))
+        elif action == "join":
+            self.calls.join(group_id, user_id)
+        elif action == "leave":
+            if event.get("disconnected") and user_id in self.active_connections:
+                # A stale socket closed on another worker before it heard the
+                # user reconnected here. Keep them in the call and put the
+                # other workers' registries back.
+                if self.calls.is_participant(group_id, user_id):
+                    self.publish("call", action="join", group_id=group_id, user_id=user_id)
+                return
+            self.calls.leave(group_id, user_id)
+
+manager = ConnectionManager()
+
+
+async def _on_membership_changed(event: dict):
+    membership_index.invalidate(event["group_id"], event.get("user_id"))
+
+manager.register_op_handler("membership", _on_membership_changed)
+membership_index.subscribe(lambda group_id, user_id: manager.publish("membership", group_id=group_id, user_id=user_id))
+
+
+async def _on_user_registered(event: dict):
+    user_search_index.add(event["user_id"], event["username"], notify=False)
+
+manager.register_op_handler("user_registered", _on_user_registered)
+user_search_index.subscribe(lambda user_id, username: manager.publish("user_registered", user_id=user_id, username=username))
+
+
+async def _on_user_changed(event: dict):
+    token_cache.invalidate_user(event["user_id"], notify=False)
+
+manager.register_op_handler("user_changed", _on_user_changed)
+token_cache.subscribe(lambda user_id: manager.publish("user_changed", user_id=user_id))
@@ -0,0 +1,47 @@
+import math
+from typing import Any, List, Tuple
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel: `slots` buckets, one per `tick` seconds.
+
+    Scheduling and expiring are O(1) per timer, however many are pending, so
+    one task can drive timers for every connection. Delays longer than one
+    turn of the wheel wait out the extra rounds in their bucket. Timers are
+    not cancelled; owners ignore the ones they no longer care about when they
+    fire.
+    """
+
+    def __init__(self, tick: float, slots: int):
+        self.tick = tick
+        self._slots: List[List[Tuple[int, Any]]] = [[] for _ in range(slots)]
+        self._cursor = 0
+        self._pending = 0
+
+    def __len__(self) -> int:
+        return self._pending
+
+    def schedule(self, item: Any, delay: float):
+        """Return `item` from the advance() roughly `delay` seconds from now (at least one tick)"""
+        ticks = max(1, math.ceil(delay / self.tick))
+        slot = (self._cursor + ticks) % len(self._slots)
+        self._slots[slot].append(((ticks - 1) // len(self._slots), item))
+        self._pending += 1
+
+    def advance(self) -> List[Any]:
+        """Move one tick forward and return the items due"""
+        self._cursor = (self._cursor + 1) % len(self._slots)
+        bucket = self._slots[self._cursor]
+        if not bucket:
+            return []
+        due = []
+        waiting = []
+        for rounds, item in bucket:
+            if rounds:
+                waiting.append((rounds - 1, item))
+            else:
+                due.append(item)
+        self._slots[self._cursor] = waiting
+        self._pending -= len(due)
+        return due
@@ -0,0 +1,128 @@
+import bisect
+import heapq
+import threading
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..db import models
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class UserSearchIndex:
+    """
+    In-memory username index for the contact search box.
+
+    Queries of three or more characters intersect trigram posting sets and
+    then confirm the substring; shorter queries walk a sorted list for prefix
+    matches and only fall back to scanning when fewer than `limit` prefixes
+    exist. Matching is case-insensitive. The index is built from the users
+    table on first use and kept current by /auth/register.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._names: Dict[int, str] = {}
+        self._lowered: Dict[int, str] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._sorted: List[Tuple[str, int]] = []
+        # Users added before the first load finished; its snapshot may predate them.
+        self._pending: Dict[int, str] = {}
+        self._listeners: List[Callable[[int, str], None]] = []
+
+    def subscribe(self, listener: Callable[[int, str], None]):
+        """Call `listener(user_id, username)` for every user added through this process"""
+        self._listeners.append(listener)
+
+    def ensure_loaded(self, db: Session):
+        if self._loaded:
+            return
+        rows = db.query(models.User.id, models.User.username).all()
+        with self._lock:
+            if self._loaded:
+                return
+            for user_id, username in rows:
+                self._insert(user_id, username)
+            for user_id, username in self._pending.items():
+                if user_id not in self._names:
+                    self._insert(user_id, username)
+            self._pending.clear()
+            self._sorted = sorted((lowered, user_id) for user_id, lowered in self._lowered.items())
+            self._loaded = True
+
+    def add(self, user_id: int, username: str, notify: bool = True):
+        with self._lock:
+            if not self._loaded:
+                self._pending[user_id] = username
+            elif user_id not in self._names:
+                self._insert(user_id, username)
+                bisect.insort(self._sorted, (username.lower(), user_id))
+        if notify:
+            for listener in self._listeners:
+                listener(user_id, username)
+
+    def _insert(self, user_id: int, username: str):
+        lowered = username.lower()
+        self._names[user_id] = username
+        self._lowered[user_id] = lowered
+        for gram in trigrams(lowered):
+            self._postings.setdefault(gram, set()).add(user_id)
+
+    def search(self, query: str, exclude_ids: Set[int], limit: int = 20) -> List[Tuple[int, str]]:
+        """Best `limit` matches as (id, username): exact, then prefix, then earliest and shortest substring"""
+        needle = query.strip().lower()
+        if not needle or limit <= 0:
+            return []
+        with self._lock:
+            if len(needle) >= 3:
+                candidates = self._trigram_candidates(needle)
+            else:
+                candidates = self._short_candidates(needle, exclude_ids, limit)
+            ranked = []
+            for user_id in candidates:
+                if user_id in exclude_ids:
+                    continue
+                lowered = self._lowered[user_id]
+                position = lowered.find(needle)
+                if position < 0:
+                    continue
+                tier = 0 if lowered == needle else 1 if position == 0 else 2
+                ranked.append((tier, position, len(lowered), lowered, user_id))
+            best = heapq.nsmallest(limit, ranked)
+            return [(user_id, self._names[user_id]) for *_, user_id in best]
+
+    def _trigram_candidates(self, needle: str) -> Iterable[int]:
+        postings = []
+        for gram in trigrams(needle):
+            posting = self._postings.get(gram)
+            if not posting:
+                return ()
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                break
+        return candidates
+
+    def _short_candidates(self, needle: str, exclude_ids: Set[int], limit: int) -> Iterable[int]:
+        candidates = []
+        for index in range(bisect.bisect_left(self._sorted, (needle,)), len(self._sorted)):
+            lowered, user_id = self._sorted[index]
+            if not lowered.startswith(needle):
+                break
+            candidates.append(user_id)
+        wanted = limit + len(exclude_ids)
+        if len(candidates) >= wanted:
+            return candidates
+        for user_id, lowered in self._lowered.items():
+            if needle in lowered and not lowered.startswith(needle):
+                candidates.append(user_id)
+                if len(candidates) >= wanted:
+                    break
+        return candidates
+
+user_search_index = UserSearchIndex()
@@ -0,0 +1,117 @@
+import json
+import zlib
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+from ..core.config import settings
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; without it only JSON is offered
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # optional faster JSON decoder
+    orjson = None
+
+Frame = Union[str, bytes]
+
+# Compressed codecs prefix every binary frame with one flag byte so small
+# frames can skip deflate.
+RAW = 0
+DEFLATED = 1
+
+
+class WireCodec:
+    """Turns signaling messages into WebSocket frames for one negotiated format"""
+
+    name = ""
+    binary = False
+
+    def encode(self, message: dict) -> Frame:
+        raise NotImplementedError
+
+    def decode(self, frame: Frame) -> dict:
+        raise NotImplementedError
+
+
+class JsonCodec(WireCodec):
+    name = "json"
+
+    def encode(self, message: dict) -> str:
+        return json.dumps(message)
+
+    def decode(self, frame: Frame) -> dict:
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError.
+        return orjson.loads(frame) if orjson is not None else json.loads(frame)
+
+
+class MsgpackCodec(WireCodec):
+    name = "msgpack"
+    binary = True
+
+    def encode(self, message: dict) -> bytes:
+        return msgpack.packb(message, use_bin_type=True)
+
+    def decode(self, frame: Frame) -> dict:
+        return msgpack.unpackb(frame, raw=False)
+
+
+class DeflateCodec(WireCodec):
+    """
+    Raw-deflates the inner codec's bytes when they exceed `min_bytes`.
+    Incoming frames that would inflate past `max_bytes` are rejected.
+    """
+
+    binary = True
+
+    def __init__(self, inner: WireCodec, min_bytes: int, max_bytes: int, level: int = 6):
+        self.inner = inner
+        self.name = f"{inner.name}+deflate"
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.level = level
+
+    def encode(self, message: dict) -> bytes:
+        body = self.inner.encode(message)
+        if isinstance(body, str):
+            body = body.encode()
+        if len(body) < self.min_bytes:
+            return bytes((RAW,)) + body
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        return bytes((DEFLATED,)) + compressor.compress(body) + compressor.flush()
+
+    def decode(self, frame: Frame) -> dict:
+        flag, body = frame[0], frame[1:]
+        if flag == DEFLATED:
+            decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            body = decompressor.decompress(body, self.max_bytes)
+            if decompressor.unconsumed_tail:
+                raise ValueError(f"Frame inflates past {self.max_bytes} bytes")
+        elif flag != RAW:
+            raise ValueError(f"Unknown frame flag {flag}")
+        return self.inner.decode(body)
+
+
+JSON = JsonCodec()
+
+CODECS: Dict[str, WireCodec] = {JSON.name: JSON}
+CODECS["json+deflate"] = DeflateCodec(JSON, settings.WIRE_DEFLATE_MIN_BYTES, settings.WIRE_MAX_FRAME_BYTES)
+if msgpack is not None:
+    _msgpack = MsgpackCodec()
+    CODECS[_msgpack.name] = _msgpack
+    CODECS["msgpack+deflate"] = DeflateCodec(_msgpack, settings.WIRE_DEFLATE_MIN_BYTES, settings.WIRE_MAX_FRAME_BYTES)
+
+
+def negotiate(requested: Optional[str], subprotocols: Iterable[str] = ()) -> Tuple[WireCodec, Optional[str]]:
+    """
+    Pick the codec for a new connection: the `codec` query parameter if it is
+    supported, else the first supported WebSocket subprotocol the client
+    offered, else JSON. The second value is the subprotocol to accept with.
+    """
+    if requested in CODECS:
+        return CODECS[requested], None
+    for subprotocol in subprotocols:
+        if subprotocol in CODECS:
+            return CODECS[subprotocol], subprotocol
+    return JSON, None
@@ -0,0 +1,88 @@
+"""
+Stress the group call registry with many simultaneous calls.
+
+    python -m benchmarks.bench_call_registry --calls 10000 --participants 8
+
+Starts `--calls` calls, fills each with participants (some users sit in
+several calls), then times lookups, per-user disconnects and call teardown,
+checking the registry and its reverse index stay consistent. Prints one JSON
+document.
+"""
+import argparse
+import json
+import random
+import time
+
+from app.services.call_registry import ENDED, LEFT, CallRegistry
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - started) * 1000, result
+
+
+def check_consistent(registry: CallRegistry):
+    by_user = {}
+    for call in registry:
+        assert call.participants, f"empty call {call.group_id} left behind"
+        for user_id in call.participants:
+            by_user.setdefault(user_id, set()).add(call.group_id)
+    assert by_user == registry._by_user, "reverse index out of sync"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=10_000)
+    parser.add_argument("--participants", type=int, default=8)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    registry = CallRegistry()
+    members = {
+        group_id: rng.sample(range(1, args.users + 1), args.participants)
+        for group_id in range(1, args.calls + 1)
+    }
+
+    def start_and_join():
+        for group_id, user_ids in members.items():
+            registry.start(group_id, user_ids[0], is_video=group_id % 2 == 0)
+            for user_id in user_ids[1:]:
+                registry.join(group_id, user_id)
+
+    join_ms, _ = timed(start_and_join)
+    joins = args.calls * args.participants
+    check_consistent(registry)
+    assert len(registry) == args.calls
+
+    probes = [(rng.randint(1, args.calls), rng.randint(1, args.users)) for _ in range(100_000)]
+    lookup_ms, _ = timed(lambda: [registry.is_participant(group_id, user_id) for group_id, user_id in probes])
+
+    users_in_calls = list(registry._by_user)
+    disconnecting = rng.sample(users_in_calls, len(users_in_calls) // 2)
+    disconnect_ms, results = timed(lambda: [registry.leave_all(user_id) for user_id in disconnecting])
+    statuses = [status for left in results for _, status in left]
+    assert set(statuses) <= {LEFT, ENDED}
+    check_consistent(registry)
+
+    remaining = [call.group_id for call in registry]
+    end_ms, _ = timed(lambda: [registry.end(group_id) for group_id in remaining])
+    assert len(registry) == 0 and not registry._by_user
+
+    print(json.dumps({
+        "calls": args.calls,
+        "participants_per_call": args.participants,
+        "join_total_ms": round(join_ms, 1),
+        "join_us_each": round(join_ms * 1000 / joins, 3),
+        "membership_lookup_us_each": round(lookup_ms * 1000 / len(probes), 3),
+        "disconnect_users": len(disconnecting),
+        "disconnect_us_each": round(disconnect_ms * 1000 / len(disconnecting), 3),
+        "calls_ended_by_disconnects": statuses.count(ENDED),
+        "end_remaining_calls_ms": round(end_ms, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
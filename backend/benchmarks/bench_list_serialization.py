@@ -0,0 +1,192 @@
+"""
+Compare list endpoints serialized from Core rows with the previous path of
+ORM objects validated through the response models.
+
+    python -m benchmarks.bench_list_serialization --rows 10000
+
+Builds a throwaway SQLite database with one page of `--rows` direct
+messages, group messages, group members and contacts. Each list is produced
+both ways:
+
+- orm: load ORM objects, validate them through the `from_attributes`
+  response model and dump them to JSON, as FastAPI does for a response_model
+- rows: select the columns with Core and write them through the endpoint's
+  RowSerializer
+
+Checks both give the same JSON, then reports median wall and CPU time per
+page and per row, and peak traced memory per page. Prints one JSON document.
+"""
+import argparse
+import datetime
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List
+
+from pydantic import TypeAdapter
+from sqlalchemy import and_, create_engine, or_, select
+from sqlalchemy.orm import Session, joinedload
+
+from app.api.contacts_router import contact_rows
+from app.api.group_router import group_message_rows, member_rows
+from app.api.messages_router import message_rows
+from app.db import models, schemas
+from app.services.contact_service import contact_service
+from app.services.message_service import message_service
+
+ALICE = 1
+BOB = 2
+GROUP = 1
+
+
+def populate(engine, rows: int):
+    models.Base.metadata.create_all(engine)
+    started = datetime.datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(models.User.__table__.insert(), [
+            {"id": user_id, "username": f"user{user_id}", "email": f"user{user_id}@example.com",
+             "hashed_password": "x", "is_active": True}
+            for user_id in range(1, rows + 3)
+        ])
+        connection.execute(models.Contact.__table__.insert(), [
+            {"user_id": ALICE, "friend_id": friend_id} for friend_id in range(2, rows + 2)
+        ])
+        connection.execute(models.Message.__table__.insert(), [
+            {"sender_id": ALICE if i % 2 else BOB, "receiver_id": BOB if i % 2 else ALICE,
+             "content": f"direct message number {i} with a bit of text", "timestamp": started + datetime.timedelta(seconds=i)}
+            for i in range(rows)
+        ])
+        connection.execute(models.Group.__table__.insert(), [{"id": GROUP, "name": "bench", "creator_id": ALICE}])
+        connection.execute(models.GroupMember.__table__.insert(), [
+            {"group_id": GROUP, "user_id": user_id, "role": "admin" if user_id == ALICE else "member",
+             "joined_at": started + datetime.timedelta(seconds=user_id)}
+            for user_id in range(1, rows + 1)
+        ])
+        connection.execute(models.GroupMessage.__table__.insert(), [
+            {"group_id": GROUP, "sender_id": i % rows + 1, "sender_username": f"user{i % rows + 1}",
+             "content": f"group message number {i} with a bit of text", "timestamp": started + datetime.timedelta(seconds=i)}
+            for i in range(rows)
+        ])
+
+
+def through_response_model(schema, objects) -> bytes:
+    adapter = TypeAdapter(List[schema])
+    content = adapter.dump_python(adapter.validate_python(objects, from_attributes=True), mode="json")
+    # What JSONResponse.render does with the serialized content.
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def cases(rows: int):
+    def orm_direct(db: Session):
+        objects = (
+            db.query(models.Message)
+            .filter(or_(
+                and_(models.Message.sender_id == ALICE, models.Message.receiver_id == BOB),
+                and_(models.Message.sender_id == BOB, models.Message.receiver_id == ALICE),
+            ))
+            .order_by(models.Message.timestamp.asc()).limit(rows).all()
+        )
+        return through_response_model(schemas.Message, objects)
+
+    def rows_direct(db: Session):
+        return message_rows.dumps(message_service.get_messages_between_users(db, user1_id=ALICE, user2_id=BOB, limit=rows))
+
+    def orm_group_messages(db: Session):
+        objects = db.query(models.GroupMessage).filter(models.GroupMessage.group_id == GROUP).order_by(models.GroupMessage.timestamp.asc()).limit(rows).all()
+        return through_response_model(schemas.GroupMessage, objects)
+
+    def rows_group_messages(db: Session):
+        return group_message_rows.dumps(db.execute(
+            select(
+                models.GroupMessage.content, models.GroupMessage.id, models.GroupMessage.group_id,
+                models.GroupMessage.sender_id, models.GroupMessage.timestamp, models.GroupMessage.sender_username,
+            ).where(models.GroupMessage.group_id == GROUP).order_by(models.GroupMessage.timestamp.asc()).limit(rows)
+        ).all())
+
+    def orm_members(db: Session):
+        objects = db.query(models.GroupMember).options(joinedload(models.GroupMember.user)).filter(models.GroupMember.group_id == GROUP).all()
+        return through_response_model(schemas.GroupMember, objects)
+
+    def rows_members(db: Session):
+        return member_rows.dumps(db.execute(
+            select(
+                models.GroupMember.user_id, models.GroupMember.role, models.GroupMember.id,
+                models.GroupMember.group_id, models.GroupMember.joined_at,
+                models.User.username, models.User.email, models.User.id, models.User.is_active,
+            ).join(models.User, models.User.id == models.GroupMember.user_id)
+            .where(models.GroupMember.group_id == GROUP).order_by(models.GroupMember.id)
+        ).all())
+
+    def orm_contacts(db: Session):
+        contacts = db.query(models.Contact).filter((models.Contact.user_id == ALICE) | (models.Contact.friend_id == ALICE)).all()
+        friend_ids = {contact.friend_id if contact.user_id == ALICE else contact.user_id for contact in contacts}
+        objects = db.query(models.User).filter(models.User.id.in_(list(friend_ids))).all()
+        return through_response_model(schemas.UserSearchResult, objects)
+
+    def rows_contacts(db: Session):
+        return contact_rows.dumps(contact_service.get_contacts(db, ALICE))
+
+    return {
+        "message_history": (orm_direct, rows_direct),
+        "group_messages": (orm_group_messages, rows_group_messages),
+        "group_members": (orm_members, rows_members),
+        "contacts": (orm_contacts, rows_contacts),
+    }
+
+
+def measure(engine, produce: Callable[[Session], bytes], rows: int, repeat: int) -> dict:
+    wall, cpu = [], []
+    body = b""
+    for _ in range(repeat):
+        # A fresh session each time so ORM objects are never reused from the identity map.
+        with Session(engine) as db:
+            wall_started, cpu_started = time.perf_counter(), time.process_time()
+            body = produce(db)
+            cpu.append(time.process_time() - cpu_started)
+            wall.append(time.perf_counter() - wall_started)
+    with Session(engine) as db:
+        tracemalloc.start()
+        produce(db)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    wall.sort()
+    cpu.sort()
+    return {
+        "wall_ms": round(wall[len(wall) // 2] * 1000, 2),
+        "cpu_ms": round(cpu[len(cpu) // 2] * 1000, 2),
+        "cpu_us_per_row": round(cpu[len(cpu) // 2] * 1e6 / rows, 2),
+        "peak_mib": round(peak / 2 ** 20, 2),
+        "peak_bytes_per_row": peak // rows,
+        "response_bytes": len(body),
+        "_body": body,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = {"rows": args.rows}
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        populate(engine, args.rows)
+        for name, (orm_path, rows_path) in cases(args.rows).items():
+            orm = measure(engine, orm_path, args.rows, args.repeat)
+            rows = measure(engine, rows_path, args.rows, args.repeat)
+            assert json.loads(orm.pop("_body")) == json.loads(rows.pop("_body")), f"{name}: responses differ"
+            results[name] = {
+                "orm": orm,
+                "rows": rows,
+                "cpu_speedup": round(orm["cpu_ms"] / max(rows["cpu_ms"], 1e-6), 1),
+                "peak_memory_ratio": round(orm["peak_mib"] / max(rows["peak_mib"], 1e-6), 1),
+            }
+        engine.dispose()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
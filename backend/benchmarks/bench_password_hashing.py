@@ -0,0 +1,66 @@
+"""
+Measure login throughput of the password hashing pool.
+
+    python -m benchmarks.bench_password_hashing --workers 1 2 4 --logins 200
+
+For each worker count, verifies `--logins` passwords concurrently through
+PasswordHasher and reports logins/sec overall and per worker process, plus
+the event loop's worst stall while the pool was busy. Prints one JSON document.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from app.services.password_hasher import PasswordHasher, _hash
+
+
+async def watch_loop(stop: asyncio.Event, interval: float = 0.005) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def run(workers: int, logins: int, rounds: int, hashed: str) -> dict:
+    hasher = PasswordHasher(workers=workers, max_pending=logins, rounds=rounds, retry_after=1)
+    hasher.start()
+    # Warm every worker up so process start-up is not measured.
+    await asyncio.gather(*(hasher.verify_and_update("password", hashed) for _ in range(max(workers, 1))))
+
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(watch_loop(stop))
+    started = time.perf_counter()
+    results = await asyncio.gather(*(hasher.verify_and_update("password", hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    worst_stall = await watcher
+    hasher.stop()
+
+    assert all(verified for verified, _ in results)
+    per_second = logins / elapsed
+    return {
+        "workers": workers,
+        "logins_per_sec": round(per_second, 1),
+        "logins_per_sec_per_worker": round(per_second / max(workers, 1), 1),
+        "worst_loop_stall_ms": round(worst_stall * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=12)
+    args = parser.parse_args()
+
+    hashed = _hash("password", args.rounds)
+    results = [asyncio.run(run(workers, args.logins, args.rounds, hashed)) for workers in args.workers]
+    print(json.dumps({"cpu_count": os.cpu_count(), "bcrypt_rounds": args.rounds, "runs": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
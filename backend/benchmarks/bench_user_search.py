@@ -0,0 +1,101 @@
+"""
+Compare contact search backed by the in-memory trigram index against the
+previous `username LIKE '%query%'` scan.
+
+    python -m benchmarks.bench_user_search --users 1000000
+
+Builds a throwaway SQLite database with synthetic usernames, then times both
+paths for a mix of short, medium and long queries. Prints one JSON document.
+"""
+import argparse
+import json
+import os
+import random
+import string
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app.db import models
+from app.services.user_search_index import UserSearchIndex
+
+QUERIES = ["a", "jo", "ann", "smith", "x7q", "maria_9", "zzzzzz"]
+FIRST_NAMES = ["john", "maria", "ann", "li", "omar", "sofia", "chen", "ivan", "amara", "lucas", "noah", "emma"]
+LAST_NAMES = ["smith", "garcia", "okafor", "kim", "novak", "silva", "khan", "jones", "ito", "muller"]
+
+
+def make_usernames(count: int, seed: int):
+    rng = random.Random(seed)
+    seen = set()
+    while len(seen) < count:
+        style = rng.random()
+        if style < 0.6:
+            name = f"{rng.choice(FIRST_NAMES)}_{rng.choice(LAST_NAMES)}{rng.randint(0, 9999)}"
+        elif style < 0.9:
+            name = f"{rng.choice(FIRST_NAMES)}{rng.randint(0, 99999)}"
+        else:
+            name = "".join(rng.choices(string.ascii_lowercase + string.digits, k=rng.randint(5, 14)))
+        seen.add(name)
+    return list(seen)
+
+
+def time_call(fn, repeat: int):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        models.Base.metadata.create_all(engine, tables=[models.User.__table__])
+        usernames = make_usernames(args.users, args.seed)
+        with engine.begin() as connection:
+            connection.execute(
+                models.User.__table__.insert(),
+                [{"username": name, "hashed_password": "x", "is_active": True} for name in usernames],
+            )
+
+        exclude_ids = set(range(1, 51))
+        index = UserSearchIndex()
+        started = time.perf_counter()
+        with Session(engine) as db:
+            index.ensure_loaded(db)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        results = []
+        with engine.connect() as connection:
+            for query in QUERIES:
+                like_stmt = select(models.User.id, models.User.username).where(
+                    models.User.username.contains(query), ~models.User.id.in_(exclude_ids)
+                )
+                like_ms, like_rows = time_call(lambda: connection.execute(like_stmt).all(), args.repeat)
+                index_ms, index_rows = time_call(lambda: index.search(query, exclude_ids, args.limit), args.repeat)
+                results.append({
+                    "query": query,
+                    "like_scan_ms": round(like_ms, 3),
+                    "like_scan_matches": len(like_rows),
+                    "index_ms": round(index_ms, 3),
+                    "index_results": len(index_rows),
+                    "speedup": round(like_ms / index_ms, 1) if index_ms else None,
+                })
+
+    print(json.dumps({"users": args.users, "index_build_ms": round(build_ms, 1), "queries": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Compare the signaling wire codecs on typical call traffic.
+
+    python -m benchmarks.bench_wire_codec --iterations 20000
+
+Encodes and decodes representative call_offer, call_answer and candidate
+frames with every available codec and reports bytes on the wire plus the
+per-frame encode/decode cost. Prints one JSON document.
+"""
+import argparse
+import json
+import random
+import string
+import time
+
+from app.services.wire_codec import CODECS
+
+
+def random_token(rng: random.Random, length: int) -> str:
+    return "".join(rng.choices(string.ascii_letters + string.digits + "+/", k=length))
+
+
+def make_sdp(rng: random.Random, kind: str) -> str:
+    fingerprint = ":".join(f"{rng.randrange(256):02X}" for _ in range(32))
+    lines = [
+        "v=0",
+        f"o=- {rng.randrange(10**18)} 2 IN IP4 127.0.0.1",
+        "s=-",
+        "t=0 0",
+        "a=group:BUNDLE 0 1",
+        "a=extmap-allow-mixed",
+        "a=msid-semantic: WMS",
+    ]
+    for mid, media in enumerate(("audio", "video")):
+        payloads = [111, 63, 9, 0, 8, 13, 110, 126] if media == "audio" else [96, 97, 98, 99, 100, 101, 35, 36, 102, 103, 104, 105, 106, 107, 108, 109, 127, 125, 39, 40, 45, 46, 116, 117, 118]
+        lines += [
+            f"m={media} 9 UDP/TLS/RTP/SAVPF {' '.join(map(str, payloads))}",
+            "c=IN IP4 0.0.0.0",
+            "a=rtcp:9 IN IP4 0.0.0.0",
+            f"a=ice-ufrag:{random_token(rng, 4)}",
+            f"a=ice-pwd:{random_token(rng, 24)}",
+            "a=ice-options:trickle",
+            f"a=fingerprint:sha-256 {fingerprint}",
+            f"a=setup:{'actpass' if kind == 'offer' else 'active'}",
+            f"a=mid:{mid}",
+            "a=sendrecv",
+            f"a=msid:- {random_token(rng, 36)}",
+            "a=rtcp-mux",
+        ]
+        for payload in payloads:
+            codec = "opus/48000/2" if media == "audio" else "VP8/90000"
+            lines.append(f"a=rtpmap:{payload} {codec}")
+            lines.append(f"a=rtcp-fb:{payload} transport-cc")
+            if media == "video":
+                lines.append(f"a=rtcp-fb:{payload} nack pli")
+                lines.append(f"a=fmtp:{payload} level-asymmetry-allowed=1;packetization-mode=1;profile-level-id=42e01f")
+        lines.append(f"a=ssrc:{rng.randrange(2**32)} cname:{random_token(rng, 16)}")
+    return "\r\n".join(lines) + "\r\n"
+
+
+def make_frames(rng: random.Random) -> dict:
+    candidate = (
+        f"candidate:{rng.randrange(2**32)} 1 udp 2122260223 192.168.{rng.randrange(256)}.{rng.randrange(256)} "
+        f"{rng.randrange(1024, 65535)} typ host generation 0 ufrag {random_token(rng, 4)} network-id 1"
+    )
+    return {
+        "call_offer": {"type": "call_offer", "from_user_id": 17, "to": 42, "sender_username": "alice",
+                       "isVideo": True, "offer": {"type": "offer", "sdp": make_sdp(rng, "offer")}},
+        "call_answer": {"type": "call_answer", "from_user_id": 42, "to": 17, "sender_username": "bob",
+                        "answer": {"type": "answer", "sdp": make_sdp(rng, "answer")}},
+        "candidate": {"type": "candidate", "from_user_id": 17, "to": 42, "sender_username": "alice",
+                      "candidate": {"candidate": candidate, "sdpMid": "0", "sdpMLineIndex": 0}},
+    }
+
+
+def per_call_us(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    frames = make_frames(random.Random(args.seed))
+    results = []
+    for frame_name, message in frames.items():
+        baseline = None
+        for codec in CODECS.values():
+            payload = codec.encode(message)
+            size = len(payload.encode() if isinstance(payload, str) else payload)
+            baseline = baseline or size
+            results.append({
+                "frame": frame_name,
+                "codec": codec.name,
+                "bytes": size,
+                "ratio_vs_json": round(size / baseline, 3),
+                "encode_us": round(per_call_us(lambda: codec.encode(message), args.iterations), 2),
+                "decode_us": round(per_call_us(lambda: codec.decode(payload), args.iterations), 2),
+            })
+    print(json.dumps({"iterations": args.iterations, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Measure how long a reconnect storm takes to settle.
+
+    python -m benchmarks.connect_storm --clients 10000
+    python -m benchmarks.connect_storm --clients 10000 --max-in-progress 0 64
+
+For each --max-in-progress value (0 turns the admission gate off), starts a
+fresh server, signs every client up, then has them all connect to
+/ws/{user_id} with their token at the same moment, the way a fleet does
+after a restart. A client counts as connected
+once its ping is answered, because the server reads frames only after the
+handshake work is done. Clients turned away with close code 1013 wait the
+suggested retryAfter with the same jitter as the web client, i.e. between 1x
+and 2x; other failures back off exponentially with full jitter.
+
+Reports time until every client was connected, per-client time to
+connected (p50/p99), connect attempts and rejections. Prints one JSON
+document. 10k clients need `ulimit -n` above 10k.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List
+
+import httpx
+import websockets
+
+from benchmarks.ws_load import LocalServer, percentile
+
+TRY_AGAIN_LATER = 1013
+MAX_BACKOFF_S = 30.0
+
+
+class StormClient:
+    def __init__(self, index: int, ws_url: str, counters: Dict[str, int]):
+        self.username = f"storm_{index}"
+        self.ws_url = ws_url
+        self.counters = counters
+        self.user_id = None
+        self.token = None
+        self.ws = None
+
+    async def sign_up(self, client: httpx.AsyncClient):
+        await client.post("/auth/register", json={"username": self.username, "password": "storm-password"})
+        response = await client.post("/auth/token", data={"username": self.username, "password": "storm-password"})
+        response.raise_for_status()
+        body = response.json()
+        self.user_id = body["user_id"]
+        self.token = body["access_token"]
+
+    async def connect(self) -> float:
+        """Keep trying until admitted; returns seconds from the first attempt"""
+        started = time.perf_counter()
+        failures = 0
+        while True:
+            self.counters["attempts"] += 1
+            try:
+                self.ws = await websockets.connect(f"{self.ws_url}/ws/{self.user_id}?token={self.token}", open_timeout=120, max_size=None)
+                await self.ws.send(json.dumps({"type": "ping"}))
+                while json.loads(await self.ws.recv()).get("type") != "pong":
+                    pass
+                return time.perf_counter() - started
+            except websockets.ConnectionClosed as closed:
+                if closed.rcvd is not None and closed.rcvd.code == TRY_AGAIN_LATER:
+                    self.counters["rejected"] += 1
+                    retry_after = json.loads(closed.rcvd.reason or "{}").get("retryAfter", 1)
+                    await asyncio.sleep(retry_after * (1 + random.random()))
+                    continue
+                self.counters["closed"] += 1
+            except (OSError, asyncio.TimeoutError, websockets.InvalidHandshake):
+                self.counters["failed"] += 1
+            failures += 1
+            await asyncio.sleep(random.random() * min(MAX_BACKOFF_S, 2 ** failures))
+
+
+async def storm(clients: int, max_in_progress: int, max_wait: float) -> dict:
+    server = LocalServer(env={
+        "ADMISSION_MAX_IN_PROGRESS": str(max_in_progress),
+        "ADMISSION_MAX_WAIT_S": str(max_wait),
+        "HEARTBEAT_INTERVAL_S": "600",
+    })
+    await server.start()
+    counters = {"attempts": 0, "rejected": 0, "closed": 0, "failed": 0}
+    storm_clients = [StormClient(index, server.url.replace("http", "ws", 1), counters) for index in range(clients)]
+    try:
+        async with httpx.AsyncClient(base_url=server.url, timeout=60) as client:
+            signing_up = asyncio.Semaphore(50)
+
+            async def sign_up(storm_client: StormClient):
+                async with signing_up:
+                    await storm_client.sign_up(client)
+
+            await asyncio.gather(*(sign_up(storm_client) for storm_client in storm_clients))
+        started = time.perf_counter()
+        times: List[float] = await asyncio.gather(*(client.connect() for client in storm_clients))
+        all_connected = time.perf_counter() - started
+    finally:
+        await asyncio.gather(*(client.ws.close() for client in storm_clients if client.ws), return_exceptions=True)
+        server.stop()
+    return {
+        "max_in_progress": max_in_progress,
+        "clients": clients,
+        "time_to_all_connected_s": round(all_connected, 2),
+        "time_to_connected_p50_s": percentile(times, 50),
+        "time_to_connected_p99_s": percentile(times, 99),
+        **counters,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=10_000)
+    parser.add_argument("--max-in-progress", type=int, nargs="+", default=[0, 64])
+    parser.add_argument("--max-wait", type=float, default=5, help="ADMISSION_MAX_WAIT_S for the server")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    results = [asyncio.run(storm(args.clients, value, args.max_wait)) for value in args.max_in_progress]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Run headless aiortc peers through an SFU room and check media flows.
+
+    python -m benchmarks.sfu_peers --peers 4 --seconds 5
+
+Each peer publishes one synthetic video track with a single upstream peer
+connection; signaling (including the server's renegotiation offers) is wired
+straight to SfuRoom instead of going over the WebSocket. Reports, per peer,
+how many remote tracks arrived and how many frames were received, next to the
+number of upstream streams a full mesh would have needed. Prints one JSON
+document and exits non-zero if any peer misses a track.
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+from aiortc import RTCPeerConnection, RTCSessionDescription
+from aiortc.mediastreams import MediaStreamError, VideoStreamTrack
+
+from app.services.sfu import SfuRoom
+
+
+class HeadlessPeer:
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.pc = RTCPeerConnection()
+        self.pc.addTrack(VideoStreamTrack())
+        self.tracks = 0
+        self.frames = 0
+        self._readers = []
+
+        @self.pc.on("track")
+        def on_track(track):
+            self.tracks += 1
+            self._readers.append(asyncio.ensure_future(self._read(track)))
+
+    async def _read(self, track):
+        try:
+            while True:
+                await track.recv()
+                self.frames += 1
+        except MediaStreamError:
+            pass
+
+    async def close(self):
+        for reader in self._readers:
+            reader.cancel()
+        await self.pc.close()
+
+
+async def run(peer_count: int, seconds: float) -> dict:
+    peers = {}
+
+    async def send(message: dict, user_id: int):
+        # Stands in for the WebSocket: apply the server's answer, or answer
+        # its renegotiation offer like a browser would.
+        peer = peers[user_id]
+        await peer.pc.setRemoteDescription(RTCSessionDescription(**message["sdp"]))
+        if message["type"] == "group-call-answer":
+            return
+        await peer.pc.setLocalDescription(await peer.pc.createAnswer())
+        answer = peer.pc.localDescription
+        await room.handle_answer(user_id, {"type": answer.type, "sdp": answer.sdp})
+
+    room = SfuRoom(group_id=1, send=send)
+    for user_id in range(1, peer_count + 1):
+        peer = peers[user_id] = HeadlessPeer(user_id)
+        await peer.pc.setLocalDescription(await peer.pc.createOffer())
+        offer = peer.pc.localDescription
+        await room.handle_offer(user_id, {"type": offer.type, "sdp": offer.sdp})
+
+    await asyncio.sleep(seconds)
+    result = {
+        "peers": peer_count,
+        "seconds": seconds,
+        "upstreams_per_peer": {"sfu": 1, "mesh": peer_count - 1},
+        "received": {
+            str(user_id): {"tracks": peer.tracks, "frames": peer.frames} for user_id, peer in peers.items()
+        },
+    }
+    await room.close()
+    for peer in peers.values():
+        await peer.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--peers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.peers, args.seconds))
+    print(json.dumps(result, indent=2))
+    expected = args.peers - 1
+    if any(stats["tracks"] < expected or stats["frames"] == 0 for stats in result["received"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
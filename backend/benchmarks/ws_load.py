@@ -0,0 +1,345 @@
+"""
+Drive many simulated users through the signaling server and measure it.
+
+    python -m benchmarks.ws_load --users 1000 --group-size 8 --seconds 30
+    python -m benchmarks.ws_load --url http://127.0.0.1:8000 --users 200
+
+Without --url a server is started with uvicorn in a scratch directory (its
+own SQLite file, BCRYPT_ROUNDS=4 so sign-up is not the bottleneck) and
+stopped afterwards. Every user registers, logs in and connects to
+/ws/{user_id}. Then, for --seconds:
+
+- users are paired for 1:1 calls: the caller sends call_offer, the callee
+  answers with call_answer, and both send a candidate;
+- users are put into groups of --group-size that start a group call, join
+  it, exchange targeted group-call-offer/answer frames, and keep leaving
+  and rejoining;
+- everyone sends chat_message frames to their partner.
+
+Each frame carries its send time, so the receiving side can record the
+relay latency for each frame type. Ping round trips on idle sockets stand
+in for server event-loop lag. The server's resident memory is sampled
+before and after connecting (only for a server started here).
+
+Prints one JSON document; compare runs by diffing them. Thousands of
+sockets need a matching `ulimit -n`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+import websockets
+
+# Shaped like the RTCSessionDescription objects browsers send.
+OFFER = {"type": "offer", "sdp": "v=0\r\no=- 0 0 IN IP4 127.0.0.1\r\ns=load\r\n"}
+ANSWER = {"type": "answer", "sdp": "v=0\r\no=- 0 0 IN IP4 127.0.0.1\r\ns=load\r\n"}
+
+
+
+def percentile(samples: List[float], pct: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))], 3)
+
+
+def summarize(samples: List[float]) -> dict:
+    return {"count": len(samples), "p50_ms": percentile(samples, 50), "p99_ms": percentile(samples, 99), "max_ms": percentile(samples, 100)}
+
+
+def now_ms() -> float:
+    return time.perf_counter() * 1000
+
+
+def rss_kb(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+class LocalServer:
+    """uvicorn serving app.main:app from a scratch directory"""
+
+    def __init__(self, env: Optional[Dict[str, str]] = None):
+        self.env = env or {}
+        self.workdir = tempfile.TemporaryDirectory(prefix="ws_load_")
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            self.port = probe.getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.process: Optional[subprocess.Popen] = None
+
+    async def start(self):
+        env = dict(
+            os.environ,
+            PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            SECRET_KEY=os.environ.get("SECRET_KEY", "ws-load"),
+            BCRYPT_ROUNDS="4",
+            PASSWORD_HASH_WORKERS="0",
+            **self.env,
+        )
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(self.port),
+             "--log-level", "warning", "--ws-max-size", "16777216"],
+            cwd=self.workdir.name, env=env,
+        )
+        async with httpx.AsyncClient() as client:
+            for _ in range(200):
+                try:
+                    await client.get(self.url + "/")
+                    return
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+        raise RuntimeError("server did not come up")
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait(timeout=10)
+        self.workdir.cleanup()
+
+
+class SimUser:
+    def __init__(self, index: int, run: "LoadRun"):
+        self.index = index
+        self.run = run
+        self.username = f"load_{run.tag}_{index}"
+        self.user_id: Optional[int] = None
+        self.token: Optional[str] = None
+        self.headers: Dict[str, str] = {}
+        self.ws = None
+        self.partner: Optional["SimUser"] = None
+        self.group_id: Optional[int] = None
+        self.ping_sent: Optional[float] = None
+
+    async def sign_up(self, client: httpx.AsyncClient):
+        await client.post("/auth/register", json={"username": self.username, "password": "load-password"})
+        response = await client.post("/auth/token", data={"username": self.username, "password": "load-password"})
+        response.raise_for_status()
+        body = response.json()
+        self.user_id = body["user_id"]
+        self.token = body["access_token"]
+        self.headers = {"Authorization": f"Bearer {self.token}"}
+
+    async def connect(self, ws_url: str):
+        started = now_ms()
+        self.ws = await websockets.connect(f"{ws_url}/ws/{self.user_id}?token={self.token}", max_size=None, open_timeout=60)
+        self.run.connect_ms.append(now_ms() - started)
+
+    async def send(self, message: dict):
+        message["sentAt"] = now_ms()
+        try:
+            await self.ws.send(json.dumps(message))
+            self.run.frames_sent += 1
+        except websockets.ConnectionClosed:
+            self.run.errors["send_on_closed"] += 1
+
+    async def receive_loop(self):
+        try:
+            async for raw in self.ws:
+                received = now_ms()
+                self.run.frames_received += 1
+                message = json.loads(raw)
+                msg_type = message.get("type")
+                if "sentAt" in message:
+                    self.run.latency[msg_type].append(received - message["sentAt"])
+                if msg_type == "ping":
+                    await self.ws.send(json.dumps({"type": "pong"}))
+                elif msg_type == "pong" and self.ping_sent is not None:
+                    self.run.ping_rtt.append(received - self.ping_sent)
+                    self.ping_sent = None
+                elif msg_type == "call_offer":
+                    await self.send({"type": "call_answer", "to": message["from"], "sdp": ANSWER})
+                    await self.send({"type": "candidate", "to": message["from"], "candidate": {"candidate": "load"}})
+                elif msg_type == "group-call-offer" and message.get("targetUserId") == self.user_id:
+                    await self.send({"type": "group-call-answer", "groupId": self.group_id,
+                                     "targetUserId": message["userId"], "sdp": ANSWER})
+                elif msg_type == "error":
+                    self.run.errors[f"server_error: {message.get('detail')}"] += 1
+        except websockets.ConnectionClosed as closed:
+            if not self.run.stopping:
+                code = closed.rcvd.code if closed.rcvd is not None else None
+                self.run.errors[f"closed_by_server: {code}"] += 1
+
+    async def ping(self):
+        if self.ping_sent is None:
+            self.ping_sent = now_ms()
+            await self.ws.send(json.dumps({"type": "ping"}))
+
+
+class LoadRun:
+    def __init__(self, args):
+        self.args = args
+        self.tag = f"{int(time.time())}{random.randint(0, 999)}"
+        self.users = [SimUser(index, self) for index in range(args.users)]
+        self.connect_ms: List[float] = []
+        self.latency: Dict[str, List[float]] = defaultdict(list)
+        self.ping_rtt: List[float] = []
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.frames_sent = 0
+        self.frames_received = 0
+        self.stopping = False
+        self.loop_lag_ms: List[float] = []
+
+    async def bounded(self, coros, limit: int):
+        semaphore = asyncio.Semaphore(limit)
+
+        async def one(coro):
+            async with semaphore:
+                return await coro
+        return await asyncio.gather(*(one(coro) for coro in coros))
+
+    async def set_up(self, base_url: str):
+        async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+            started = time.perf_counter()
+            await self.bounded([user.sign_up(client) for user in self.users], self.args.concurrency)
+            self.sign_up_seconds = time.perf_counter() - started
+
+            for first in range(0, len(self.users) - 1, 2):
+                self.users[first].partner = self.users[first + 1]
+                self.users[first + 1].partner = self.users[first]
+
+            self.groups: List[List[SimUser]] = []
+            size = self.args.group_size
+            for start in range(0, len(self.users) - size + 1, size):
+                members = self.users[start:start + size]
+                creator = members[0]
+                group = (await client.post("/groups/", json={"name": f"load {start}"}, headers=creator.headers)).json()
+                await self.bounded([
+                    client.post(f"/groups/{group['id']}/members", json={"user_id": member.user_id}, headers=creator.headers)
+                    for member in members[1:]
+                ], self.args.concurrency)
+                for member in members:
+                    member.group_id = group["id"]
+                self.groups.append(members)
+
+    async def watch_loop(self):
+        while not self.stopping:
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            self.loop_lag_ms.append((time.perf_counter() - started - 0.01) * 1000)
+
+    async def direct_calls(self, caller: SimUser):
+        while not self.stopping:
+            await caller.send({"type": "call_offer", "to": caller.partner.user_id, "sdp": OFFER})
+            await caller.send({"type": "chat_message", "to": caller.partner.user_id, "content": "load"})
+            await asyncio.sleep(self.args.interval * random.uniform(0.5, 1.5))
+
+    async def group_call(self, members: List[SimUser]):
+        group_id = members[0].group_id
+        await members[0].send({"type": "group-call-start", "groupId": group_id, "groupName": "load"})
+        for member in members[1:]:
+            await member.send({"type": "group-call-join", "groupId": group_id})
+        while not self.stopping:
+            # A random participant renegotiates with everyone, then one leaves and comes back.
+            sender = random.choice(members)
+            for member in members:
+                if member is not sender:
+                    await sender.send({"type": "group-call-offer", "groupId": group_id,
+                                       "targetUserId": member.user_id, "sdp": OFFER})
+            await asyncio.sleep(self.args.interval * random.uniform(0.5, 1.5))
+            leaver = random.choice(members[1:])
+            await leaver.send({"type": "group-call-leave", "groupId": group_id})
+            await leaver.send({"type": "group-call-join", "groupId": group_id})
+
+    async def pings(self):
+        while not self.stopping:
+            for user in random.sample(self.users, min(20, len(self.users))):
+                await user.ping()
+            await asyncio.sleep(0.5)
+
+    async def drive(self, base_url: str, server: Optional[LocalServer]) -> dict:
+        await self.set_up(base_url)
+        ws_url = base_url.replace("http", "ws", 1)
+        rss_before = rss_kb(server.process.pid) if server else None
+
+        started = time.perf_counter()
+        await self.bounded([user.connect(ws_url) for user in self.users], self.args.concurrency)
+        connect_seconds = time.perf_counter() - started
+        rss_after = rss_kb(server.process.pid) if server else None
+        readers = [asyncio.create_task(user.receive_loop()) for user in self.users]
+
+        watcher = asyncio.create_task(self.watch_loop())
+        drivers = [asyncio.create_task(self.direct_calls(user)) for user in self.users[0::2] if user.partner]
+        drivers += [asyncio.create_task(self.group_call(members)) for members in self.groups]
+        drivers.append(asyncio.create_task(self.pings()))
+        sent_before, received_before = self.frames_sent, self.frames_received
+        await asyncio.sleep(self.args.seconds)
+        sent = self.frames_sent - sent_before
+        received = self.frames_received - received_before
+
+        self.stopping = True
+        for task in drivers:
+            task.cancel()
+        await asyncio.gather(*drivers, watcher, return_exceptions=True)
+        await asyncio.gather(*(user.ws.close() for user in self.users), return_exceptions=True)
+        await asyncio.gather(*readers, return_exceptions=True)
+
+        per_connection_kb = None
+        if rss_before is not None and rss_after is not None:
+            per_connection_kb = round((rss_after - rss_before) / len(self.users), 1)
+        return {
+            "users": len(self.users),
+            "groups": len(self.groups),
+            "group_size": self.args.group_size,
+            "seconds": self.args.seconds,
+            "sign_up_seconds": round(self.sign_up_seconds, 2),
+            "connect_seconds": round(connect_seconds, 2),
+            "connect": summarize(self.connect_ms),
+            "frames_sent_per_sec": round(sent / self.args.seconds, 1),
+            "frames_received_per_sec": round(received / self.args.seconds, 1),
+            "relay_latency": {msg_type: summarize(samples) for msg_type, samples in sorted(self.latency.items())},
+            "server_ping_rtt": summarize(self.ping_rtt),
+            "server_rss_kb": {"before_connect": rss_before, "after_connect": rss_after},
+            "server_memory_per_connection_kb": per_connection_kb,
+            "client_loop_lag": summarize(self.loop_lag_ms),
+            "errors": dict(self.errors),
+        }
+
+
+async def main_async(args) -> dict:
+    server = None
+    base_url = args.url
+    if base_url is None:
+        server = LocalServer()
+        await server.start()
+        base_url = server.url
+    try:
+        return await LoadRun(args).drive(base_url.rstrip("/"), server)
+    finally:
+        if server is not None:
+            server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="an already running server; by default one is started here")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--group-size", type=int, default=6)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--interval", type=float, default=1.0, help="mean seconds between each pair's/group's rounds")
+    parser.add_argument("--concurrency", type=int, default=50, help="parallel sign-ups and connects")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
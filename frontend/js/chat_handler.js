@@ -607,45 +607,63 @@ async function loadGroupDetailsForSettings(groupId) {
         const groupDetails = await response.json();
 
         if (updateGroupNameInput) updateGroupNameInput.value = groupDetails.name;
-        if (groupMemberCount) groupMemberCount.textContent = groupDetails.members.length;
-
-        const currentUserId = parseInt(localStorage.getItem('userId'));
-        currentUserRoleInGroup = 'member';
+        if (groupMemberCount) groupMemberCount.textContent = groupDetails.member_count;
+        currentUserRoleInGroup = groupDetails.current_user_role;
 
         if (groupMemberListUl) {
             groupMemberListUl.innerHTML = '';
-            groupDetails.members.forEach(member => {
-                if (member.user_id === currentUserId) {
-                    currentUserRoleInGroup = member.role;
-                }
-                const li = document.createElement('li');
-                const memberName = member.user ? member.user.username : `User ID: ${member.user_id}`;
-                li.innerHTML = `
-                    <span class="member-info">${memberName} (${member.role})</span>
-                    <span class="member-actions">
-                        ${currentUserRoleInGroup === 'admin' && member.user_id !== currentUserId ?
-                        `<button class="change-role-btn admin-only-group" data-user-id="${member.user_id}" data-username="${memberName}" data-current-role="${member.role}">Change Role</button> 
-                             <button class="remove-member-btn admin-only-group" data-user-id="${member.user_id}" data-username="${memberName}">Remove</button>` : ''}
-                        ${member.user_id === currentUserId && groupDetails.members.length > 1 && !(currentUserRoleInGroup === 'admin' && groupDetails.members.filter(m => m.role === 'admin').length === 1) ?
-                        '' : ''} 
-                    </span>
-                `;
-                groupMemberListUl.appendChild(li);
-            });
+            renderGroupMembers(groupId, groupDetails.members, groupDetails.members_next_cursor);
         }
         updateAdminOnlyElementsVisibility();
-        document.querySelectorAll('.change-role-btn').forEach(button => {
-            button.addEventListener('click', handleChangeRoleClick);
-        });
-        document.querySelectorAll('.remove-member-btn').forEach(button => {
-            button.addEventListener('click', handleRemoveMemberClick);
-        });
 
     } catch (error) {
         if (groupMemberListUl) groupMemberListUl.innerHTML = '<li>Error loading members.</li>';
     }
 }
 
+// Group details carry only the first page of members; further pages are
+// fetched when the user asks for them.
+function renderGroupMembers(groupId, members, nextCursor) {
+    const currentUserId = parseInt(localStorage.getItem('userId'));
+    members.forEach(member => {
+        const li = document.createElement('li');
+        const memberName = member.user ? member.user.username : `User ID: ${member.user_id}`;
+        li.innerHTML = `
+            <span class="member-info">${memberName} (${member.role})</span>
+            <span class="member-actions">
+                ${currentUserRoleInGroup === 'admin' && member.user_id !== currentUserId ?
+                `<button class="change-role-btn admin-only-group" data-user-id="${member.user_id}" data-username="${memberName}" data-current-role="${member.role}">Change Role</button> 
+                     <button class="remove-member-btn admin-only-group" data-user-id="${member.user_id}" data-username="${memberName}">Remove</button>` : ''}
+            </span>
+        `;
+        li.querySelector('.change-role-btn')?.addEventListener('click', handleChangeRoleClick);
+        li.querySelector('.remove-member-btn')?.addEventListener('click', handleRemoveMemberClick);
+        groupMemberListUl.appendChild(li);
+    });
+
+    if (!nextCursor) return;
+    const moreLi = document.createElement('li');
+    const moreButton = document.createElement('button');
+    moreButton.textContent = 'Show more members';
+    moreButton.addEventListener('click', async () => {
+        moreButton.disabled = true;
+        try {
+            const response = await fetch(`${API_BASE_URL}/groups/${groupId}/members/page?cursor=${encodeURIComponent(nextCursor)}`, {
+                headers: { 'Authorization': `Bearer ${token}` }
+            });
+            if (!response.ok) throw new Error(`Failed to fetch group members: ${response.statusText}`);
+            const page = await response.json();
+            moreLi.remove();
+            renderGroupMembers(groupId, page.items, page.next_cursor);
+        } catch (error) {
+            moreButton.disabled = false;
+            showNotification('Error loading more members.', 'error');
+        }
+    });
+    moreLi.appendChild(moreButton);
+    groupMemberListUl.appendChild(moreLi);
+}
+
 function updateAdminOnlyElementsVisibility() {
     const isAdmin = currentUserRoleInGroup === 'admin';
     document.querySelectorAll('.admin-only-group').forEach(el => {
@@ -858,8 +876,7 @@ if (leaveGroupButton) {
                 });
                 if (!groupDetailsResponse.ok) throw new Error('Could not verify admin status before leaving.');
                 const groupDetails = await groupDetailsResponse.json();
-                const admins = groupDetails.members.filter(m => m.role === 'admin');
-                if (admins.length === 1 && admins[0].user_id == currentUserId) {
+                if (groupDetails.current_user_role === 'admin' && groupDetails.admin_count === 1) {
                     showNotification('You are the only admin. Please make someone else an admin before leaving, or delete the group.', 'info');
                     return;
                 }
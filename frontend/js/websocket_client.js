@@ -1,7 +1,17 @@
 let socket;
 let currentUserId;
+let receiveChain = Promise.resolve();
+let reconnectAttempts = 0;
+let reconnectTimer = null;
+let closedByUser = false;
+// 1013 "Try Again Later": the server is busy and its close reason says when to come back.
+const TRY_AGAIN_LATER = 1013;
+// Bad user id or token; reconnecting cannot help.
+const NO_RECONNECT_CODES = new Set([4001, 4003]);
+const MAX_BACKOFF_MS = 30000;
 const WS_BASE_URL = 'wss://192.168.43.122:8000';
 import { displayMessage } from "./chat_handler.js";
+import { decodeFrame, setNegotiatedCodec, supportedCodecs } from "./wire_codec.js";
 import {
     handleIncomingCallOffer,
     handleCallAnswer,
@@ -17,18 +27,59 @@ import {
     handleGroupCallStart
 } from './call_handler.js';
 
+// Ids of the newest direct and group messages seen, so a reconnect only
+// receives what was missed while offline.
+function lastSeenKey(kind) {
+    return `${kind === 'group' ? 'lastGroupMessageId' : 'lastMessageId'}:${currentUserId}`;
+}
+
+function getLastSeen(kind) {
+    const value = localStorage.getItem(lastSeenKey(kind));
+    return value === null ? null : parseInt(value);
+}
+
+function rememberSeen(kind, messageId) {
+    if (typeof messageId === 'number' && messageId > (getLastSeen(kind) ?? 0)) {
+        localStorage.setItem(lastSeenKey(kind), String(messageId));
+    }
+}
+
+function reconnectDelay(event) {
+    if (event.code === TRY_AGAIN_LATER) {
+        try {
+            const { retryAfter } = JSON.parse(event.reason);
+            // Clients told the same delay spread over [retryAfter, 2 * retryAfter).
+            if (retryAfter > 0) return retryAfter * 1000 * (1 + Math.random());
+        } catch (error) {
+            // No usable hint; fall back to the backoff below.
+        }
+    }
+    // Exponential backoff with full jitter.
+    return Math.random() * Math.min(MAX_BACKOFF_MS, 1000 * 2 ** reconnectAttempts);
+}
+
 export function initWebSocket(userId) {
     currentUserId = userId;
-    if (!userId) {
+    closedByUser = false;
+    // The server only accepts sockets that carry the user's access token.
+    const token = localStorage.getItem('accessToken');
+    if (!userId || !token) {
         return;
     }
 
     if (socket && socket.readyState === WebSocket.OPEN) {
         return;
     }
-    socket = new WebSocket(`${WS_BASE_URL}/ws/${userId}`);
+    const params = new URLSearchParams();
+    params.set('token', token);
+    // First connect on this device: start tracking from here, history comes over REST.
+    params.set('lastMessageId', getLastSeen('direct') ?? Number.MAX_SAFE_INTEGER);
+    params.set('lastGroupMessageId', getLastSeen('group') ?? Number.MAX_SAFE_INTEGER);
+    socket = new WebSocket(`${WS_BASE_URL}/ws/${userId}?${params}`, supportedCodecs());
 
     socket.onopen = () => {
+        reconnectAttempts = 0;
+        setNegotiatedCodec(socket.protocol);
         const username = localStorage.getItem('username');
         socket.send(JSON.stringify({
             type: 'join',
@@ -37,25 +88,48 @@ export function initWebSocket(userId) {
         }));
     };
 
-    socket.onmessage = (event) => {
-        const message = JSON.parse(event.data);
+    socket.binaryType = 'arraybuffer';
+
+    const handleServerMessage = (message) => {
         const senderId = message.user_id;
 
         switch (message.type) {
             case 'chat_message':
+                rememberSeen('direct', message.id);
                 if (typeof displayMessage === 'function') {
                     displayMessage(message);
                 }
                 break;
             case 'group_message':
+                rememberSeen('group', message.id);
                 if (typeof displayMessage === 'function') {
                     displayMessage(message, false, 'group');
                 }
                 break;
+            case 'message_batch':
+                message.messages.forEach(handleServerMessage);
+                break;
+            case 'sync_complete':
+                rememberSeen('direct', message.lastMessageId);
+                rememberSeen('group', message.lastGroupMessageId);
+                if (message.more) {
+                    socket.send(JSON.stringify({
+                        type: 'sync',
+                        lastMessageId: message.lastMessageId,
+                        lastGroupMessageId: message.lastGroupMessageId
+                    }));
+                }
+                break;
             case 'user_joined':
                 break;
             case 'user_left':
                 break;
+            case 'presence':
+                break;
+            case 'ping':
+                // Server heartbeat; an idle socket that stays silent gets reaped.
+                socket.send(JSON.stringify({ type: 'pong' }));
+                break;
             case 'call_offer':
                 handleIncomingCallOffer(message);
                 break;
@@ -112,7 +186,22 @@ export function initWebSocket(userId) {
         }
     };
 
+    socket.onmessage = (event) => {
+        // Decode in arrival order; inflating a frame is asynchronous.
+        receiveChain = receiveChain
+            .then(() => decodeFrame(event.data))
+            .then(handleServerMessage)
+            .catch((error) => console.error('Failed to handle WebSocket frame:', error));
+    };
+
     socket.onclose = (event) => {
+        if (closedByUser || NO_RECONNECT_CODES.has(event.code)) {
+            return;
+        }
+        const delay = reconnectDelay(event);
+        reconnectAttempts += 1;
+        clearTimeout(reconnectTimer);
+        reconnectTimer = setTimeout(() => initWebSocket(currentUserId), delay);
     };
 
     socket.onerror = (error) => {
@@ -134,6 +223,8 @@ export function sendWebSocketMessage(message) {
 }
 
 export function closeWebSocket() {
+    closedByUser = true;
+    clearTimeout(reconnectTimer);
     if (socket) {
         socket.close();
     }
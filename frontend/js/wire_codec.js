@@ -0,0 +1,135 @@
+// Decoding for the signaling WebSocket's negotiated wire codec. The client
+// always sends JSON text; the server answers in the first codec it supports
+// from the subprotocols offered in supportedCodecs().
+
+const RAW = 0;
+const DEFLATED = 1;
+
+const textDecoder = new TextDecoder();
+
+let currentProtocol = 'json';
+
+export function supportedCodecs() {
+    if (typeof DecompressionStream === 'function') {
+        return ['msgpack+deflate', 'msgpack', 'json'];
+    }
+    return ['msgpack', 'json'];
+}
+
+export async function decodeFrame(data) {
+    if (typeof data === 'string') {
+        return JSON.parse(data);
+    }
+    const bytes = new Uint8Array(data);
+    const protocol = currentProtocol;
+    if (protocol.endsWith('+deflate')) {
+        // One flag byte, then the inner codec's bytes, raw-deflated if flagged.
+        let body = bytes.subarray(1);
+        if (bytes[0] === DEFLATED) {
+            body = await inflateRaw(body);
+        } else if (bytes[0] !== RAW) {
+            throw new Error(`Unknown frame flag ${bytes[0]}`);
+        }
+        return protocol.startsWith('json') ? JSON.parse(textDecoder.decode(body)) : decodeMsgpack(body);
+    }
+    return decodeMsgpack(bytes);
+}
+
+export function setNegotiatedCodec(protocol) {
+    currentProtocol = protocol || 'json';
+}
+
+async function inflateRaw(bytes) {
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate-raw'));
+    return new Uint8Array(await new Response(stream).arrayBuffer());
+}
+
+export function decodeMsgpack(bytes) {
+    const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+    let offset = 0;
+
+    const readString = (length) => {
+        const value = textDecoder.decode(bytes.subarray(offset, offset + length));
+        offset += length;
+        return value;
+    };
+    const readBinary = (length) => {
+        const value = bytes.slice(offset, offset + length);
+        offset += length;
+        return value;
+    };
+    const readArray = (length) => {
+        const value = new Array(length);
+        for (let i = 0; i < length; i++) value[i] = read();
+        return value;
+    };
+    const readMap = (length) => {
+        const value = {};
+        for (let i = 0; i < length; i++) {
+            const key = read();
+            value[key] = read();
+        }
+        return value;
+    };
+    const readUint64 = () => {
+        const value = view.getUint32(offset) * 2 ** 32 + view.getUint32(offset + 4);
+        offset += 8;
+        return value;
+    };
+    const readInt64 = () => {
+        const value = view.getInt32(offset) * 2 ** 32 + view.getUint32(offset + 4);
+        offset += 8;
+        return value;
+    };
+
+    function read() {
+        const type = bytes[offset++];
+        if (type <= 0x7f) return type;
+        if (type <= 0x8f) return readMap(type & 0x0f);
+        if (type <= 0x9f) return readArray(type & 0x0f);
+        if (type <= 0xbf) return readString(type & 0x1f);
+        if (type >= 0xe0) return type - 0x100;
+
+        let value;
+        switch (type) {
+            case 0xc0: return null;
+            case 0xc2: return false;
+            case 0xc3: return true;
+            case 0xcc: value = view.getUint8(offset); offset += 1; return value;
+            case 0xcd: value = view.getUint16(offset); offset += 2; return value;
+            case 0xce: value = view.getUint32(offset); offset += 4; return value;
+            case 0xcf: return readUint64();
+            case 0xd0: value = view.getInt8(offset); offset += 1; return value;
+            case 0xd1: value = view.getInt16(offset); offset += 2; return value;
+            case 0xd2: value = view.getInt32(offset); offset += 4; return value;
+            case 0xd3: return readInt64();
+            case 0xca: value = view.getFloat32(offset); offset += 4; return value;
+            case 0xcb: value = view.getFloat64(offset); offset += 8; return value;
+            default:
+                return readSized(type);
+        }
+    }
+
+    function readSized(type) {
+        let length;
+        switch (type) {
+            case 0xc4: case 0xd9: case 0xc7:
+                length = view.getUint8(offset); offset += 1; break;
+            case 0xc5: case 0xda: case 0xdc: case 0xde: case 0xc8:
+                length = view.getUint16(offset); offset += 2; break;
+            case 0xc6: case 0xdb: case 0xdd: case 0xdf: case 0xc9:
+                length = view.getUint32(offset); offset += 4; break;
+            default:
+                throw new Error(`Unsupported msgpack type 0x${type.toString(16)}`);
+        }
+        if (type === 0xd9 || type === 0xda || type === 0xdb) return readString(length);
+        if (type === 0xc4 || type === 0xc5 || type === 0xc6) return readBinary(length);
+        if (type === 0xdc || type === 0xdd) return readArray(length);
+        if (type === 0xde || type === 0xdf) return readMap(length);
+        // ext types are not produced by the server; skip the type byte and payload.
+        offset += 1 + length;
+        return null;
+    }
+
+    return read();
+}